@@ -7,6 +7,8 @@ from urllib import urlencode
 from xbmc import getCondVisibility, sleep
 from xbmcgui import Window
 
+from resources.lib import ipc
+
 ###############################################################################
 
 
@@ -40,9 +42,16 @@ def main():
         'kodi_id': kodi_id,
         'kodi_type': kodi_type
     }
-    while window.getProperty('plex_command'):
-        sleep(20)
-    window.setProperty('plex_command', 'CONTEXT_menu?%s' % urlencode(args))
+    command = 'CONTEXT_menu?%s' % urlencode(args)
+    try:
+        ipc.request(command)
+    except ipc.ServiceUnavailable:
+        # Fall back to window properties
+        while window.getProperty('plex_command'):
+            sleep(20)
+        window.setProperty('plex_command', command)
+    except ipc.IPCError:
+        pass
 
 
 if __name__ == "__main__":
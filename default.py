@@ -9,13 +9,12 @@ from xbmc import sleep, executebuiltin
 from xbmcgui import ListItem, getCurrentWindowId
 from xbmcplugin import setResolvedUrl
 
-from resources.lib import entrypoint, utils, pickler, pkc_listitem, \
-    variables as v, loghandler
+from resources.lib import utils, pickler, variables as v, loghandler
 from resources.lib.tools import unicode_paths
 
 ###############################################################################
 
-loghandler.config()
+loghandler.config(threaded=False)
 log = logging.getLogger('PLEX.default')
 
 ###############################################################################
@@ -35,13 +34,62 @@ class Main():
         mode = params.get('mode', '')
         itemid = params.get('id', '')
 
-        if mode == 'play':
+        # Modes that do not need the entrypoint module come first - keeps
+        # e.g. every playback start as lean as possible
+        if mode in ('play', 'plex_node'):
             self.play()
 
-        elif mode == 'plex_node':
-            self.play()
+        elif mode == 'route_to_extras':
+            # Hack so we can store this path in the Kodi DB
+            handle = ('plugin://%s?mode=extras&plex_id=%s'
+                      % (v.ADDON_ID, params.get('plex_id')))
+            if getCurrentWindowId() == 10025:
+                # Video Window
+                executebuiltin('Container.Update(\"%s\")' % handle)
+            else:
+                executebuiltin('ActivateWindow(videos, \"%s\")' % handle)
+
+        elif mode == 'settings':
+            executebuiltin('Addon.OpenSettings(%s)' % v.ADDON_ID)
+
+        elif mode == 'reset':
+            utils.plex_command('RESET-PKC')
+
+        elif mode in ('export_bundle', 'import_bundle'):
+            utils.plex_command(mode.replace('_', '-'))
+
+        elif mode == 'passwords':
+            utils.passwords_xml()
+
+        elif mode in ('manualsync', 'repair'):
+            if mode == 'repair':
+                log.info('Requesting repair lib sync')
+                utils.plex_command('repair-scan')
+            elif mode == 'manualsync':
+                log.info('Requesting full library scan')
+                utils.plex_command('full-scan')
+
+        elif mode == 'texturecache':
+            log.info('Requesting texture caching of all textures')
+            utils.plex_command('textures-scan')
 
-        elif mode == 'ondeck':
+        elif mode == 'deviceid':
+            self.deviceid()
+
+        elif mode == 'fanart':
+            log.info('User requested fanarttv refresh')
+            utils.plex_command('fanart-scan')
+
+        else:
+            self.entrypoint(mode, path, arguments, params, itemid)
+
+    @staticmethod
+    def entrypoint(mode, path, arguments, params, itemid):
+        """
+        All modes that need to import the entrypoint module
+        """
+        from resources.lib import entrypoint
+        if mode == 'ondeck':
             entrypoint.on_deck_episodes(itemid,
                                         params.get('tagname'),
                                         int(params.get('limit')))
@@ -61,7 +109,8 @@ class Main():
 
         elif mode == 'browseplex':
             entrypoint.browse_plex(key=params.get('key'),
-                                   plex_section_id=params.get('id'))
+                                   plex_section_id=params.get('id'),
+                                   offset=params.get('offset'))
 
         elif mode == 'watchlater':
             entrypoint.watchlater()
@@ -69,59 +118,21 @@ class Main():
         elif mode == 'channels':
             entrypoint.channels()
 
-        elif mode == 'route_to_extras':
-            # Hack so we can store this path in the Kodi DB
-            handle = ('plugin://%s?mode=extras&plex_id=%s'
-                      % (v.ADDON_ID, params.get('plex_id')))
-            if getCurrentWindowId() == 10025:
-                # Video Window
-                executebuiltin('Container.Update(\"%s\")' % handle)
-            else:
-                executebuiltin('ActivateWindow(videos, \"%s\")' % handle)
-
         elif mode == 'extras':
             entrypoint.extras(plex_id=params.get('plex_id'))
 
-        elif mode == 'settings':
-            executebuiltin('Addon.OpenSettings(%s)' % v.ADDON_ID)
-
         elif mode == 'enterPMS':
             entrypoint.create_new_pms()
 
-        elif mode == 'reset':
-            utils.plex_command('RESET-PKC')
-
         elif mode == 'togglePlexTV':
             entrypoint.toggle_plex_tv_sign_in()
 
-        elif mode == 'passwords':
-            utils.passwords_xml()
-
         elif mode == 'switchuser':
             entrypoint.switch_plex_user()
 
-        elif mode in ('manualsync', 'repair'):
-            if mode == 'repair':
-                log.info('Requesting repair lib sync')
-                utils.plex_command('repair-scan')
-            elif mode == 'manualsync':
-                log.info('Requesting full library scan')
-                utils.plex_command('full-scan')
-
-        elif mode == 'texturecache':
-            log.info('Requesting texture caching of all textures')
-            utils.plex_command('textures-scan')
-
         elif mode == 'chooseServer':
             entrypoint.choose_pms_server()
 
-        elif mode == 'deviceid':
-            self.deviceid()
-
-        elif mode == 'fanart':
-            log.info('User requested fanarttv refresh')
-            utils.plex_command('fanart-scan')
-
         elif '/extrafanart' in path:
             plexpath = arguments[1:]
             plexid = itemid
@@ -148,16 +159,29 @@ class Main():
         """
         Start up playback_starter in main Python thread
         """
-        request = '%s&handle=%s' % (argv[2], HANDLE)
-        # Put the request into the 'queue'
-        utils.plex_command('PLAY-%s' % request)
+        request = 'PLAY-%s&handle=%s' % (argv[2], HANDLE)
         if HANDLE == -1:
             # Handle -1 received, not waiting for main thread
+            utils.plex_command(request)
             return
-        # Wait for the result
-        while not pickler.pickl_window('plex_result'):
-            sleep(50)
-        result = pickler.unpickle_me()
+        from resources.lib import ipc
+        try:
+            result = ipc.request(request, wait=True)
+        except ipc.ServiceUnavailable as err:
+            log.debug('Falling back to window properties: %s', err)
+            utils.plex_command(request)
+            # Wait for the result
+            while not pickler.pickl_window('plex_result'):
+                sleep(50)
+            result = pickler.unpickle_me()
+        except ipc.IPCError as err:
+            log.error('Playback request failed: %s', err)
+            result = None
+        else:
+            if not result:
+                log.debug('PKC service did not return a playback result')
+                return
+            result = pickler.unpickle(result)
         if result is None:
             log.error('Error encountered, aborting')
             utils.dialog('notification',
@@ -167,6 +191,7 @@ class Main():
                          time=3000)
             setResolvedUrl(HANDLE, False, ListItem())
         elif result.listitem:
+            from resources.lib import pkc_listitem
             listitem = pkc_listitem.convert_pkc_to_listitem(result.listitem)
             setResolvedUrl(HANDLE, True, listitem)
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
+from threading import Event
 
 
 class PlayState(object):
@@ -68,4 +69,23 @@ class PlayState(object):
         self.pkc_caused_stop = False
         # Flag if the 0 length PKC video has already failed so we can start resolving
         # playback (set in player.py)
-        self.pkc_caused_stop_done = True
+        self._pkc_caused_stop_done = Event()
+        self._pkc_caused_stop_done.set()
+
+    @property
+    def pkc_caused_stop_done(self):
+        return self._pkc_caused_stop_done.is_set()
+
+    @pkc_caused_stop_done.setter
+    def pkc_caused_stop_done(self, value):
+        if value:
+            self._pkc_caused_stop_done.set()
+        else:
+            self._pkc_caused_stop_done.clear()
+
+    def wait_pkc_caused_stop_done(self, timeout):
+        """
+        Blocks until Kodi stopped PKC's 0 length video or until timeout [s]
+        passed. Returns True if the video was stopped
+        """
+        return self._pkc_caused_stop_done.wait(timeout)
@@ -6,7 +6,7 @@ from urllib import quote_plus, unquote
 import requests
 
 from .kodi_db import KodiVideoDB, KodiMusicDB, KodiTextureDB
-from . import app, backgroundthread, utils
+from . import app, backgroundthread, startup, utils
 
 LOG = getLogger('PLEX.artwork')
 
@@ -59,6 +59,7 @@ class ImageCachingThread(backgroundthread.KillableThread):
                     LOG.info("---===### Stopped ImageCachingThread ###===---")
                     return
                 app.APP.monitor.waitForAbort(1)
+            startup.throttle()
             cache_url(url)
         LOG.info("---===### Stopped ImageCachingThread ###===---")
 
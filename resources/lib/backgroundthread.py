@@ -350,11 +350,14 @@ class BackgroundThreader:
 
 
 class ThreaderManager:
-    def __init__(self, worker=BackgroundWorker):
+    def __init__(self, worker=BackgroundWorker, worker_count=6):
         self.index = 0
         self.abandoned = []
         self._workerhandler = worker
-        self.threader = BackgroundThreader(name=str(self.index), worker=worker)
+        self._worker_count = worker_count
+        self.threader = BackgroundThreader(name=str(self.index),
+                                           worker=worker,
+                                           worker_count=worker_count)
 
     def __getattr__(self, name):
         return getattr(self.threader, name)
@@ -366,7 +369,8 @@ class ThreaderManager:
         self.index += 1
         self.abandoned.append(self.threader.abort())
         self.threader = BackgroundThreader(name=str(self.index),
-                                           worker=self._workerhandler)
+                                           worker=self._workerhandler,
+                                           worker_count=self._worker_count)
 
     def shutdown(self):
         self.threader.shutdown()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pages of PMS listings for browsing Plex in Kodi, see entrypoint.browse_plex.
+Instead of downloading an entire section before showing anything, we get one
+page (X-Plex-Container-Start/Size) after the other and download the following
+pages in the background while Kodi shows the current one.
+
+Every plugin call runs in a Python instance of its own. We hence keep the
+pages in a short-lived cache on disk, keyed by PMS, token, url (section, sort
+and filters) and page.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from threading import Thread
+import hashlib
+import json
+import os
+import time
+
+from .downloadutils import DownloadUtils as DU
+from . import path_ops, utils, variables as v, app
+
+LOG = getLogger('PLEX.browse_pages')
+
+# Cached pages are valid for this long [s]
+PAGE_TTL = 300
+# Number of following pages we download in the background
+PREFETCH_PAGES = 2
+# Page size [items] if the setting limitindex is not sensible
+DEFAULT_PAGE_SIZE = 200
+
+
+def page_size():
+    """
+    Number of items per page. Keep it constant across all pages of a listing
+    """
+    return max(50, utils.cast(int, utils.settings('limitindex')) or
+               DEFAULT_PAGE_SIZE)
+
+
+def _cache_dir():
+    return path_ops.path.join(v.ADDON_PROFILE, 'browse_cache')
+
+
+def _cache_file(url, start, size):
+    key = json.dumps([app.CONN.server, app.ACCOUNT.pms_token,
+                      url, start, size])
+    name = '%s.xml' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return path_ops.path.join(_cache_dir(), name)
+
+
+def _age(path):
+    try:
+        return time.time() - os.path.getmtime(path_ops.encode_path(path))
+    except OSError:
+        return
+
+
+def _read(path):
+    age = _age(path)
+    if age is None or age > PAGE_TTL:
+        return
+    try:
+        with open(path_ops.encode_path(path), 'rb') as f:
+            xml = utils.defused_etree.fromstring(f.read())
+        xml.attrib
+    except Exception as err:
+        LOG.warn('Discarding cached page %s: %r', path, err)
+        return
+    return xml
+
+
+def _write(path, xml):
+    tmp = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        if not path_ops.exists(_cache_dir()):
+            path_ops.makedirs(_cache_dir())
+        with open(path_ops.encode_path(tmp), 'wb') as f:
+            f.write(utils.etree.tostring(xml, encoding='utf-8'))
+        if path_ops.exists(path):
+            # Windows won't replace an existing file
+            path_ops.remove(path)
+        path_ops.rename(tmp, path)
+    except (IOError, OSError) as err:
+        LOG.warn('Could not cache page %s: %s', path, err)
+
+
+def purge():
+    """
+    Deletes all cached pages that expired
+    """
+    try:
+        names = os.listdir(path_ops.encode_path(_cache_dir()))
+    except OSError:
+        return
+    for name in names:
+        path = path_ops.path.join(_cache_dir(), path_ops.decode_path(name))
+        age = _age(path)
+        if age is not None and age > PAGE_TTL:
+            try:
+                path_ops.remove(path)
+            except OSError:
+                pass
+
+
+def _download(url, start, size):
+    xml = DU().downloadUrl(url,
+                           parameters={'X-Plex-Container-Start': start,
+                                       'X-Plex-Container-Size': size})
+    try:
+        xml.attrib
+    except AttributeError:
+        LOG.error('Could not download page %s of %s', start, url)
+        return
+    _write(_cache_file(url, start, size), xml)
+    return xml
+
+
+def get_page(url, start, size):
+    """
+    Returns the etree XML with the items start to start + size of the
+    listing url or None if something went wrong
+    """
+    xml = _read(_cache_file(url, start, size))
+    if xml is not None:
+        LOG.debug('Using cached page %s of %s', start, url)
+        return xml
+    return _download(url, start, size)
+
+
+def total_size(xml):
+    """
+    Total number of items of the listing or None if the PMS did not tell us
+    """
+    return utils.cast(int, xml.get('totalSize'))
+
+
+def prefetch(url, start, size, total):
+    """
+    Downloads the PREFETCH_PAGES pages following the page at start in
+    parallel. Returns the threads; the Python instance will wait for them
+    before exiting
+    """
+    threads = []
+    for i in range(1, PREFETCH_PAGES + 1):
+        next_start = start + i * size
+        if next_start >= total:
+            break
+        age = _age(_cache_file(url, next_start, size))
+        if age is not None and age < PAGE_TTL / 2:
+            continue
+        thread = Thread(target=_download,
+                        args=(url, next_start, size),
+                        name='PrefetchPage%s' % next_start)
+        thread.start()
+        threads.append(thread)
+    return threads
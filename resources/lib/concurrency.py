@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Adapts the load that library syncs put on the PMS to what the PMS can
+handle: the number of simultaneous metadata downloads and the number of items
+we request per page (X-Plex-Container-Size).
+
+Both follow AIMD (additive increase, multiplicative decrease) like TCP's
+congestion control. As long as the PMS answers as quickly as it did when it
+was idle, we allow one more request in flight per round trip and grow the
+pages. Once answers slow down, fail or the PMS tells us it's under strain
+(HTTP 401 without being truly unauthorized), we cut back right away.
+
+The settings syncThreadNumber and limitindex are the upper bounds.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from contextlib import contextmanager
+import threading
+import time
+
+from . import utils, app
+
+LOG = getLogger('PLEX.concurrency')
+
+# Outcomes of a PMS request
+OK = 'ok'
+# PMS did not answer or answered garbage
+ERROR = 'error'
+# PMS answered with a 401 though we're authorized
+STRAIN = 'strain'
+
+# Number of requests in flight we start a sync with
+START_REQUESTS = 4
+# Decrease factors
+ERROR_DECREASE = 0.75
+STRAIN_DECREASE = 0.5
+SLOW_DECREASE = 0.75
+# Answers slower than this multiple of the quickest answers mean that the PMS
+# is queueing our requests
+SLOW_FACTOR = 3.0
+# Answers quicker than this multiple let us increase the number of requests
+FAST_FACTOR = 1.5
+# Weight of a new latency in the exponentially weighted moving average
+EWMA_WEIGHT = 0.2
+# Don't decrease again for at least this long [s] - the answers to requests
+# we sent before decreasing should not count twice
+MIN_COOLDOWN = 1.0
+# Page sizes [items]
+MIN_PAGE_SIZE = 50
+PAGE_SIZE_STEP = 50
+# A page should not take longer than this to download [s]
+TARGET_PAGE_SECONDS = 3.0
+# How often a task retries a request the PMS refused due to strain
+STRAIN_RETRIES = 3
+
+
+def outcome(xml):
+    """
+    Classifies the result of a DownloadUtils request that should return an
+    xml
+    """
+    if xml == 401:
+        return STRAIN
+    try:
+        xml.attrib
+    except AttributeError:
+        return ERROR
+    return OK
+
+
+class Controller(object):
+    """
+    Use the module-wide CONTROLLER
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        # Number of slots the current thread holds, see slot()
+        self._local = threading.local()
+        # Requests of a previous sync might still be in flight upon reset()
+        self.in_flight = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Call before every sync. (Re-)reads the upper bounds from the settings
+        """
+        with self._cond:
+            self.max_requests = max(1, utils.cast(
+                int, utils.cached_setting('syncThreadNumber')) or 1)
+            self.max_page_size = max(MIN_PAGE_SIZE, utils.cast(
+                int, utils.cached_setting('limitindex')) or MIN_PAGE_SIZE)
+            self.limit = float(min(START_REQUESTS, self.max_requests))
+            self.latency = None
+            self.baseline = None
+            self.last_decrease = 0.0
+            self.page_size = self.max_page_size
+            self.stats = {OK: 0, ERROR: 0, STRAIN: 0,
+                          'min_limit': int(self.limit),
+                          'max_limit': int(self.limit),
+                          'min_page_size': self.page_size,
+                          'max_page_size': self.page_size}
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timed=True):
+        """
+        Blocks until we may send another request to the PMS. Yields a dict;
+        set its key 'outcome' to STRAIN or ERROR if the request failed.
+
+        Pass timed=False for requests that don't take as long as a single
+        item's metadata, e.g. pages. Their latency would distort ours -
+        only their failures count.
+
+        Re-entrant: a thread that already holds a slot gets another one right
+        away. Waiting would deadlock once all threads hold a slot
+        """
+        if getattr(self._local, 'depth', 0):
+            self._local.depth += 1
+            result = {'outcome': OK}
+            try:
+                yield result
+            finally:
+                self._local.depth -= 1
+                with self._cond:
+                    self._record(result['outcome'], None)
+            return
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        self._local.depth = 1
+        result = {'outcome': OK}
+        start = time.time()
+        try:
+            yield result
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self.in_flight -= 1
+                self._record(result['outcome'],
+                             time.time() - start if timed else None)
+                self._cond.notify_all()
+
+    def download(self, func, *args, **kwargs):
+        """
+        Calls func(*args, **kwargs), a function that downloads an xml from the
+        PMS, within a slot
+        """
+        with self.slot() as result:
+            xml = func(*args, **kwargs)
+            result['outcome'] = outcome(xml)
+        return xml
+
+    def _record(self, result, latency):
+        # Call with self._cond held. latency None: don't use the latency
+        self.stats[result] += 1
+        now = time.time()
+        if result != OK:
+            self._decrease(now,
+                           STRAIN_DECREASE if result == STRAIN
+                           else ERROR_DECREASE)
+            return
+        if latency is None:
+            return
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += EWMA_WEIGHT * (latency - self.latency)
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        if self.latency > SLOW_FACTOR * self.baseline:
+            self._decrease(now, SLOW_DECREASE)
+        elif (self.latency <= FAST_FACTOR * self.baseline and
+                self.limit < self.max_requests and
+                self.in_flight + 1 >= int(self.limit)):
+            # We're actually using all slots - one more per round trip
+            self.limit = min(self.max_requests, self.limit + 1 / self.limit)
+            self.stats['max_limit'] = max(self.stats['max_limit'],
+                                          int(self.limit))
+
+    def _decrease(self, now, factor):
+        if now - self.last_decrease < max(MIN_COOLDOWN,
+                                          2 * (self.latency or 0)):
+            return
+        self.last_decrease = now
+        self.limit = max(1.0, self.limit * factor)
+        self.stats['min_limit'] = min(self.stats['min_limit'],
+                                      int(self.limit))
+        LOG.debug('Decreased PMS requests in flight to %s, latency %s, '
+                  'baseline %s', int(self.limit), self.latency, self.baseline)
+
+    def get_page_size(self):
+        """
+        Number of items to request per page. Keep it constant for all pages
+        of the same listing
+        """
+        return self.page_size
+
+    def page_done(self, seconds, result=OK):
+        """
+        Call after having downloaded a page of size get_page_size() within
+        seconds
+        """
+        with self._cond:
+            if result != OK or seconds > TARGET_PAGE_SECONDS:
+                self.page_size = max(MIN_PAGE_SIZE, self.page_size // 2)
+            elif (seconds < TARGET_PAGE_SECONDS / 3 and
+                    self.page_size < self.max_page_size):
+                self.page_size = min(self.max_page_size,
+                                     self.page_size + PAGE_SIZE_STEP)
+            else:
+                return
+            self.stats['min_page_size'] = min(self.stats['min_page_size'],
+                                              self.page_size)
+            self.stats['max_page_size'] = max(self.stats['max_page_size'],
+                                              self.page_size)
+
+    def strain_backoff(self, attempt):
+        """
+        Waits before a request the PMS refused due to strain is retried.
+        Returns False if we should give up
+        """
+        if attempt >= STRAIN_RETRIES:
+            return False
+        return not app.APP.monitor.waitForAbort(
+            max(MIN_COOLDOWN, self.latency or 0) * 2 ** attempt)
+
+    def log_stats(self):
+        LOG.info('PMS requests in flight now %s, page size %s, stats: %s',
+                 int(self.limit), self.page_size, self.stats)
+
+
+CONTROLLER = Controller()
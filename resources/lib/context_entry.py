@@ -7,7 +7,7 @@ import xbmcgui
 
 from .plex_api import API
 from .plex_db import PlexDB
-from . import context, plex_functions as PF, playqueue as PQ
+from . import context, plex_functions as PF, playqueue as PQ, metadata_cache
 from . import utils, variables as v, app
 
 ###############################################################################
@@ -51,7 +51,7 @@ class ContextMenu(object):
                   self.plex_id, self.plex_type)
         if not self.plex_id:
             return
-        xml = PF.GetPlexMetadata(self.plex_id)
+        xml = metadata_cache.metadata(self.plex_id)
         try:
             xml[0].attrib
         except (TypeError, IndexError, KeyError):
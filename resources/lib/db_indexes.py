@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The indexes that PKC's lookups need, for both Kodi's databases and our own
+Plex database. Every index is declared together with a query that PKC
+actually runs. Upon startup, we ask SQLite for that query's plan
+(EXPLAIN QUERY PLAN) and only create our index if SQLite would otherwise
+scan the entire table - Kodi already ships many suitable indexes of its own.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from collections import namedtuple
+from sqlite3 import OperationalError
+import re
+
+from . import utils, path_ops, variables as v
+
+LOG = getLogger('PLEX.db_indexes')
+
+# Query plan of the declared query
+INDEXED = 'indexed'
+# We created the index and the query now uses an index
+CREATED = 'created'
+# The query still scans the entire table
+SCAN = 'scan'
+# Database or table does not exist (yet)
+MISSING = 'missing'
+# Database was locked or the index could not be created otherwise
+FAILED = 'failed'
+
+Index = namedtuple('Index', 'db table columns query')
+
+INDEXES = (
+    # Kodi video database
+    Index('video', 'art', ('media_id', 'media_type', 'type'),
+          'SELECT url FROM art WHERE media_id = ? AND media_type = ? '
+          'AND type = ?'),
+    Index('video', 'files', ('strFilename', ),
+          'SELECT idFile, idPath FROM files WHERE strFilename = ?'),
+    Index('video', 'files', ('idPath', 'strFilename'),
+          'SELECT idFile FROM files WHERE idPath = ? AND strFilename = ?'),
+    Index('video', 'path', ('strPath', ),
+          'SELECT idPath FROM path WHERE strPath = ?'),
+    Index('video', 'uniqueid', ('media_id', 'media_type'),
+          'SELECT uniqueid_id FROM uniqueid WHERE media_id = ? '
+          'AND media_type = ?'),
+    Index('video', 'rating', ('media_id', 'media_type'),
+          'SELECT rating_id FROM rating WHERE media_id = ? '
+          'AND media_type = ?'),
+    Index('video', 'tag', ('name COLLATE NOCASE', ),
+          'SELECT tag_id FROM tag WHERE name = ? COLLATE NOCASE'),
+    Index('video', 'actor', ('name', ),
+          'SELECT actor_id FROM actor WHERE name = ?'),
+    # Kodi music database
+    Index('music', 'path', ('strPath', ),
+          'SELECT idPath FROM path WHERE strPath = ?'),
+    Index('music', 'artist', ('strArtist COLLATE NOCASE', ),
+          'SELECT idArtist FROM artist WHERE strArtist = ? COLLATE NOCASE'),
+    Index('music', 'genre', ('strGenre', ),
+          'SELECT idGenre FROM genre WHERE strGenre = ?'),
+    # Kodi texture database
+    Index('texture', 'texture', ('url', ),
+          'SELECT cachedurl FROM texture WHERE url = ?'),
+    # Plex season and episode lookups by show or season
+    Index('plex', 'season', ('show_id', ),
+          'SELECT * FROM season WHERE show_id = ?'),
+    Index('plex', 'episode', ('show_id', ),
+          'SELECT * FROM episode WHERE show_id = ?'),
+    Index('plex', 'episode', ('season_id', ),
+          'SELECT * FROM episode WHERE season_id = ?'),
+    Index('plex', 'album', ('artist_id', ),
+          'SELECT * FROM album WHERE artist_id = ?'),
+    Index('plex', 'track', ('artist_id', ),
+          'SELECT * FROM track WHERE artist_id = ?'),
+    Index('plex', 'track', ('album_id', ),
+          'SELECT * FROM track WHERE album_id = ?'),
+)
+# Lookups that PKC runs for every Plex item table
+INDEXES += tuple(
+    Index('plex', plex_type, (column, ), query % plex_type)
+    for plex_type in (v.PLEX_TYPE_MOVIE,
+                      v.PLEX_TYPE_SHOW,
+                      v.PLEX_TYPE_SEASON,
+                      v.PLEX_TYPE_EPISODE,
+                      v.PLEX_TYPE_ARTIST,
+                      v.PLEX_TYPE_ALBUM,
+                      v.PLEX_TYPE_SONG)
+    for column, query in (
+        ('kodi_id', 'SELECT * FROM %s WHERE kodi_id = ? LIMIT 1'),
+        ('section_id', 'SELECT plex_id FROM %s WHERE section_id = ?'),
+        ('last_sync',
+         'SELECT plex_id FROM %s WHERE last_sync < ? OR last_sync > ?')))
+
+# Indexes that earlier PKC versions created, duplicating a primary key
+OBSOLETE = (
+    ('video', 'ix_actor_2'),
+    ('video', 'ix_files_2'),
+)
+
+DB_PATHS = {
+    'video': v.DB_VIDEO_PATH,
+    'music': v.DB_MUSIC_PATH,
+    'texture': v.DB_TEXTURE_PATH,
+    'plex': v.DB_PLEX_PATH
+}
+
+
+def index_name(index):
+    """
+    E.g. ix_pkc_tag_name_collate_nocase
+    """
+    return 'ix_pkc_%s_%s' % (index.table,
+                             re.sub(r'\W+', '_', '_'.join(index.columns)).lower())
+
+
+def query_plan(cursor, query):
+    """
+    Returns SQLite's plan for query as one string, e.g.
+    'SEARCH path USING COVERING INDEX ix_path (strPath=?)'
+    """
+    cursor.execute('EXPLAIN QUERY PLAN %s' % query,
+                   (None, ) * query.count('?'))
+    return ' / '.join(row[-1] for row in cursor.fetchall())
+
+
+def _scans(plan):
+    # 'SCAN movie' as well as 'SCAN movie USING COVERING INDEX ix' visit
+    # every single row
+    return 'SCAN' in plan.split()
+
+
+def check(cursor, indexes, create=False):
+    """
+    Checks (and creates if create=True) indexes, all belonging to the
+    database of cursor. Returns a list of (index, status, plan)
+    """
+    result = []
+    for index in indexes:
+        try:
+            plan = query_plan(cursor, index.query)
+        except OperationalError:
+            # e.g. no such table
+            result.append((index, MISSING, ''))
+            continue
+        if not _scans(plan):
+            result.append((index, INDEXED, plan))
+            continue
+        if not create:
+            result.append((index, SCAN, plan))
+            continue
+        try:
+            cursor.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)'
+                           % (index_name(index),
+                              index.table,
+                              ', '.join(index.columns)))
+        except OperationalError as err:
+            LOG.warn('Could not create index %s: %s', index_name(index), err)
+            result.append((index, FAILED, plan))
+            continue
+        plan = query_plan(cursor, index.query)
+        result.append((index, SCAN if _scans(plan) else CREATED, plan))
+    return result
+
+
+def provision(db_types=None):
+    """
+    Run once upon PKC startup, after the Plex DB has been initialized. Makes
+    sure that the lookups of all declared indexes do not scan entire tables
+    and logs a report. Returns the list of (index, status, plan)
+    """
+    if db_types is None:
+        db_types = ['video', 'texture', 'plex']
+        if utils.settings('enableMusic') == 'true':
+            db_types.append('music')
+    result = []
+    for db_type in db_types:
+        indexes = [x for x in INDEXES if x.db == db_type]
+        if not path_ops.exists(DB_PATHS[db_type]):
+            # Don't let sqlite create an empty database
+            result.extend((x, MISSING, '') for x in indexes)
+            continue
+        conn = utils.kodi_sql(db_type)
+        try:
+            for name in (x[1] for x in OBSOLETE if x[0] == db_type):
+                conn.execute('DROP INDEX IF EXISTS %s' % name)
+            result.extend(check(conn.cursor(), indexes, create=True))
+            conn.commit()
+        except OperationalError as err:
+            # Kodi might have locked the database - we'll retry next startup
+            LOG.warn('Could not provision the indexes of the %s db: %s',
+                     db_type, err)
+            conn.rollback()
+            result.extend((x, FAILED, '') for x in indexes)
+        finally:
+            conn.close()
+    report(result)
+    return result
+
+
+def report(result):
+    """
+    Logs which queries use an index and which still scan entire tables
+    """
+    counts = {}
+    for index, status, plan in result:
+        counts[status] = counts.get(status, 0) + 1
+        if status in (SCAN, FAILED):
+            LOG.warn('%s db query scans the entire %s table: %s - %s',
+                     index.db, index.table, index.query, plan)
+        else:
+            LOG.debug('%s %s db index %s: %s', status, index.db,
+                      index_name(index), plan)
+    LOG.info('Index usage of PKC queries: %s', counts)
@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from time import time
 import requests
 
-from . import utils, clientinfo, app
+from . import utils, clientinfo, response_cache, pms_clock, app
 
 ###############################################################################
 
@@ -131,6 +132,19 @@ class DownloadUtils():
             <response-object>  if return_response=True is set (200, 201 only)
         """
         kwargs = {'timeout': self.timeout}
+        cache_key, policy, validators = None, None, None
+        if action_type != 'GET' or '/:/' in url:
+            # Changes something on the PMS, e.g. a playlist or playstate
+            response_cache.changed(url)
+        elif postBody is None and return_response is False:
+            cache_key, policy = response_cache.lookup_key(url,
+                                                          parameters,
+                                                          headerOptions,
+                                                          authenticate)
+        if cache_key:
+            content, validators = response_cache.get(cache_key)
+            if content is not None:
+                return utils.defused_etree.fromstring(content)
         if authenticate is True:
             # Get requests session
             try:
@@ -139,6 +153,8 @@ class DownloadUtils():
                 LOG.info("Request session does not exist: start one")
                 self.startSession()
                 s = self.s
+            # Only answers of our PMS tell us its time, not e.g. plex.tv's
+            from_pms = url.startswith('{server}')
             # Replace for the real values
             url = url.replace("{server}", app.CONN.server)
         else:
@@ -166,8 +182,14 @@ class DownloadUtils():
             kwargs['params'] = parameters
         if timeout is not None:
             kwargs['timeout'] = timeout
+        if validators:
+            # Ask the server whether our cached answer is still valid
+            headers = dict(kwargs.get('headers') or {})
+            headers.update(validators)
+            kwargs['headers'] = headers
 
         # ACTUAL DOWNLOAD HAPPENING HERE
+        sent = time()
         try:
             r = self._doDownload(s, action_type, **kwargs)
 
@@ -213,6 +235,12 @@ class DownloadUtils():
                 self.count_error = 0
                 if r.status_code != 401:
                     self.count_unauthorized = 0
+                if from_pms and r.headers.get('Date'):
+                    # Time offset Kodi - PMS for free
+                    pms_clock.sample(app.CONN.server,
+                                     r.headers['Date'],
+                                     sent,
+                                     r.elapsed.total_seconds())
 
             if r.status_code == 204:
                 # No body in the response
@@ -253,8 +281,11 @@ class DownloadUtils():
                     return r
                 try:
                     # xml response
-                    r = utils.defused_etree.fromstring(r.content)
-                    return r
+                    xml = utils.defused_etree.fromstring(r.content)
+                    if cache_key:
+                        response_cache.store(cache_key, policy, r.content,
+                                             r.headers)
+                    return xml
                 except:
                     r.encoding = 'utf-8'
                     if r.text == '':
@@ -275,6 +306,13 @@ class DownloadUtils():
                             LOG.warn("Received headers were: %s", r.headers)
                             LOG.warn('Received text: %s', r.text)
                         return True
+            elif r.status_code == 304 and cache_key:
+                # Not Modified - our cached answer is still valid
+                content = response_cache.not_modified(cache_key)
+                if content is not None:
+                    return utils.defused_etree.fromstring(content)
+                LOG.warn('Received 304 for %s, but nothing is cached', url)
+                return
             elif r.status_code == 403:
                 # E.g. deleting a PMS item
                 LOG.warn('PMS sent 403: Forbidden error for url %s', url)
@@ -3,6 +3,9 @@
 """
 Loads of different functions called in SEPARATE Python instances through
 e.g. plugin://... calls. Hence be careful to only rely on window variables.
+
+Every plugin call imports this module. Hence only import big modules like
+plex_api, plex_functions or downloadutils within the functions needing them.
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
@@ -13,11 +16,7 @@ from xbmc import sleep
 from xbmcgui import ListItem
 
 from . import utils
-from . import path_ops
-from .downloadutils import DownloadUtils as DU
-from .plex_api import API
-from . import plex_functions as PF
-from . import json_rpc as js
+from . import widget_cache
 from . import variables as v
 # Be careful - your using app in another Python instance!
 from . import app
@@ -204,64 +203,13 @@ def next_up_episodes(tagname, limit):
     """
     List the next up episodes for tagname.
     """
-    count = 0
     # if the addon is called with nextup parameter,
     # we return the nextepisodes list of the given tagname
     xbmcplugin.setContent(int(argv[1]), 'episodes')
-    # First we get a list of all the TV shows - filtered by tag
-    params = {
-        'sort': {'order': "descending", 'method': "lastplayed"},
-        'filter': {
-            'and': [
-                {'operator': "true", 'field': "inprogress", 'value': ""},
-                {'operator': "is", 'field': "tag", 'value': "%s" % tagname}
-            ]},
-        'properties': ['title', 'studio', 'mpaa', 'file', 'art']
-    }
-    for item in js.get_tv_shows(params):
-        if utils.settings('ignoreSpecialsNextEpisodes') == "true":
-            params = {
-                'tvshowid': item['tvshowid'],
-                'sort': {'method': "episode"},
-                'filter': {
-                    'and': [
-                        {'operator': "lessthan",
-                         'field': "playcount",
-                         'value': "1"},
-                        {'operator': "greaterthan",
-                         'field': "season",
-                         'value': "0"}]},
-                'properties': [
-                    "title", "playcount", "season", "episode", "showtitle",
-                    "plot", "file", "rating", "resume", "tvshowid", "art",
-                    "streamdetails", "firstaired", "runtime", "writer",
-                    "dateadded", "lastplayed"
-                ],
-                'limits': {"end": 1}
-            }
-        else:
-            params = {
-                'tvshowid': item['tvshowid'],
-                'sort': {'method': "episode"},
-                'filter': {
-                    'operator': "lessthan",
-                    'field': "playcount",
-                    'value': "1"},
-                'properties': [
-                    "title", "playcount", "season", "episode", "showtitle",
-                    "plot", "file", "rating", "resume", "tvshowid", "art",
-                    "streamdetails", "firstaired", "runtime", "writer",
-                    "dateadded", "lastplayed"
-                ],
-                'limits': {"end": 1}
-            }
-        for episode in js.get_episodes(params):
-            xbmcplugin.addDirectoryItem(handle=int(argv[1]),
-                                        url=episode['file'],
-                                        listitem=create_listitem(episode))
-            count += 1
-        if count == limit:
-            break
+    for episode in widget_cache.get('nextup', tagname, limit):
+        xbmcplugin.addDirectoryItem(handle=int(argv[1]),
+                                    url=episode['file'],
+                                    listitem=create_listitem(episode))
     xbmcplugin.endOfDirectory(handle=int(argv[1]))
 
 
@@ -269,41 +217,13 @@ def in_progress_episodes(tagname, limit):
     """
     List the episodes that are in progress for tagname
     """
-    count = 0
     # if the addon is called with inprogressepisodes parameter,
     # we return the inprogressepisodes list of the given tagname
     xbmcplugin.setContent(int(argv[1]), 'episodes')
-    # First we get a list of all the in-progress TV shows - filtered by tag
-    params = {
-        'sort': {'order': "descending", 'method': "lastplayed"},
-        'filter': {
-            'and': [
-                {'operator': "true", 'field': "inprogress", 'value': ""},
-                {'operator': "is", 'field': "tag", 'value': "%s" % tagname}
-            ]},
-        'properties': ['title', 'studio', 'mpaa', 'file', 'art']
-    }
-    for item in js.get_tv_shows(params):
-        params = {
-            'tvshowid': item['tvshowid'],
-            'sort': {'method': "episode"},
-            'filter': {
-                'operator': "true",
-                'field': "inprogress",
-                'value': ""},
-            'properties': ["title", "playcount", "season", "episode",
-                           "showtitle", "plot", "file", "rating", "resume",
-                           "tvshowid", "art", "cast", "streamdetails",
-                           "firstaired", "runtime", "writer", "dateadded",
-                           "lastplayed"]
-        }
-        for episode in js.get_episodes(params):
-            xbmcplugin.addDirectoryItem(handle=int(argv[1]),
-                                        url=episode['file'],
-                                        listitem=create_listitem(episode))
-            count += 1
-        if count == limit:
-            break
+    for episode in widget_cache.get('inprogressepisodes', tagname, limit):
+        xbmcplugin.addDirectoryItem(handle=int(argv[1]),
+                                    url=episode['file'],
+                                    listitem=create_listitem(episode))
     xbmcplugin.endOfDirectory(handle=int(argv[1]))
 
 
@@ -311,45 +231,18 @@ def recent_episodes(mediatype, tagname, limit):
     """
     List the recently added episodes for tagname
     """
-    count = 0
     # if the addon is called with recentepisodes parameter,
     # we return the recentepisodes list of the given tagname
     xbmcplugin.setContent(int(argv[1]), 'episodes')
     append_show_title = utils.settings('RecentTvAppendShow') == 'true'
     append_sxxexx = utils.settings('RecentTvAppendSeason') == 'true'
-    # First we get a list of all the TV shows - filtered by tag
-    show_ids = set()
-    params = {
-        'sort': {'order': "descending", 'method': "dateadded"},
-        'filter': {'operator': "is", 'field': "tag", 'value': "%s" % tagname},
-    }
-    for tv_show in js.get_tv_shows(params):
-        show_ids.add(tv_show['tvshowid'])
-    params = {
-        'sort': {'order': "descending", 'method': "dateadded"},
-        'properties': ["title", "playcount", "season", "episode", "showtitle",
-            "plot", "file", "rating", "resume", "tvshowid", "art",
-            "streamdetails", "firstaired", "runtime", "cast", "writer",
-            "dateadded", "lastplayed"],
-        "limits": {"end": limit}
-    }
-    if utils.settings('TVShowWatched') == 'false':
-        params['filter'] = {
-            'operator': "lessthan",
-            'field': "playcount",
-            'value': "1"
-        }
-    for episode in js.get_episodes(params):
-        if episode['tvshowid'] in show_ids:
-            listitem = create_listitem(episode,
-                                       append_show_title=append_show_title,
-                                       append_sxxexx=append_sxxexx)
-            xbmcplugin.addDirectoryItem(handle=int(argv[1]),
-                                        url=episode['file'],
-                                        listitem=listitem)
-            count += 1
-        if count == limit:
-            break
+    for episode in widget_cache.get('recentepisodes', tagname, limit):
+        listitem = create_listitem(episode,
+                                   append_show_title=append_show_title,
+                                   append_sxxexx=append_sxxexx)
+        xbmcplugin.addDirectoryItem(handle=int(argv[1]),
+                                    url=episode['file'],
+                                    listitem=listitem)
     xbmcplugin.endOfDirectory(handle=int(argv[1]))
 
 
@@ -375,6 +268,7 @@ def get_video_files(plex_id, params):
     if plex_id is None:
         LOG.info('No Plex ID found, abort getting Extras')
         return xbmcplugin.endOfDirectory(int(argv[1]))
+    from . import plex_functions as PF, path_ops
     app.init(entrypoint=True)
     item = PF.GetPlexMetadata(plex_id)
     try:
@@ -421,6 +315,8 @@ def extra_fanart(plex_id, plex_path):
     for tvshows we get the plex_id just from the path
     """
     LOG.debug('Called with plex_id: %s, plex_path: %s', plex_id, plex_path)
+    from .plex_api import API
+    from . import plex_functions as PF, path_ops
     if not plex_id:
         if "plugin.video.plexkodiconnect" in plex_path:
             plex_id = plex_path.split("/")[-2]
@@ -500,17 +396,21 @@ def on_deck_episodes(viewid, tagname, limit):
     append_show_title = utils.settings('OnDeckTvAppendShow') == 'true'
     append_sxxexx = utils.settings('OnDeckTvAppendSeason') == 'true'
     if utils.settings('OnDeckTVextended') == 'false':
-        # Chances are that this view is used on Kodi startup
-        # Wait till we've connected to a PMS. At most 30s
-        if not _wait_for_auth():
-            return
         # We're using another python instance - need to load some vars
         app.init(entrypoint=True)
-        xml = DU().downloadUrl('{server}/library/sections/%s/onDeck' % viewid)
-        if xml in (None, 401):
+        xml = widget_cache.cached('ondeck', tagname, limit, viewid)
+        if xml is None:
+            # Chances are that this view is used on Kodi startup
+            # Wait till we've connected to a PMS. At most 30s
+            if not _wait_for_auth():
+                return
+            xml = widget_cache.get('ondeck', tagname, limit, viewid)
+        if xml is None:
             LOG.error('Could not download PMS xml for view %s', viewid)
             xbmcplugin.endOfDirectory(int(argv[1]), False)
             return
+        xml = utils.defused_etree.fromstring(utils.try_encode(xml))
+        from .plex_api import API
         counter = 0
         for item in xml:
             api = API(item)
@@ -532,79 +432,16 @@ def on_deck_episodes(viewid, tagname, limit):
             cacheToDisc=utils.settings('enableTextureCache') == 'true')
         return
 
-    # if the addon is called with nextup parameter,
-    # we return the nextepisodes list of the given tagname
-    # First we get a list of all the TV shows - filtered by tag
-    params = {
-        'sort': {'order': "descending", 'method': "lastplayed"},
-        'filter': {
-            'and': [
-                {'operator': "true", 'field': "inprogress", 'value': ""},
-                {'operator': "is", 'field': "tag", 'value': "%s" % tagname}
-            ]}
-    }
-    items = js.get_tv_shows(params)
-    if not items:
-        # Now items retrieved - empty directory
-        xbmcplugin.endOfDirectory(handle=int(argv[1]))
-        return
-
-    params = {
-        'sort': {'method': "episode"},
-        'limits': {"end": 1},
-        'properties': [
-            "title", "playcount", "season", "episode", "showtitle",
-            "plot", "file", "rating", "resume", "tvshowid", "art",
-            "streamdetails", "firstaired", "runtime", "cast", "writer",
-            "dateadded", "lastplayed"
-        ],
-    }
-    if utils.settings('ignoreSpecialsNextEpisodes') == "true":
-        params['filter'] = {
-            'and': [
-                {'operator': "lessthan", 'field': "playcount", 'value': "1"},
-                {'operator': "greaterthan", 'field': "season", 'value': "0"}
-            ]
-        }
-    else:
-        params['filter'] = {
-            'or': [
-                {'operator': "lessthan", 'field': "playcount", 'value': "1"},
-                {'operator': "true", 'field': "inprogress", 'value': ""}
-            ]
-        }
-
     # Are there any episodes still in progress/not yet finished watching?!?
     # Then we should show this episode, NOT the "next up"
-    inprog_params = {
-        'sort': {'method': "episode"},
-        'filter': {'operator': "true", 'field': "inprogress", 'value': ""},
-        'properties': params['properties']
-    }
-
-    count = 0
-    for item in items:
-        inprog_params['tvshowid'] = item['tvshowid']
-        episodes = js.get_episodes(inprog_params)
-        if not episodes:
-            # No, there are no episodes not yet finished. Get "next up"
-            params['tvshowid'] = item['tvshowid']
-            episodes = js.get_episodes(params)
-            if not episodes:
-                # Also no episodes currently coming up
-                continue
-        for episode in episodes:
-            # There will always be only 1 episode ('limit=1')
-            listitem = create_listitem(episode,
-                                       append_show_title=append_show_title,
-                                       append_sxxexx=append_sxxexx)
-            xbmcplugin.addDirectoryItem(handle=int(argv[1]),
-                                        url=episode['file'],
-                                        listitem=listitem,
-                                        isFolder=False)
-        count += 1
-        if count >= limit:
-            break
+    for episode in widget_cache.get('ondeck', tagname, limit, viewid):
+        listitem = create_listitem(episode,
+                                   append_show_title=append_show_title,
+                                   append_sxxexx=append_sxxexx)
+        xbmcplugin.addDirectoryItem(handle=int(argv[1]),
+                                    url=episode['file'],
+                                    listitem=listitem,
+                                    isFolder=False)
     xbmcplugin.endOfDirectory(handle=int(argv[1]))
 
 
@@ -619,6 +456,7 @@ def playlists(content_type):
     xbmcplugin.setContent(int(argv[1]), 'files')
     app.init(entrypoint=True)
     from .playlists.pms import all_playlists
+    from .plex_api import API
     xml = all_playlists()
     if xml is None:
         return
@@ -649,6 +487,8 @@ def hub(content_type):
     content_type:
         audio, video, image
     """
+    from .plex_api import API
+    from . import plex_functions as PF
     app.init(entrypoint=True)
     xml = PF.get_plex_hub()
     try:
@@ -680,6 +520,7 @@ def watchlater():
         LOG.error('No watch later - restricted user')
         return xbmcplugin.endOfDirectory(int(argv[1]), False)
 
+    from .downloadutils import DownloadUtils as DU
     xml = DU().downloadUrl('https://plex.tv/pms/playlists/queue/all',
                            authenticate=False,
                            headerOptions={'X-Plex-Token': utils.window('plex_token')})
@@ -701,6 +542,7 @@ def channels():
     """
     Listing for Plex Channels
     """
+    from .downloadutils import DownloadUtils as DU
     xml = DU().downloadUrl('{server}/channels/all')
     try:
         xml[0].attrib
@@ -719,23 +561,36 @@ def channels():
         cacheToDisc=utils.settings('enableTextureCache') == 'true')
 
 
-def browse_plex(key=None, plex_section_id=None):
+def browse_plex(key=None, plex_section_id=None, offset=None):
     """
     Lists the content of a Plex folder, e.g. channels. Either pass in key (to
-    be used directly for PMS url {server}<key>) or the plex_section_id
+    be used directly for PMS url {server}<key>) or the plex_section_id.
+
+    Lists one page of items starting at offset and a "Next page" item
     """
-    LOG.debug('Browsing to key %s, section %s', key, plex_section_id)
+    LOG.debug('Browsing to key %s, section %s, offset %s',
+              key, plex_section_id, offset)
+    from . import browse_pages
     app.init(entrypoint=True)
     if key:
-        xml = DU().downloadUrl('{server}%s' % key)
+        url = '{server}%s' % key
     else:
-        xml = PF.GetPlexSectionResults(plex_section_id)
+        url = '{server}/library/sections/%s/all' % plex_section_id
+    offset = utils.cast(int, offset) or 0
+    size = browse_pages.page_size()
+    if offset == 0:
+        browse_pages.purge()
+    xml = browse_pages.get_page(url, offset, size)
     try:
         xml.attrib
     except AttributeError:
         LOG.error('Could not browse to key %s, section %s',
                   key, plex_section_id)
         return xbmcplugin.endOfDirectory(int(argv[1]), False)
+    total = browse_pages.total_size(xml)
+    if total is not None:
+        # Download the following pages while Kodi shows this one
+        browse_pages.prefetch(url, offset, size, total)
 
     photos = False
     movies = False
@@ -771,6 +626,8 @@ def browse_plex(key=None, plex_section_id=None):
                 albums = True
             elif typus == v.PLEX_TYPE_MUSICVIDEO:
                 musicvideos = True
+    if total is not None and offset + len(xml) < total:
+        __build_next_page(key, plex_section_id, offset + len(xml), total)
 
     # Set the correct content type
     if movies is True:
@@ -851,7 +708,29 @@ def __build_folder(xml_element, plex_section_id=None):
                                 listitem=listitem)
 
 
+def __build_next_page(key, plex_section_id, offset, total):
+    params = {
+        'mode': 'browseplex',
+        'offset': offset,
+    }
+    if key:
+        params['key'] = key
+    if plex_section_id:
+        params['id'] = plex_section_id
+    listitem = ListItem('%s (%s/%s)' % (utils.lang(39729), offset, total))
+    listitem.setThumbnailImage('special://home/addons/%s/icon.png'
+                               % v.ADDON_ID)
+    # Stay at the bottom no matter how the user sorts the listing
+    listitem.setProperty('SpecialSort', 'bottom')
+    xbmcplugin.addDirectoryItem(handle=int(argv[1]),
+                                url='plugin://%s/?%s' % (v.ADDON_ID,
+                                                         urlencode(params)),
+                                isFolder=True,
+                                listitem=listitem)
+
+
 def __build_item(xml_element, direct_paths):
+    from .plex_api import API
     api = API(xml_element)
     listitem = api.create_listitem()
     resume = api.resume_point()
@@ -879,6 +758,8 @@ def extras(plex_id):
     Lists all extras for plex_id
     """
     xbmcplugin.setContent(int(argv[1]), 'movies')
+    from .plex_api import API
+    from . import plex_functions as PF
     app.init(entrypoint=True)
     xml = PF.GetPlexMetadata(plex_id)
     try:
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Request/response channel between the PKC service and PKC's other Python
+instances (default.py, context menu) over a localhost TCP socket.
+
+Every frame consists of a JSON header and an arbitrary binary payload, e.g. a
+pickled Playback_Successful. Requests carry a correlation id; the service
+answers each request exactly once with a frame carrying the same id, so
+several requests may be in flight on the same connection at the same time.
+
+The service publishes its port and a random token in a window property - only
+Python instances running within Kodi can thus talk to the service.
+
+Careful: imported by default.py. Do not import any other PKC modules here!
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from uuid import uuid4
+import json
+import socket
+import struct
+import threading
+
+from xbmcgui import Window
+
+LOG = getLogger('PLEX.ipc')
+
+# Window property holding '<port> <token>' while the service is listening
+ADDRESS = 'plex_ipc_address'
+HOST = '127.0.0.1'
+# Header length and payload length
+FRAME = struct.Struct(b'!II')
+# Max size of a JSON header [bytes]
+MAX_HEADER = 64 * 1024
+# How long we wait for the service to accept our connection [s]
+CONNECT_TIMEOUT = 2.0
+# How long we wait for the service to acknowledge a request that we do not
+# need an answer for [s]
+ACK_TIMEOUT = 10.0
+
+
+class IPCError(Exception):
+    """
+    The request might or might not have reached the PKC service
+    """
+    pass
+
+
+class ServiceUnavailable(IPCError):
+    """
+    The request never reached the PKC service - it is safe to retry it
+    otherwise
+    """
+    pass
+
+
+def _recv_exactly(sock, length):
+    chunks = []
+    while length:
+        chunk = sock.recv(min(length, 65536))
+        if not chunk:
+            raise socket.error('Connection closed by peer')
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_frame(sock, header, payload=b''):
+    """
+    Sends the dict header and the bytestring payload. Not thread-safe
+    """
+    header = json.dumps(header).encode('utf-8')
+    sock.sendall(FRAME.pack(len(header), len(payload)) + header + payload)
+
+
+def read_frame(sock):
+    """
+    Blocks until the next frame arrived. Returns the tuple (header, payload).
+    Raises socket.error if the connection broke down
+    """
+    header_length, payload_length = FRAME.unpack(
+        _recv_exactly(sock, FRAME.size))
+    if header_length > MAX_HEADER:
+        raise socket.error('Received an invalid frame')
+    header = json.loads(_recv_exactly(sock, header_length).decode('utf-8'))
+    return header, _recv_exactly(sock, payload_length)
+
+
+def _address():
+    try:
+        port, token = Window(10000).getProperty(ADDRESS).split(' ', 1)
+        return int(port), token.decode('utf-8')
+    except ValueError:
+        raise ServiceUnavailable('PKC service is not listening')
+
+
+def request(command, payload=b'', wait=False, timeout=None):
+    """
+    Sends command (unicode) with the bytestring payload to the PKC service.
+
+    wait=False: blocks until the service accepted the command
+    wait=True: blocks until the service answered the command or until timeout
+    [s] has passed. timeout=None waits until the service goes away
+
+    Returns the bytestring payload of the service's answer. Raises
+    ServiceUnavailable if the command did not reach the service and IPCError
+    for any other failure
+    """
+    port, token = _address()
+    try:
+        sock = socket.create_connection((HOST, port), CONNECT_TIMEOUT)
+    except socket.error as err:
+        raise ServiceUnavailable('Could not connect to PKC service: %s' % err)
+    request_id = uuid4().hex
+    try:
+        sock.settimeout(timeout if wait else ACK_TIMEOUT)
+        try:
+            send_frame(sock,
+                       {'id': request_id,
+                        'token': token,
+                        'command': command,
+                        'wait': wait},
+                       payload)
+        except socket.error as err:
+            raise ServiceUnavailable('Could not send request: %s' % err)
+        while True:
+            header, payload = read_frame(sock)
+            if header.get('id') == request_id:
+                break
+        if header.get('status') == 'unauthorized':
+            raise ServiceUnavailable('PKC service rejected our token')
+        elif header.get('status') != 'ok':
+            raise IPCError('PKC service failed to process %s: %s'
+                           % (command, header.get('message')))
+        return payload
+    except (socket.error, ValueError) as err:
+        raise IPCError('Lost connection to PKC service: %s' % err)
+    finally:
+        sock.close()
+
+
+class Reply(object):
+    """
+    Answers exactly one request. Thread-safe, every call after the first one
+    is ignored
+    """
+    def __init__(self, connection, request_id):
+        self._connection = connection
+        self.request_id = request_id
+        self._sent = False
+
+    def send(self, payload=b''):
+        self._send({'status': 'ok'}, payload)
+
+    def error(self, message):
+        self._send({'status': 'error', 'message': message})
+
+    def _send(self, header, payload=b''):
+        with self._connection.lock:
+            if self._sent:
+                return
+            self._sent = True
+            header['id'] = self.request_id
+            try:
+                send_frame(self._connection.sock, header, payload)
+            except socket.error as err:
+                LOG.warn('Could not answer request %s: %s',
+                         self.request_id, err)
+
+
+class _Connection(object):
+    def __init__(self, sock):
+        self.sock = sock
+        # Several replies may be written concurrently
+        self.lock = threading.Lock()
+
+
+class IPCServer(threading.Thread):
+    """
+    Owned by the PKC service. Passes every request to
+    handler(command, payload, reply) within the connection's own thread.
+    handler must return quickly: True if it will call reply.send() at some
+    later point itself, False if the request can be acknowledged immediately
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.token = uuid4().hex
+        self._stopped = False
+        self._sock = None
+        super(IPCServer, self).__init__(name='PKC-IPC')
+        self.daemon = True
+
+    def listen(self):
+        """
+        Binds to a free localhost port and announces it to the other PKC
+        Python instances. Call before start()
+        """
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind((HOST, 0))
+        self._sock.listen(16)
+        # Lets us check for stop() regularly
+        self._sock.settimeout(0.5)
+        port = self._sock.getsockname()[1]
+        Window(10000).setProperty(ADDRESS, b'%d %s' % (port, self.token))
+        LOG.info('Listening for PKC requests on port %s', port)
+
+    def stop(self):
+        self._stopped = True
+        Window(10000).clearProperty(ADDRESS)
+
+    def run(self):
+        LOG.info("----===## Starting IPCServer ##===----")
+        try:
+            while not self._stopped:
+                try:
+                    sock, _ = self._sock.accept()
+                except socket.timeout:
+                    continue
+                sock.settimeout(None)
+                thread = threading.Thread(target=self._serve,
+                                          args=(_Connection(sock), ),
+                                          name='PKC-IPC-connection')
+                thread.daemon = True
+                thread.start()
+        finally:
+            self._sock.close()
+            LOG.info("----===## IPCServer stopped ##===----")
+
+    def _serve(self, connection):
+        try:
+            while not self._stopped:
+                header, payload = read_frame(connection.sock)
+                self._dispatch(connection, header, payload)
+        except (socket.error, ValueError):
+            # Client hung up
+            pass
+        finally:
+            # Replies that are still pending will fail silently
+            connection.sock.close()
+
+    def _dispatch(self, connection, header, payload):
+        reply = Reply(connection, header.get('id'))
+        if header.get('token') != self.token:
+            LOG.error('Rejecting request with an invalid token')
+            reply._send({'status': 'unauthorized'})
+            return
+        command = header.get('command') or ''
+        LOG.debug('Received request %s: %s', reply.request_id, command)
+        try:
+            pending = self.handler(command,
+                                   payload,
+                                   reply if header.get('wait') else None)
+        except Exception as err:
+            LOG.exception('Could not process %s', command)
+            reply.error('%s' % err)
+            return
+        if not pending:
+            reply.send()
@@ -6,7 +6,7 @@ from ntpath import dirname
 
 from ..plex_db import PlexDB
 from ..kodi_db import KodiVideoDB
-from .. import utils, timing
+from .. import utils, timing, variables as v
 
 LOG = getLogger('PLEX.itemtypes.common')
 
@@ -83,6 +83,35 @@ class ItemBase(object):
         self.artconn.commit()
         self.kodiconn.commit()
 
+    def wal_size(self):
+        """
+        Returns the size of the largest write-ahead log of our DBs [bytes]
+        """
+        return max(utils.wal_size(conn) for conn in
+                   (self.plexconn, self.kodiconn, self.artconn))
+
+    def checkpoint(self):
+        """
+        Passive WAL checkpoint of our DBs: copies whatever Kodi's readers are
+        not using anymore back into the DBs without waiting for anyone.
+        Call right after commit()
+        """
+        for conn in (self.plexconn, self.kodiconn, self.artconn):
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def remove_bulk(self, plex_type, column, value):
+        """
+        Removes all video items of plex_type where column equals value, e.g.
+        all episodes with a certain season_id, from the Plex and the Kodi DB.
+        Uses set-based SQL, so no per-item checks for orphaned parents!
+        """
+        kodi_ids = list(self.plexdb.kodiid_by(plex_type, column, value))
+        LOG.debug('Removing %s %s items with %s %s',
+                  len(kodi_ids), plex_type, column, value)
+        self.kodidb.remove_items(v.KODITYPE_FROM_PLEXTYPE[plex_type],
+                                 kodi_ids)
+        self.plexdb.remove_by(plex_type, column, value)
+
     def set_fanart(self, artworks, kodi_id, kodi_type):
         """
         Writes artworks [dict containing only set artworks] to the Kodi art DB
@@ -254,6 +254,18 @@ class Movie(ItemBase):
         self.kodidb.remove_ratings(kodi_id, kodi_type)
         LOG.debug('Deleted movie %s from kodi database', plex_id)
 
+    def reset(self, plex_id, plex_type=None):
+        """
+        Removes the movie from all DBs so it can be synced anew
+        """
+        self.remove(plex_id)
+
+    def remove_section(self, section_id):
+        """
+        Removes all movies of the Plex library section section_id at once
+        """
+        self.remove_bulk(v.PLEX_TYPE_MOVIE, 'section_id', section_id)
+
     def update_userdata(self, xml_element, plex_type):
         """
         Updates the Kodi watched state of the item from PMS. Also retrieves
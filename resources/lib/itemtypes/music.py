@@ -7,6 +7,7 @@ from .common import ItemBase
 from ..plex_api import API
 from ..plex_db import PlexDB
 from ..kodi_db import KodiMusicDB
+from ..kodi_db import music as music_db
 from .. import plex_functions as PF, utils, timing, app, variables as v
 
 LOG = getLogger('PLEX.music')
@@ -29,6 +30,12 @@ class MusicMixin(object):
                                   artcursor=self.artcursor)
         return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            # Uncommitted changes are lost, cached Kodi ids with them
+            music_db.rolled_back()
+        return super(MusicMixin, self).__exit__(exc_type, exc_val, exc_tb)
+
     def update_userdata(self, xml_element, plex_type):
         """
         Updates the Kodi watched state of the item from PMS. Also retrieves
@@ -110,6 +117,24 @@ class MusicMixin(object):
         LOG.debug('Deleted %s %s from all databases',
                   db_item['plex_type'], db_item['plex_id'])
 
+    def reset(self, plex_id, plex_type):
+        """
+        Removes the artist, album or song from all DBs so it can be synced
+        anew. Unlike remove(), leaves its parents and children alone
+        """
+        db_item = self.plexdb.item_by_id(plex_id, plex_type)
+        if not db_item:
+            return
+        LOG.debug('Resetting %s %s with kodi_id %s',
+                  plex_type, plex_id, db_item['kodi_id'])
+        self.plexdb.remove(plex_id, plex_type)
+        if plex_type == v.PLEX_TYPE_SONG:
+            self.remove_song(db_item['kodi_id'], db_item['kodi_pathid'])
+        elif plex_type == v.PLEX_TYPE_ALBUM:
+            self.remove_album(db_item['kodi_id'])
+        elif plex_type == v.PLEX_TYPE_ARTIST:
+            self.remove_artist(db_item['kodi_id'])
+
     def remove_song(self, kodi_id, path_id=None):
         """
         Remove song, orphaned artists and orphaned paths
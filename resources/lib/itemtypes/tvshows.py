@@ -68,9 +68,7 @@ class TvShowMixin(object):
         # SEASON #####
         elif db_item['plex_type'] == v.PLEX_TYPE_SEASON:
             # Remove episodes, season, verify tvshow
-            for episode in self.plexdb.episode_by_season(db_item['plex_id']):
-                self.remove_episode(episode['kodi_id'], episode['kodi_fileid'])
-                self.plexdb.remove(episode['plex_id'], v.PLEX_TYPE_EPISODE)
+            self.remove_bulk(v.PLEX_TYPE_EPISODE, 'season_id', plex_id)
             # Remove season
             self.remove_season(db_item['kodi_id'])
             # Show verification
@@ -82,18 +80,41 @@ class TvShowMixin(object):
         # TVSHOW #####
         elif db_item['plex_type'] == v.PLEX_TYPE_SHOW:
             # Remove episodes, seasons and the tvshow itself
-            for episode in self.plexdb.episode_by_show(db_item['plex_id']):
-                self.remove_episode(episode['kodi_id'],
-                                    episode['kodi_fileid'])
-                self.plexdb.remove(episode['plex_id'], v.PLEX_TYPE_EPISODE)
-            for season in self.plexdb.season_by_show(db_item['plex_id']):
-                self.remove_season(season['kodi_id'])
-                self.plexdb.remove(season['plex_id'], v.PLEX_TYPE_SEASON)
+            self.remove_bulk(v.PLEX_TYPE_EPISODE, 'show_id', plex_id)
+            self.remove_bulk(v.PLEX_TYPE_SEASON, 'show_id', plex_id)
             self.remove_show(db_item['kodi_id'])
 
         LOG.debug('Deleted %s %s from all databases',
                   db_item['plex_type'], db_item['plex_id'])
 
+    def reset(self, plex_id, plex_type):
+        """
+        Removes the show, season or episode from all DBs so it can be synced
+        anew. Unlike remove(), leaves its parents and children alone
+        """
+        db_item = self.plexdb.item_by_id(plex_id, plex_type)
+        if not db_item:
+            return
+        LOG.debug('Resetting %s %s with kodi_id %s',
+                  plex_type, plex_id, db_item['kodi_id'])
+        self.plexdb.remove(plex_id, plex_type)
+        if plex_type == v.PLEX_TYPE_EPISODE:
+            self.remove_episode(db_item['kodi_id'], db_item['kodi_fileid'])
+        elif plex_type == v.PLEX_TYPE_SEASON:
+            self.remove_season(db_item['kodi_id'])
+        elif plex_type == v.PLEX_TYPE_SHOW:
+            self.remove_show(db_item['kodi_id'])
+
+    def remove_section(self, section_id):
+        """
+        Removes all TV shows, seasons and episodes of the Plex library section
+        section_id at once
+        """
+        for plex_type in (v.PLEX_TYPE_EPISODE,
+                          v.PLEX_TYPE_SEASON,
+                          v.PLEX_TYPE_SHOW):
+            self.remove_bulk(plex_type, 'section_id', section_id)
+
     def remove_show(self, kodi_id):
         """
         Remove a TV show, and only the show, no seasons or episodes
@@ -6,6 +6,7 @@ from logging import getLogger
 from .video import KodiVideoDB
 from .music import KodiMusicDB
 from .texture import KodiTextureDB
+from .widgets import KodiWidgetsDB
 
 from .. import path_ops, utils, timing, variables as v
 
@@ -19,7 +20,45 @@ def kodiid_from_filename(path, kodi_type=None, db_type=None):
     you want to poll ('video' or 'music')
     Returns None, <kodi_type> if not possible
     """
-    kodi_id = None
+    return kodiids_from_filenames((path, ), kodi_type, db_type)[0]
+
+
+def kodiids_from_filenames(paths, kodi_type=None, db_type=None):
+    """
+    Same as kodiid_from_filename, but looks up all paths using one single
+    Kodi DB connection. Returns a list of tuples (kodi_id, kodi_type) in the
+    same order as paths
+    """
+    result = []
+    if kodi_type == v.KODI_TYPE_SONG or db_type == 'music':
+        with KodiMusicDB(readonly=True) as kodidb:
+            for path in paths:
+                filename, path = _split_filename(path)
+                try:
+                    kodi_id = kodidb.song_id_from_filename(filename, path)
+                except TypeError:
+                    LOG.debug('No Kodi audio db element found for path %s',
+                              path)
+                    result.append((None, kodi_type))
+                else:
+                    result.append((kodi_id, v.KODI_TYPE_SONG))
+    else:
+        with KodiVideoDB(readonly=True) as kodidb:
+            for path in paths:
+                filename, path = _split_filename(path)
+                try:
+                    kodi_id, typus = kodidb.video_id_from_filename(filename,
+                                                                   path)
+                except TypeError:
+                    LOG.debug('No kodi video db element found for path %s '
+                              'file %s', path, filename)
+                    result.append((None, kodi_type))
+                else:
+                    result.append((kodi_id, typus))
+    return result
+
+
+def _split_filename(path):
     path = utils.try_decode(path)
     try:
         filename = path.rsplit('/', 1)[1]
@@ -27,23 +66,7 @@ def kodiid_from_filename(path, kodi_type=None, db_type=None):
     except IndexError:
         filename = path.rsplit('\\', 1)[1]
         path = path.rsplit('\\', 1)[0] + '\\'
-    if kodi_type == v.KODI_TYPE_SONG or db_type == 'music':
-        with KodiMusicDB() as kodidb:
-            try:
-                kodi_id = kodidb.song_id_from_filename(filename, path)
-            except TypeError:
-                LOG.debug('No Kodi audio db element found for path %s', path)
-            else:
-                kodi_type = v.KODI_TYPE_SONG
-    else:
-        with KodiVideoDB() as kodidb:
-            try:
-                kodi_id, kodi_type = kodidb.video_id_from_filename(filename,
-                                                                   path)
-            except TypeError:
-                LOG.debug('No kodi video db element found for path %s file %s',
-                          path, filename)
-    return kodi_id, kodi_type
+    return filename, path
 
 
 def setup_kodi_default_entries():
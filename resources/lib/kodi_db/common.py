@@ -9,20 +9,23 @@ class KodiDBBase(object):
     """
     Kodi database methods used for all types of items
     """
-    def __init__(self, texture_db=False, cursor=None, artcursor=None):
+    def __init__(self, texture_db=False, cursor=None, artcursor=None,
+                 readonly=False):
         """
-        Allows direct use with a cursor instead of context mgr
+        Allows direct use with a cursor instead of context mgr. Pass
+        readonly=True to open a connection that refuses any writes
         """
         self._texture_db = texture_db
+        self._readonly = readonly
         self.cursor = cursor
         self.artconn = None
         self.artcursor = artcursor
 
     def __enter__(self):
-        self.kodiconn = utils.kodi_sql(self.db_kind)
+        self.kodiconn = utils.kodi_sql(self.db_kind, readonly=self._readonly)
         self.cursor = self.kodiconn.cursor()
         if self._texture_db:
-            self.artconn = utils.kodi_sql('texture')
+            self.artconn = utils.kodi_sql('texture', readonly=self._readonly)
             self.artcursor = self.artconn.cursor()
         return self
 
@@ -121,3 +124,36 @@ class KodiDBBase(object):
             if path_ops.exists(path):
                 path_ops.rmtree(path, ignore_errors=True)
             self.artcursor.execute("DELETE FROM texture WHERE url = ?", (url, ))
+
+    def delete_cached_artwork_bulk(self, urls):
+        """
+        Same as delete_cached_artwork, but for all urls at once
+        """
+        self.temp_ids('pkc_urls', urls, cursor=self.artcursor)
+        for row in self.artcursor.execute('SELECT cachedurl FROM texture WHERE url IN (SELECT id FROM temp.pkc_urls)').fetchall():
+            path = path_ops.translate_path("special://thumbnails/%s"
+                                           % row[0])
+            if path_ops.exists(path):
+                path_ops.rmtree(path, ignore_errors=True)
+        self.artcursor.execute('DELETE FROM texture WHERE url IN (SELECT id FROM temp.pkc_urls)')
+
+    def temp_ids(self, name, ids, cursor=None):
+        """
+        (Re-)fills the temporary table temp.<name> with the ids (or any other
+        values) in its only column id. Lets us use set-based SQL like
+        DELETE FROM x WHERE y IN (SELECT id FROM temp.<name>)
+        """
+        cursor = cursor or self.cursor
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS %s(id PRIMARY KEY)'
+                       % name)
+        cursor.execute('DELETE FROM temp.%s' % name)
+        cursor.executemany('INSERT OR IGNORE INTO temp.%s(id) VALUES (?)'
+                           % name, ((x, ) for x in ids))
+
+    def temp_table(self, name, query, args=()):
+        """
+        (Re-)creates the temporary table temp.<name> with the result of the
+        SELECT statement query. Name the query's only column id
+        """
+        self.cursor.execute('DROP TABLE IF EXISTS temp.%s' % name)
+        self.cursor.execute('CREATE TEMP TABLE %s AS %s' % (name, query), args)
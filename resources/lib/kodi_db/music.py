@@ -9,9 +9,103 @@ from .. import variables as v
 LOG = getLogger('PLEX.kodi_db.music')
 
 
+class DimensionCache(object):
+    """
+    In-memory lookup of a Kodi music DB table's ids, e.g. strGenre: idGenre.
+    Only caches while a sync is running, see start_caching()
+    """
+    def __init__(self, name):
+        self.name = name
+        # key: Kodi id
+        self.ids = {}
+        # Kodi id: set of keys
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if not CACHING[0]:
+            return
+        kodi_id = self.ids.get(key)
+        if kodi_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return kodi_id
+
+    def set(self, key, kodi_id):
+        if not CACHING[0]:
+            return
+        self.ids[key] = kodi_id
+        self.keys.setdefault(kodi_id, set()).add(key)
+
+    def forget(self, kodi_id):
+        """
+        Call after deleting or changing the Kodi DB entry kodi_id
+        """
+        for key in self.keys.pop(kodi_id, ()):
+            self.ids.pop(key, None)
+
+    def clear(self):
+        self.ids.clear()
+        self.keys.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def log_stats(self):
+        LOG.info('Music DB %s cache: %s entries, %s hits, %s misses',
+                 self.name, len(self.ids), self.hits, self.misses)
+
+
+# Artist, genre and path cardinality is tiny compared to the number of songs
+ARTISTS = DimensionCache('artist')
+GENRES = DimensionCache('genre')
+PATHS = DimensionCache('path')
+CACHES = (ARTISTS, GENRES, PATHS)
+# Whether we're caching at all
+CACHING = [False]
+
+
+def start_caching():
+    """
+    Call when a sync starts that will write many music items
+    """
+    for cache in CACHES:
+        cache.clear()
+    CACHING[0] = True
+
+
+def stop_caching():
+    """
+    Call when the sync is done. Logs the cache statistics and empties the
+    caches - Kodi itself might e.g. clean its library in the meantime
+    """
+    if not CACHING[0]:
+        return
+    CACHING[0] = False
+    for cache in CACHES:
+        cache.log_stats()
+        cache.clear()
+
+
+def rolled_back():
+    """
+    Call if changes to the Kodi music DB were rolled back - cached ids might
+    not exist anymore
+    """
+    for cache in CACHES:
+        cache.ids.clear()
+        cache.keys.clear()
+
+
 class KodiMusicDB(common.KodiDBBase):
     db_kind = 'music'
 
+    def __exit__(self, e_typ, e_val, trcbak):
+        if e_typ:
+            rolled_back()
+        return super(KodiMusicDB, self).__exit__(e_typ, e_val, trcbak)
+
     def add_path(self, path):
         """
         Add the path (unicode) to the music DB, if it does not exist already.
@@ -19,6 +113,9 @@ class KodiMusicDB(common.KodiDBBase):
         """
         # SQL won't return existing paths otherwise
         path = '' if path is None else path
+        pathid = PATHS.get(path)
+        if pathid is not None:
+            return pathid
         self.cursor.execute('SELECT idPath FROM path WHERE strPath = ?',
                             (path,))
         try:
@@ -31,6 +128,7 @@ class KodiMusicDB(common.KodiDBBase):
                                 VALUES (?, ?, ?)
                                 ''',
                                 (pathid, path, '123'))
+        PATHS.set(path, pathid)
         return pathid
 
     def update_path(self, path, kodi_pathid):
@@ -39,6 +137,7 @@ class KodiMusicDB(common.KodiDBBase):
             SET strPath = ?, strHash = ?
             WHERE idPath = ?
         ''', (path, '123', kodi_pathid))
+        PATHS.forget(kodi_pathid)
 
     def song_id_from_filename(self, filename, path):
         """
@@ -115,6 +214,7 @@ class KodiMusicDB(common.KodiDBBase):
                 if not self.cursor.fetchone():
                     self.cursor.execute('DELETE FROM genre WHERE idGenre = ?',
                                         (genre[0], ))
+                    GENRES.forget(genre[0])
 
     def delete_album_from_album_genre(self, album_id):
         """
@@ -136,6 +236,7 @@ class KodiMusicDB(common.KodiDBBase):
                 if not self.cursor.fetchone():
                     self.cursor.execute('DELETE FROM genre WHERE idGenre = ?',
                                         (genre[0], ))
+                    GENRES.forget(genre[0])
 
     def new_album_id(self):
         self.cursor.execute('SELECT COALESCE(MAX(idAlbum), 0) FROM album')
@@ -239,6 +340,27 @@ class KodiMusicDB(common.KodiDBBase):
             VALUES (?, ?, ?)
         ''', (artist_id, albumname, year))
 
+    def genre_id(self, genre):
+        """
+        Returns the Kodi idGenre for genre (unicode), adding the genre if
+        it does not exist yet
+        """
+        genreid = GENRES.get(genre)
+        if genreid is not None:
+            return genreid
+        self.cursor.execute('SELECT idGenre FROM genre WHERE strGenre = ?',
+                            (genre, ))
+        try:
+            genreid = self.cursor.fetchone()[0]
+        except TypeError:
+            # Create the genre
+            self.cursor.execute('SELECT COALESCE(MAX(idGenre),0) FROM genre')
+            genreid = self.cursor.fetchone()[0] + 1
+            self.cursor.execute('INSERT INTO genre(idGenre, strGenre) VALUES(?, ?)',
+                                (genreid, genre))
+        GENRES.set(genre, genreid)
+        return genreid
+
     def add_music_genres(self, kodiid, genres, mediatype):
         """
         Adds a list of genres (list of unicode) for a certain Kodi item
@@ -248,16 +370,7 @@ class KodiMusicDB(common.KodiDBBase):
             self.cursor.execute('DELETE FROM album_genre WHERE idAlbum = ?',
                                 (kodiid, ))
             for genre in genres:
-                self.cursor.execute('SELECT idGenre FROM genre WHERE strGenre = ?',
-                                    (genre, ))
-                try:
-                    genreid = self.cursor.fetchone()[0]
-                except TypeError:
-                    # Create the genre
-                    self.cursor.execute('SELECT COALESCE(MAX(idGenre),0) FROM genre')
-                    genreid = self.cursor.fetchone()[0] + 1
-                    self.cursor.execute('INSERT INTO genre(idGenre, strGenre) VALUES(?, ?)',
-                                        (genreid, genre))
+                genreid = self.genre_id(genre)
                 self.cursor.execute('''
                     INSERT OR REPLACE INTO album_genre(
                         idGenre,
@@ -269,16 +382,7 @@ class KodiMusicDB(common.KodiDBBase):
             self.cursor.execute('DELETE FROM song_genre WHERE idSong = ?',
                                 (kodiid, ))
             for genre in genres:
-                self.cursor.execute('SELECT idGenre FROM genre WHERE strGenre = ?',
-                                    (genre, ))
-                try:
-                    genreid = self.cursor.fetchone()[0]
-                except TypeError:
-                    # Create the genre
-                    self.cursor.execute('SELECT COALESCE(MAX(idGenre),0) FROM genre')
-                    genreid = self.cursor.fetchone()[0] + 1
-                    self.cursor.execute('INSERT INTO genre(idGenre, strGenre) values(?, ?)',
-                                        (genreid, genre))
+                genreid = self.genre_id(genre)
                 self.cursor.execute('''
                     INSERT OR REPLACE INTO song_genre(
                         idGenre,
@@ -391,6 +495,11 @@ class KodiMusicDB(common.KodiDBBase):
         """
         Adds a single artist's name to the db
         """
+        # The same name and MusicBrainz id always yield the same artist
+        key = (name, musicbrainz)
+        artistid = ARTISTS.get(key)
+        if artistid is not None:
+            return artistid
         self.cursor.execute('''
             SELECT idArtist, strArtist
             FROM artist
@@ -421,6 +530,9 @@ class KodiMusicDB(common.KodiDBBase):
             if artistname != name:
                 self.cursor.execute('UPDATE artist SET strArtist = ? WHERE idArtist = ?',
                                     (name, artistid,))
+                # Looking up the old name would rename the artist again
+                ARTISTS.forget(artistid)
+        ARTISTS.set(key, artistid)
         return artistid
 
     def update_artist(self, *args):
@@ -439,6 +551,7 @@ class KodiMusicDB(common.KodiDBBase):
 
     def remove_path(self, path_id):
         self.cursor.execute('DELETE FROM path WHERE idPath = ?', (path_id, ))
+        PATHS.forget(path_id)
 
     def add_song_artist(self, artist_id, song_id, artist_name):
         self.cursor.execute('''
@@ -504,3 +617,4 @@ class KodiMusicDB(common.KodiDBBase):
                             (kodi_id, ))
         self.cursor.execute('DELETE FROM discography WHERE idArtist = ?',
                             (kodi_id, ))
+        ARTISTS.forget(kodi_id)
@@ -9,6 +9,22 @@ from .. import path_ops, timing, variables as v, app
 
 LOG = getLogger('PLEX.kodi_db.video')
 
+# kodi_type: (table, id column)
+ITEM_TABLES = {
+    v.KODI_TYPE_MOVIE: ('movie', 'idMovie'),
+    v.KODI_TYPE_SHOW: ('tvshow', 'idShow'),
+    v.KODI_TYPE_SEASON: ('seasons', 'idSeason'),
+    v.KODI_TYPE_EPISODE: ('episode', 'idEpisode')
+}
+# (link table, table, id column) for entries shared by several items
+LINK_TABLES = (
+    ('country_link', 'country', 'country_id'),
+    ('genre_link', 'genre', 'genre_id'),
+    ('studio_link', 'studio', 'studio_id'),
+    ('tag_link', 'tag', 'tag_id')
+)
+PEOPLE_LINK_TABLES = ('actor_link', 'director_link', 'writer_link')
+
 
 class KodiVideoDB(common.KodiDBBase):
     db_kind = 'video'
@@ -992,6 +1008,105 @@ class KodiVideoDB(common.KodiDBBase):
     def remove_movie(self, kodi_id):
         self.cursor.execute('DELETE FROM movie WHERE idMovie = ?', (kodi_id,))
 
+    def remove_items(self, kodi_type, kodi_ids):
+        """
+        Removes all items kodi_ids of kodi_type (movie, tvshow, season or
+        episode) using set-based SQL instead of one item after the other.
+        Deletes files, artwork, ratings, links to people, genres, tags etc. as
+        well as any such entries, paths and movie sets orphaned afterwards.
+        Does NOT remove the seasons and episodes of a tvshow
+        """
+        table, key = ITEM_TABLES[kodi_type]
+        self.temp_ids('pkc_items', kodi_ids)
+        items = 'SELECT id FROM temp.pkc_items'
+        if kodi_type in (v.KODI_TYPE_MOVIE, v.KODI_TYPE_EPISODE):
+            self.temp_table('pkc_files',
+                            'SELECT idFile AS id FROM %s WHERE %s IN (%s)'
+                            % (table, key, items))
+            if not app.SYNC.direct_paths and kodi_type == v.KODI_TYPE_EPISODE:
+                # Hack for the 2 entries for episodes for addon paths
+                self.cursor.execute('''
+                    INSERT OR IGNORE INTO temp.pkc_files(id)
+                    SELECT idFile FROM files WHERE strFilename IN (
+                        SELECT strFilename FROM files
+                        WHERE idFile IN (SELECT id FROM temp.pkc_files))
+                ''')
+            self._remove_files()
+        if kodi_type == v.KODI_TYPE_MOVIE:
+            self.temp_table('pkc_sets',
+                            'SELECT DISTINCT idSet AS id FROM movie WHERE idMovie IN (%s) AND idSet IS NOT NULL'
+                            % items)
+        self.delete_cached_artwork_bulk(
+            [x[0] for x in self.cursor.execute('SELECT url FROM art WHERE media_type = ? AND media_id IN (%s)' % items,
+                                               (kodi_type, ))])
+        for link_table in ('art', 'uniqueid', 'rating'):
+            self.cursor.execute('DELETE FROM %s WHERE media_type = ? AND media_id IN (%s)'
+                                % (link_table, items), (kodi_type, ))
+        for link_table, entry_table, entry_key in LINK_TABLES:
+            self.temp_table('pkc_entries',
+                            'SELECT DISTINCT %s AS id FROM %s WHERE media_type = ? AND media_id IN (%s)'
+                            % (entry_key, link_table, items),
+                            (kodi_type, ))
+            self.cursor.execute('DELETE FROM %s WHERE media_type = ? AND media_id IN (%s)'
+                                % (link_table, items), (kodi_type, ))
+            self.cursor.execute('''
+                DELETE FROM {1} WHERE {2} IN (SELECT id FROM temp.pkc_entries)
+                AND NOT EXISTS (SELECT 1 FROM {0} WHERE {0}.{2} = {1}.{2})
+            '''.format(link_table, entry_table, entry_key))
+        self._remove_people(kodi_type, items)
+        self.cursor.execute('DELETE FROM %s WHERE %s IN (%s)'
+                            % (table, key, items))
+        if kodi_type == v.KODI_TYPE_MOVIE:
+            self.cursor.execute('''
+                DELETE FROM sets WHERE idSet IN (SELECT id FROM temp.pkc_sets)
+                AND NOT EXISTS (SELECT 1 FROM movie WHERE movie.idSet = sets.idSet)
+            ''')
+
+    def _remove_files(self):
+        """
+        Set-based remove_file for all file ids in temp.pkc_files, including
+        the paths orphaned afterwards
+        """
+        files = 'SELECT id FROM temp.pkc_files'
+        self.temp_table('pkc_paths',
+                        'SELECT DISTINCT idPath AS id FROM files WHERE idFile IN (%s)'
+                        % files)
+        for table in ('files', 'bookmark', 'settings', 'streamdetails',
+                      'stacktimes'):
+            self.cursor.execute('DELETE FROM %s WHERE idFile IN (%s)'
+                                % (table, files))
+        self.cursor.execute('''
+            DELETE FROM path WHERE idPath IN (SELECT id FROM temp.pkc_paths)
+            AND NOT EXISTS (SELECT 1 FROM files WHERE files.idPath = path.idPath)
+        ''')
+
+    def _remove_people(self, kodi_type, items):
+        """
+        Set-based modify_people(kodi_id, kodi_type) for the SELECT statement
+        items, including the people (and their artwork) orphaned afterwards
+        """
+        self.temp_table('pkc_people',
+                        ' UNION '.join('SELECT actor_id AS id FROM %s WHERE media_type = ? AND media_id IN (%s)'
+                                       % (link_table, items)
+                                       for link_table in PEOPLE_LINK_TABLES),
+                        (kodi_type, ) * len(PEOPLE_LINK_TABLES))
+        for link_table in PEOPLE_LINK_TABLES:
+            self.cursor.execute('DELETE FROM %s WHERE media_type = ? AND media_id IN (%s)'
+                                % (link_table, items), (kodi_type, ))
+            # Keep only the people that are now orphaned
+            self.cursor.execute('''
+                DELETE FROM temp.pkc_people WHERE EXISTS (
+                    SELECT 1 FROM {0} WHERE {0}.actor_id = pkc_people.id)
+            '''.format(link_table))
+        people = 'SELECT id FROM temp.pkc_people'
+        self.delete_cached_artwork_bulk(
+            [x[0] for x in self.cursor.execute('SELECT url FROM art WHERE media_type = ? AND media_id IN (%s)' % people,
+                                               ('actor', ))])
+        self.cursor.execute('DELETE FROM art WHERE media_type = ? AND media_id IN (%s)'
+                            % people, ('actor', ))
+        self.cursor.execute('DELETE FROM actor WHERE actor_id IN (%s)'
+                            % people)
+
     def update_userrating(self, kodi_id, kodi_type, userrating):
         """
         Updates userrating
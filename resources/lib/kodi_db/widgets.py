@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Answers the PKC TV show widgets (next up, in progress, recently added, on
+deck) with a single SQL query each against the Kodi video DB instead of one
+JSON-RPC call per TV show. Results mimic the Kodi JSON-RPC episode dicts so
+they can be fed to entrypoint.create_listitem() unchanged.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+
+from . import video
+from .. import variables as v
+
+LOG = getLogger('PLEX.kodi_db.widgets')
+
+# All TV shows tagged with a certain Plex library name
+TAGGED_SHOWS = '''
+    SELECT tag_link.media_id FROM tag_link
+    JOIN tag ON tag.tag_id = tag_link.tag_id
+    WHERE tag_link.media_type = 'tvshow' AND tag.name = ? COLLATE NOCASE
+'''
+
+# Kodi's own definition of the "inprogress" filter for TV shows
+SHOW_IN_PROGRESS = '''
+    ((tv.watchedcount > 0 AND tv.watchedcount < tv.totalCount) OR
+     (tv.watchedcount = 0 AND EXISTS (
+         SELECT 1 FROM episode
+         JOIN bookmark ON bookmark.idFile = episode.idFile
+             AND bookmark.type = 1
+         WHERE episode.idShow = tv.idShow)))
+'''
+
+EPISODE_COLUMNS = '''
+    ev.idEpisode, ev.idFile, ev.c00, ev.c01, ev.c04, ev.c05, ev.c09, ev.c10,
+    ev.c12, ev.c13, ev.idShow, ev.idSeason, ev.strFileName, ev.strPath,
+    ev.playCount, ev.lastPlayed, ev.dateAdded, ev.strTitle,
+    ev.resumeTimeInSeconds, ev.totalTimeInSeconds, ev.rating
+'''
+
+SEASON_AND_EPISODE = 'CAST(episode.c12 AS INTEGER), CAST(episode.c13 AS INTEGER)'
+
+
+class KodiWidgetsDB(video.KodiVideoDB):
+    """
+    Read-only access to the Kodi video DB for the PKC widgets. Every method
+    returns at most limit items
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('readonly', True)
+        super(KodiWidgetsDB, self).__init__(*args, **kwargs)
+
+    def next_up(self, tagname, limit, ignore_specials=False):
+        """
+        Returns the first unwatched episode for every in-progress TV show of
+        the Plex library tagname, most recently watched show first
+        """
+        condition = 'COALESCE(files.playCount, 0) = 0'
+        if ignore_specials:
+            condition += ' AND CAST(episode.c12 AS INTEGER) > 0'
+        return self._first_episode_per_show(tagname, limit, condition,
+                                            SEASON_AND_EPISODE)
+
+    def on_deck(self, tagname, limit, ignore_specials=False):
+        """
+        Same as next_up, but an episode the user started watching takes
+        precedence over the first unwatched episode of a TV show
+        """
+        condition = 'COALESCE(files.playCount, 0) = 0'
+        if ignore_specials:
+            condition += ' AND CAST(episode.c12 AS INTEGER) > 0'
+        condition = 'bookmark.idBookmark IS NOT NULL OR (%s)' % condition
+        return self._first_episode_per_show(
+            tagname, limit, condition,
+            'bookmark.idBookmark IS NULL, %s' % SEASON_AND_EPISODE)
+
+    def in_progress(self, tagname, limit):
+        """
+        Returns all episodes with a resume point for the Plex library tagname,
+        most recently watched show first
+        """
+        self.cursor.execute('''
+            SELECT %s FROM episode_view AS ev
+            JOIN tvshow_view AS tv ON tv.idShow = ev.idShow
+            WHERE ev.resumeTimeInSeconds > 0 AND ev.idShow IN (%s)
+            ORDER BY tv.lastPlayed DESC,
+                CAST(ev.c12 AS INTEGER), CAST(ev.c13 AS INTEGER)
+            LIMIT ?
+        ''' % (EPISODE_COLUMNS, TAGGED_SHOWS), (tagname, limit))
+        return self._episodes(self.cursor.fetchall())
+
+    def recently_added(self, tagname, limit, unwatched_only=False):
+        """
+        Returns the most recently added episodes of the Plex library tagname
+        """
+        self.cursor.execute('''
+            SELECT %s FROM episode_view AS ev
+            WHERE ev.idShow IN (%s) %s
+            ORDER BY ev.dateAdded DESC
+            LIMIT ?
+        ''' % (EPISODE_COLUMNS,
+               TAGGED_SHOWS,
+               'AND COALESCE(ev.playCount, 0) < 1' if unwatched_only else ''),
+            (tagname, limit))
+        return self._episodes(self.cursor.fetchall())
+
+    def _first_episode_per_show(self, tagname, limit, condition, order):
+        """
+        Picks, for every in-progress TV show, the first episode satisfying
+        condition when sorted by order
+        """
+        self.cursor.execute('''
+            SELECT %s FROM tvshow_view AS tv
+            JOIN episode_view AS ev ON ev.idEpisode = (
+                SELECT episode.idEpisode FROM episode
+                JOIN files ON files.idFile = episode.idFile
+                LEFT JOIN bookmark ON bookmark.idFile = episode.idFile
+                    AND bookmark.type = 1
+                WHERE episode.idShow = tv.idShow AND (%s)
+                ORDER BY %s
+                LIMIT 1)
+            WHERE tv.idShow IN (%s) AND %s
+            ORDER BY tv.lastPlayed DESC
+            LIMIT ?
+        ''' % (EPISODE_COLUMNS, condition, order, TAGGED_SHOWS,
+               SHOW_IN_PROGRESS), (tagname, limit))
+        return self._episodes(self.cursor.fetchall())
+
+    def _episodes(self, rows):
+        """
+        Turns episode_view rows into dicts like Kodi's JSON-RPC returns them.
+        Art, cast and streamdetails are fetched for all rows at once
+        """
+        if not rows:
+            return []
+        episode_ids = [row[0] for row in rows]
+        file_ids = [row[1] for row in rows]
+        art = self._art_by_id(v.KODI_TYPE_EPISODE, episode_ids)
+        season_art = self._art_by_id(v.KODI_TYPE_SEASON,
+                                     set(row[11] for row in rows))
+        show_art = self._art_by_id(v.KODI_TYPE_SHOW,
+                                   set(row[10] for row in rows))
+        cast = self._cast_by_id(episode_ids)
+        streams = self._streamdetails_by_id(file_ids)
+        episodes = []
+        for row in rows:
+            item_art = dict(art.get(row[0], {}))
+            for kind, url in season_art.get(row[11], {}).iteritems():
+                item_art['season.%s' % kind] = url
+            for kind, url in show_art.get(row[10], {}).iteritems():
+                item_art['tvshow.%s' % kind] = url
+            filename = row[12] or ''
+            episodes.append({
+                'episodeid': row[0],
+                'title': row[2],
+                'plot': row[3] or '',
+                'writer': row[4].split(' / ') if row[4] else [],
+                'firstaired': row[5] or '',
+                'runtime': int(row[6] or 0),
+                'director': row[7].split(' / ') if row[7] else [],
+                'season': int(row[8] or 0),
+                'episode': int(row[9] or 0),
+                'tvshowid': row[10],
+                # Kodi stores add-on paths as full URLs in strFileName
+                'file': filename if '://' in filename
+                else '%s%s' % (row[13] or '', filename),
+                'playcount': row[14] or 0,
+                'lastplayed': row[15] or '',
+                'dateadded': row[16] or '',
+                'showtitle': row[17],
+                'resume': {'position': row[18] or 0.0,
+                           'total': row[19] or 0.0},
+                'rating': row[20] or 0.0,
+                'art': item_art,
+                'cast': cast.get(row[0], []),
+                'streamdetails': streams.get(row[1], {'video': [],
+                                                      'audio': [],
+                                                      'subtitle': []})
+            })
+        return episodes
+
+    def _art_by_id(self, kodi_type, kodi_ids):
+        art = {}
+        query = '''
+            SELECT media_id, type, url FROM art
+            WHERE media_type = ? AND media_id IN (%s)
+        ''' % ','.join('?' * len(kodi_ids))
+        for media_id, kind, url in self.cursor.execute(
+                query, [kodi_type] + list(kodi_ids)):
+            art.setdefault(media_id, {})[kind] = url
+        return art
+
+    def _cast_by_id(self, episode_ids):
+        cast = {}
+        query = '''
+            SELECT actor_link.media_id, actor.name, actor_link.role
+            FROM actor_link
+            JOIN actor ON actor.actor_id = actor_link.actor_id
+            WHERE actor_link.media_type = ? AND actor_link.media_id IN (%s)
+            ORDER BY actor_link.cast_order
+        ''' % ','.join('?' * len(episode_ids))
+        for media_id, name, role in self.cursor.execute(
+                query, [v.KODI_TYPE_EPISODE] + episode_ids):
+            cast.setdefault(media_id, []).append({'name': name,
+                                                  'role': role or ''})
+        return cast
+
+    def _streamdetails_by_id(self, file_ids):
+        streams = {}
+        query = '''
+            SELECT idFile, iStreamType, strVideoCodec, fVideoAspect,
+                iVideoWidth, iVideoHeight, iVideoDuration, strStereoMode,
+                strAudioCodec, iAudioChannels, strAudioLanguage,
+                strSubtitleLanguage
+            FROM streamdetails
+            WHERE idFile IN (%s)
+        ''' % ','.join('?' * len(file_ids))
+        for row in self.cursor.execute(query, file_ids):
+            details = streams.setdefault(row[0], {'video': [],
+                                                  'audio': [],
+                                                  'subtitle': []})
+            if row[1] == 0:
+                details['video'].append({'codec': row[2] or '',
+                                         'aspect': row[3] or 0.0,
+                                         'width': row[4] or 0,
+                                         'height': row[5] or 0,
+                                         'duration': row[6] or 0,
+                                         'stereomode': row[7] or ''})
+            elif row[1] == 1:
+                details['audio'].append({'codec': row[8] or '',
+                                         'channels': row[9] or 0,
+                                         'language': row[10] or ''})
+            elif row[1] == 2:
+                details['subtitle'].append({'language': row[11] or ''})
+        return streams
@@ -14,7 +14,8 @@ from . import kodi_db
 from .downloadutils import DownloadUtils as DU
 from . import utils, timing, plex_functions as PF, playback
 from . import json_rpc as js, playqueue as PQ, playlist_func as PL
-from . import backgroundthread, app, variables as v
+from . import backgroundthread, widget_cache, metadata_cache, loghandler, app
+from . import variables as v
 
 ###############################################################################
 
@@ -53,8 +54,12 @@ class KodiMonitor(xbmc.Monitor):
         Monitor the PKC settings for changes made by the user
         """
         LOG.debug('PKC settings change detected')
+        utils.reload_settings()
+        loghandler.reload_settings()
         # Assume that the user changed something so we can try to reconnect
         app.APP.suspend = False
+        # Widget listings depend on some of the settings
+        widget_cache.invalidate()
 
     def onNotification(self, sender, method, data):
         """
@@ -96,12 +101,16 @@ class KodiMonitor(xbmc.Monitor):
         elif method == 'Playlist.OnAdd':
             with app.APP.lock_playqueues:
                 self._playlist_onadd(data)
+            PQ.CHANGED.set()
         elif method == 'Playlist.OnRemove':
             self._playlist_onremove(data)
+            PQ.CHANGED.set()
         elif method == 'Playlist.OnClear':
             with app.APP.lock_playqueues:
                 self._playlist_onclear(data)
+            PQ.CHANGED.set()
         elif method == "VideoLibrary.OnUpdate":
+            widget_cache.invalidate()
             # Manually marking as watched/unwatched
             playcount = data.get('playcount')
             item = data.get('item')
@@ -411,6 +420,8 @@ class KodiMonitor(xbmc.Monitor):
         status['playmethod'] = item.playmethod
         status['playcount'] = item.playcount
         LOG.debug('Set the player state: %s', status)
+        # The user is likely to play these next
+        metadata_cache.prefetch_playqueue(playqueue, pos)
 
 
 def _playback_cleanup(ended=False):
@@ -494,6 +505,9 @@ def _record_playstate(status, ended):
                           playcount,
                           last_played,
                           status['plex_type'])
+    # The resume point changed
+    metadata_cache.invalidate(status['plex_id'])
+    widget_cache.invalidate()
     # Hack to force "in progress" widget to appear if it wasn't visible before
     if (app.APP.force_reload_skin and
             xbmc.getCondVisibility('Window.IsVisible(Home.xml)')):
@@ -3,7 +3,7 @@
 from __future__ import absolute_import, division, unicode_literals
 import xbmc
 
-from .. import app
+from .. import widget_cache, app
 
 
 class libsync_mixin(object):
@@ -16,6 +16,7 @@ def update_kodi_library(video=True, music=True):
     """
     Updates the Kodi library and thus refreshes the Kodi views and widgets
     """
+    widget_cache.invalidate()
     if video:
         xbmc.executebuiltin('UpdateLibrary(video)')
     if music:
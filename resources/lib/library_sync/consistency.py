@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Bulk SQL cross-checks of the Plex DB against Kodi's video and music DBs for
+repair syncs. Lets us re-download and rewrite only the items that are broken
+instead of every single item of the library.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from sqlite3 import connect
+
+from .. import utils, variables as v, app
+from ..kodi_db import KodiVideoDB, KodiMusicDB
+
+LOG = getLogger('PLEX.sync.consistency')
+
+# plex_type: (Kodi DB, Kodi table, Kodi id column,
+#             Plex DB column with the plex_id we need to download again,
+#             Plex DB columns referencing Kodi entries,
+#             Kodi columns of the item referencing other Kodi entries)
+CHECKS = {
+    v.PLEX_TYPE_MOVIE: ('video', 'movie', 'idMovie', 'plex_id',
+                        (('kodi_fileid', 'files', 'idFile'),
+                         ('kodi_pathid', 'path', 'idPath')),
+                        (('idFile', 'files', 'idFile'), )),
+    v.PLEX_TYPE_SHOW: ('video', 'tvshow', 'idShow', 'plex_id',
+                       (('kodi_pathid', 'path', 'idPath'), ),
+                       ()),
+    v.PLEX_TYPE_SEASON: ('video', 'seasons', 'idSeason', 'plex_id',
+                         (),
+                         (('idShow', 'tvshow', 'idShow'), )),
+    v.PLEX_TYPE_EPISODE: ('video', 'episode', 'idEpisode', 'plex_id',
+                          (('kodi_fileid', 'files', 'idFile'),
+                           ('kodi_pathid', 'path', 'idPath')),
+                          (('idFile', 'files', 'idFile'),
+                           ('idShow', 'tvshow', 'idShow'),
+                           ('idSeason', 'seasons', 'idSeason'))),
+    v.PLEX_TYPE_ARTIST: ('music', 'artist', 'idArtist', 'plex_id',
+                         (),
+                         ()),
+    v.PLEX_TYPE_ALBUM: ('music', 'album', 'idAlbum', 'plex_id',
+                        (),
+                        ()),
+    # Songs are synced together with their album
+    v.PLEX_TYPE_SONG: ('music', 'song', 'idSong', 'album_id',
+                       (('kodi_pathid', 'path', 'idPath'), ),
+                       (('idPath', 'path', 'idPath'),
+                        ('idAlbum', 'album', 'idAlbum'))),
+}
+# The Plex types we check for every Plex type that full_sync processes
+CHECKED_WITH = {
+    v.PLEX_TYPE_ALBUM: (v.PLEX_TYPE_ALBUM, v.PLEX_TYPE_SONG)
+}
+# Kodi DB: (media_type, table, id column) of items that may have art, uniqueid
+# and rating entries
+MEDIA_TABLES = {
+    'video': ((v.KODI_TYPE_MOVIE, 'movie', 'idMovie'),
+              (v.KODI_TYPE_SHOW, 'tvshow', 'idShow'),
+              (v.KODI_TYPE_SEASON, 'seasons', 'idSeason'),
+              (v.KODI_TYPE_EPISODE, 'episode', 'idEpisode'),
+              (v.KODI_TYPE_SET, 'sets', 'idSet'),
+              ('actor', 'actor', 'actor_id')),
+    'music': ((v.KODI_TYPE_ARTIST, 'artist', 'idArtist'),
+              (v.KODI_TYPE_ALBUM, 'album', 'idAlbum'),
+              (v.KODI_TYPE_SONG, 'song', 'idSong'))
+}
+
+
+def _queries(plex_type):
+    _, table, key, refetch, plex_refs, kodi_refs = CHECKS[plex_type]
+    select = 'SELECT p.plex_id, p.%s FROM %s AS p' % (refetch, plex_type)
+    # Kodi item is missing
+    yield ('%s WHERE p.section_id = ? AND (p.kodi_id IS NULL OR '
+           'p.kodi_id NOT IN (SELECT %s FROM kodi.%s))'
+           % (select, key, table))
+    # Plex DB references Kodi entries that do not exist
+    for column, ref_table, ref_key in plex_refs:
+        yield ('%s WHERE p.section_id = ? AND p.%s IS NOT NULL AND '
+               'p.%s NOT IN (SELECT %s FROM kodi.%s)'
+               % (select, column, column, ref_key, ref_table))
+    # Kodi item references Kodi entries that do not exist
+    for column, ref_table, ref_key in kodi_refs:
+        yield ('%s JOIN kodi.%s AS k ON k.%s = p.kodi_id '
+               'WHERE p.section_id = ? AND (k.%s IS NULL OR '
+               'k.%s NOT IN (SELECT %s FROM kodi.%s))'
+               % (select, table, key, column, column, ref_key, ref_table))
+    if 'kodi_fileid' in (x[0] for x in plex_refs):
+        # Kodi item uses another file than we think it does
+        yield ('%s JOIN kodi.%s AS k ON k.%s = p.kodi_id '
+               'WHERE p.section_id = ? AND k.idFile IS NOT p.kodi_fileid'
+               % (select, table, key))
+        # Kodi file lives in a path that does not exist
+        yield ('%s JOIN kodi.files AS f ON f.idFile = p.kodi_fileid '
+               'WHERE p.section_id = ? AND '
+               'f.idPath NOT IN (SELECT idPath FROM kodi.path)'
+               % select)
+
+
+def broken_items(section_id, plex_type):
+    """
+    Returns a list of (plex_id, plex_type, plex_id to download) for all
+    items of section_id whose entries in the Kodi DB are missing or broken.
+    Checks the tracks of albums as well
+    """
+    result = set()
+    for checked_type in CHECKED_WITH.get(plex_type, (plex_type, )):
+        conn = connect(utils.db_path('plex'), timeout=5.0)
+        try:
+            conn.execute('PRAGMA query_only=1;')
+            conn.execute('ATTACH DATABASE ? AS kodi',
+                         (utils.db_path(CHECKS[checked_type][0]), ))
+            for query in _queries(checked_type):
+                result.update((plex_id, checked_type, refetch) for
+                              plex_id, refetch in
+                              conn.execute(query, (section_id, )))
+        finally:
+            conn.close()
+    LOG.info('Found %s broken items of type %s in section %s',
+             len(result), plex_type, section_id)
+    return list(result)
+
+
+def delete_orphans():
+    """
+    Deletes the Kodi art, uniqueid and rating entries of items that do not
+    exist anymore. Kodi would otherwise show them for the next item that
+    happens to get the same id. Returns the number of deleted entries
+    """
+    deleted = 0
+    with KodiVideoDB() as kodidb:
+        for kodi_type, table, key in MEDIA_TABLES['video']:
+            for link_table in ('art', 'uniqueid', 'rating'):
+                kodidb.cursor.execute('''
+                    DELETE FROM %s WHERE media_type = ?
+                    AND media_id NOT IN (SELECT %s FROM %s)
+                ''' % (link_table, key, table), (kodi_type, ))
+                deleted += kodidb.cursor.rowcount
+    if app.SYNC.enable_music:
+        with KodiMusicDB() as kodidb:
+            for kodi_type, table, key in MEDIA_TABLES['music']:
+                kodidb.cursor.execute('''
+                    DELETE FROM art WHERE media_type = ?
+                    AND media_id NOT IN (SELECT %s FROM %s)
+                ''' % (key, table), (kodi_type, ))
+                deleted += kodidb.cursor.rowcount
+    LOG.info('Deleted %s orphaned art, uniqueid and rating entries', deleted)
+    return deleted
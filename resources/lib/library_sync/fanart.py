@@ -6,7 +6,7 @@ from . import common
 from ..plex_api import API
 from ..plex_db import PlexDB
 from ..kodi_db import KodiVideoDB
-from .. import backgroundthread, utils
+from .. import backgroundthread, startup, utils
 from .. import itemtypes, plex_functions as PF, variables as v, app
 
 
@@ -52,6 +52,7 @@ class FanartThread(backgroundthread.KillableThread):
                     for plex_id in func(typus):
                         if self.isCanceled() or self.isSuspended():
                             break
+                        startup.throttle()
                         process_fanart(plex_id, typus, self.refresh)
                     if self.isCanceled() or self.isSuspended():
                         break
@@ -11,11 +11,14 @@ from StringIO import StringIO
 
 from .get_metadata import GetMetadataTask, reset_collections
 from .process_metadata import InitNewSection, UpdateLastSyncAndPlaystate, \
-    ProcessMetadata, DeleteItem
-from . import common, sections
+    ProcessMetadata, DeleteItem, ResetItem
+from . import common, sections, consistency
 from .. import utils, timing, backgroundthread, variables as v, app
-from .. import plex_functions as PF, itemtypes
+from .. import plex_functions as PF, itemtypes, metadata_store
+from .. import response_cache
+from ..concurrency import CONTROLLER
 from ..plex_db import PlexDB
+from ..kodi_db import music as music_db
 
 if (v.PLATFORM != 'Microsoft UWP' and
         utils.settings('enablePlaylistSync') == 'true'):
@@ -31,7 +34,8 @@ LOG = getLogger('PLEX.sync.full_sync')
 class FullSync(common.libsync_mixin):
     def __init__(self, repair, callback, show_dialog):
         """
-        repair=True: force sync EVERY item
+        repair=True: cross-check the Plex DB against the Kodi DBs and sync
+        the broken items again, on top of the ones that changed on the PMS
         """
         self._canceled = False
         self.repair = repair
@@ -44,9 +48,14 @@ class FullSync(common.libsync_mixin):
         self.plex_type = None
         self.section_type = None
         self.processing_thread = None
+        # plex_ids we need to download again for a repair
+        self.refetch = set()
         self.install_sync_done = utils.settings('SyncInstallRunDone') == 'true'
+        # CONTROLLER decides how many of our workers may download at once
+        CONTROLLER.reset()
         self.threader = backgroundthread.ThreaderManager(
-            worker=backgroundthread.NonstoppingBackgroundWorker)
+            worker=backgroundthread.NonstoppingBackgroundWorker,
+            worker_count=CONTROLLER.max_requests)
         super(FullSync, self).__init__()
 
     def process_item(self, xml_item):
@@ -54,16 +63,19 @@ class FullSync(common.libsync_mixin):
         Processes a single library item
         """
         plex_id = int(xml_item.get('ratingKey'))
-        if not self.repair and self.plexdb.checksum(plex_id, self.plex_type) == \
-                int('%s%s' % (plex_id,
-                              xml_item.get('updatedAt',
-                                           xml_item.get('addedAt', 1541572987)))):
+        updated_at = xml_item.get('updatedAt',
+                                  xml_item.get('addedAt', 1541572987))
+        if plex_id not in self.refetch and \
+                self.plexdb.checksum(plex_id, self.plex_type) == \
+                int('%s%s' % (plex_id, updated_at)):
             # Already got EXACTLY this item in our DB. BUT need to collect all
             # DB updates within the same thread
             self.queue.put(UpdateLastSyncAndPlaystate(plex_id, xml_item))
             return
         task = GetMetadataTask()
-        task.setup(self.queue, plex_id, self.plex_type, self.get_children)
+        task.setup(self.queue, plex_id, self.plex_type, self.get_children,
+                   updated_at=utils.cast(int, xml_item.get('updatedAt')),
+                   userdata=xml_item.attrib)
         self.threader.addTask(task)
 
     def process_delete(self):
@@ -94,6 +106,13 @@ class FullSync(common.libsync_mixin):
                                         section['section_id'],
                                         section['plex_type'])
             self.queue.put(queue_info)
+            self.refetch = set()
+            if self.repair:
+                # Removes the broken items from our DBs before we sync them
+                for plex_id, plex_type, refetch in consistency.broken_items(
+                        section['section_id'], section['plex_type']):
+                    self.queue.put(ResetItem(plex_id, plex_type))
+                    self.refetch.add(refetch)
             with PlexDB() as self.plexdb:
                 for xml_item in iterator:
                     if self.isCanceled():
@@ -196,12 +215,12 @@ class FullSync(common.libsync_mixin):
             return
         successful = False
         self.current_sync = timing.unix_timestamp()
-        # Delete playlist and video node files from Kodi
-        utils.delete_playlists()
-        utils.delete_nodes()
-        # Get latest Plex libraries and build playlist and video node files
+        # Get latest Plex libraries and build playlist and video node files.
+        # Only the files that changed will be touched
         if not sections.sync_from_pms():
             return
+        # Resolve music artists, genres and paths in memory while syncing
+        music_db.start_caching()
         try:
             # Fire up our single processing thread
             self.queue = backgroundthread.Queue.Queue(maxsize=1000)
@@ -213,6 +232,8 @@ class FullSync(common.libsync_mixin):
             # Actual syncing - do only new items first
             LOG.info('Running full_library_sync with repair=%s',
                      self.repair)
+            if self.repair:
+                consistency.delete_orphans()
             if not self.full_library_sync():
                 return
             # Tell the processing thread to exit with one last element None
@@ -228,6 +249,13 @@ class FullSync(common.libsync_mixin):
             # This will block until the processing thread really exits
             LOG.debug('Waiting for processing thread to exit')
             self.processing_thread.join()
+            # We're idle now - shrink the write-ahead logs that grew while
+            # syncing
+            utils.wal_checkpoint('TRUNCATE')
+            metadata_store.log_stats()
+            CONTROLLER.log_stats()
+            response_cache.log_stats()
+            music_db.stop_caching()
             common.update_kodi_library(video=True, music=True)
             self.threader.shutdown()
             if self.callback:
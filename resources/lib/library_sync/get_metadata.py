@@ -5,6 +5,8 @@ from logging import getLogger
 from . import common
 from ..plex_api import API
 from .. import plex_functions as PF, backgroundthread, utils, variables as v
+from .. import metadata_store
+from ..concurrency import CONTROLLER
 
 
 LOG = getLogger("PLEX." + __name__)
@@ -35,12 +37,22 @@ class GetMetadataTask(common.libsync_mixin, backgroundthread.Task):
     Input:
         queue               Queue.Queue() object where this thread will store
                             the downloaded metadata XMLs as etree objects
+        updated_at          The item's updatedAt, lets us use metadata_store
+        userdata            The attrib of the item's element from the section
+                            listing, holding up-to-date userdata
     """
-    def setup(self, queue, plex_id, plex_type, get_children=False):
+    def setup(self, queue, plex_id, plex_type, get_children=False,
+              updated_at=None, userdata=None):
         self.queue = queue
         self.plex_id = plex_id
         self.plex_type = plex_type
         self.get_children = get_children
+        self.updated_at = updated_at
+        self.userdata = userdata
+
+    @staticmethod
+    def _download(plex_id):
+        return CONTROLLER.download(PF.GetPlexMetadata, plex_id)
 
     def _collections(self, item):
         global COLLECTION_MATCH, COLLECTION_XMLS
@@ -62,7 +74,7 @@ class GetMetadataTask(common.libsync_mixin, backgroundthread.Task):
                 # Get Plex metadata for collections - a pain
                 for index, collection_plex_id in COLLECTION_MATCH:
                     if index == plex_set_id:
-                        collection_xml = PF.GetPlexMetadata(collection_plex_id)
+                        collection_xml = self._download(collection_plex_id)
                         try:
                             collection_xml[0].attrib
                         except (TypeError, IndexError, AttributeError):
@@ -84,20 +96,31 @@ class GetMetadataTask(common.libsync_mixin, backgroundthread.Task):
         if self.isCanceled():
             return
         # Download Metadata
-        item = {
-            'xml': PF.GetPlexMetadata(self.plex_id),
-            'children': None
-        }
+        attempt = 0
+        while True:
+            item = {
+                'xml': metadata_store.metadata(self.plex_id,
+                                               self.updated_at,
+                                               self.userdata,
+                                               download=self._download),
+                'children': None
+            }
+            if item['xml'] != 401:
+                break
+            # The PMS is under strain. CONTROLLER already sends fewer
+            # requests, give the PMS some time before retrying
+            if self.isCanceled() or not CONTROLLER.strain_backoff(attempt):
+                LOG.error('HTTP 401 returned by PMS for %s, %s times. Too '
+                          'much strain? Cancelling sync for now',
+                          self.plex_id, attempt + 1)
+                utils.window('plex_scancrashed', value='401')
+                return
+            attempt += 1
         if item['xml'] is None:
             # Did not receive a valid XML - skip that item for now
             LOG.error("Could not get metadata for %s. Skipping that item "
                       "for now", self.plex_id)
             return
-        elif item['xml'] == 401:
-            LOG.error('HTTP 401 returned by PMS. Too much strain? '
-                      'Cancelling sync for now')
-            utils.window('plex_scancrashed', value='401')
-            return
         if not self.isCanceled() and self.plex_type == v.PLEX_TYPE_MOVIE:
             # Check for collections/sets
             collections = False
@@ -110,6 +133,7 @@ class GetMetadataTask(common.libsync_mixin, backgroundthread.Task):
                 with LOCK:
                     self._collections(item)
         if not self.isCanceled() and self.get_children:
+            # Every page of the children takes a slot of its own
             children_xml = PF.GetAllPlexChildren(self.plex_id)
             try:
                 children_xml[0].attrib
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+import time
 import xbmcgui
 
 from cProfile import Profile
@@ -12,6 +13,18 @@ from .. import backgroundthread, utils, variables as v
 
 LOG = getLogger('PLEX.sync.process_metadata')
 
+# Commit after this many added, updated or deleted items
+COMMIT_ITEMS = 500
+# Commit after holding the DBs' write locks for this long [s]. Kodi's own
+# writes, e.g. resume points, wait for us in the meantime
+COMMIT_SECONDS = 3.0
+# Run a passive WAL checkpoint after a commit once a DB's write-ahead log grew
+# beyond this size [bytes]. Bounds the WAL files on devices with little storage
+# and keeps Kodi's reads fast
+CHECKPOINT_WAL_SIZE = 8 * 1024 * 1024
+# Check the WAL sizes only every n items
+CHECKPOINT_CHECK_ITEMS = 50
+
 
 class InitNewSection(object):
     """
@@ -38,6 +51,72 @@ class DeleteItem(object):
         self.plex_id = plex_id
 
 
+class ResetItem(object):
+    """
+    Repair sync: the Kodi entries of the item are broken. Removes the item
+    from all DBs so it gets synced anew
+    """
+    def __init__(self, plex_id, plex_type):
+        self.plex_id = plex_id
+        self.plex_type = plex_type
+
+
+class CommitPolicy(object):
+    """
+    Decides when ProcessMetadata commits: after COMMIT_ITEMS items or
+    COMMIT_SECONDS, whatever comes first. Also keeps the write-ahead logs in
+    check with passive checkpoints. Counts what happened for the section's
+    metrics
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.last_commit = self.start
+        self.items = 0
+        self.since_check = 0
+        self.commits = {'items': 0, 'time': 0}
+        self.checkpoints = 0
+        self.max_wal = 0
+
+    def item_done(self, context, counts=True):
+        """
+        Call after every item. Pass counts=False for cheap items like
+        playstate updates that only count towards the time limit
+        """
+        if counts:
+            self.items += 1
+            self.since_check += 1
+        if self.items >= COMMIT_ITEMS:
+            self.commit(context, 'items')
+        elif time.time() - self.last_commit >= COMMIT_SECONDS:
+            self.commit(context, 'time')
+
+    def commit(self, context, reason):
+        context.commit()
+        self.commits[reason] += 1
+        self.items = 0
+        self.last_commit = time.time()
+        if self.since_check < CHECKPOINT_CHECK_ITEMS:
+            return
+        self.since_check = 0
+        wal_size = context.wal_size()
+        self.max_wal = max(self.max_wal, wal_size)
+        if wal_size > CHECKPOINT_WAL_SIZE:
+            context.checkpoint()
+            self.checkpoints += 1
+
+    def metrics(self):
+        return {
+            'policy': '%s items/%ss, checkpoint at %s MB WAL' % (
+                COMMIT_ITEMS,
+                COMMIT_SECONDS,
+                CHECKPOINT_WAL_SIZE // (1024 * 1024)),
+            'seconds': round(time.time() - self.start, 1),
+            'commits': self.commits,
+            'checkpoints': self.checkpoints,
+            'max_wal_kb': self.max_wal // 1024
+        }
+
+
 class ProcessMetadata(common.libsync_mixin, backgroundthread.KillableThread):
     """
     Not yet implemented for more than 1 thread - if ever. Only to be called by
@@ -108,6 +187,8 @@ class ProcessMetadata(common.libsync_mixin, backgroundthread.KillableThread):
                 v.TRANSLATION_FROM_PLEXTYPE[section.plex_type])
             profile = Profile()
             profile.enable()
+            policy = CommitPolicy()
+            name, plex_type = section.name, section.plex_type
             with section.context(self.last_sync) as context:
                 while not self.isCanceled():
                     # grabs item from queue. This will block!
@@ -119,6 +200,7 @@ class ProcessMetadata(common.libsync_mixin, backgroundthread.KillableThread):
                                            children=item['children'])
                         self.title = item['xml'][0].get('title')
                         self.processed += 1
+                        policy.item_done(context)
                     elif isinstance(item, UpdateLastSyncAndPlaystate):
                         context.plexdb.update_last_sync(item.plex_id,
                                                         section.plex_type,
@@ -126,18 +208,21 @@ class ProcessMetadata(common.libsync_mixin, backgroundthread.KillableThread):
                         if section.plex_type != v.PLEX_TYPE_ARTIST:
                             context.update_userdata(item.xml_item,
                                                     section.plex_type)
+                        policy.item_done(context, counts=False)
                     elif isinstance(item, InitNewSection) or item is None:
                         section = item
                         break
+                    elif isinstance(item, ResetItem):
+                        context.reset(item.plex_id, item.plex_type)
                     else:
                         context.remove(item.plex_id, plex_type=section.plex_type)
+                        policy.item_done(context)
                     self.update_progressbar()
                     self.current += 1
-                    if self.processed == 500:
-                        self.processed = 0
-                        context.commit()
                     self.queue.task_done()
             self.queue.task_done()
+            LOG.info('Metrics for section %s (%ss): %s processed, %s',
+                     name, plex_type, self.processed, policy.metrics())
             profile.disable()
             string_io = StringIO()
             stats = Stats(profile, stream=string_io).sort_stats('cumulative')
@@ -53,6 +53,8 @@ def sync_from_pms():
     totalnodes = len(sorted_sections)
 
     VNODES.clearProperties()
+    # Drop files collected by an aborted previous run
+    VNODES.files = {}
 
     with PlexDB() as plexdb:
         # Backup old sections to delete them later, if needed (at the end
@@ -66,6 +68,9 @@ def sync_from_pms():
                                  sorted_sections,
                                  old_sections,
                                  totalnodes)
+    # Only touch the node and playlist files that actually changed. Also gets
+    # rid of the ones of deleted or renamed sections
+    VNODES.writeFiles()
     if old_sections:
         # Section has been deleted on the PMS
         delete_sections(old_sections)
@@ -105,7 +110,7 @@ def _process_section(section_xml, kodidb, plexdb, sorted_sections,
         # Create playlist for the video library
         if (section_name not in playlists and
                 plex_type in (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW)):
-            utils.playlist_xsp(plex_type, section_name, section_id)
+            VNODES.playlistXSP(plex_type, section_name, section_id)
             playlists.append(section_name)
         # Create the video node
         if section_name not in nodes:
@@ -141,27 +146,9 @@ def _process_section(section_xml, kodidb, plexdb, sorted_sections,
                                plex_type,
                                tagid)
 
-            if plexdb.section_id_by_name(current_sectionname) is None:
-                # The tag could be a combined view. Ensure there's
-                # no other tags with the same name before deleting
-                # playlist.
-                utils.playlist_xsp(plex_type,
-                                   current_sectionname,
-                                   section_id,
-                                   current_sectiontype,
-                                   True)
-                # Delete video node
-                if plex_type != "musicvideos":
-                    VNODES.viewNode(
-                        indexnumber=sorted_sections.index(section_name),
-                        tagname=current_sectionname,
-                        mediatype=plex_type,
-                        viewtype=None,
-                        viewid=section_id,
-                        delete=True)
             # Added new playlist
             if section_name not in playlists and plex_type in v.KODI_VIDEOTYPES:
-                utils.playlist_xsp(plex_type,
+                VNODES.playlistXSP(plex_type,
                                    section_name,
                                    section_id)
                 playlists.append(section_name)
@@ -182,7 +169,7 @@ def _process_section(section_xml, kodidb, plexdb, sorted_sections,
             # Validate the playlist exists or recreate it
             if (section_name not in playlists and plex_type in
                     (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW)):
-                utils.playlist_xsp(plex_type,
+                VNODES.playlistXSP(plex_type,
                                    section_name,
                                    section_id)
                 playlists.append(section_name)
@@ -215,30 +202,30 @@ def delete_sections(old_sections):
         LOG.info("Removing entire Plex library sections: %s", old_sections)
         with kodi_db.KodiVideoDB(texture_db=True) as kodidb:
             for section in old_sections:
-                if section[2] == v.KODI_TYPE_PHOTO:
+                if section[2] == v.PLEX_TYPE_PHOTO:
                     # not synced
                     plexdb.remove_section(section[0])
                     continue
-                elif section[2] == v.KODI_TYPE_MOVIE:
+                elif section[2] == v.PLEX_TYPE_MOVIE:
                     video_library_update = True
                     context = itemtypes.Movie(None,
                                               plexdb=plexdb,
                                               kodidb=kodidb)
-                elif section[2] == v.KODI_TYPE_SHOW:
+                elif section[2] == v.PLEX_TYPE_SHOW:
                     video_library_update = True
                     context = itemtypes.Show(None,
                                              plexdb=plexdb,
                                              kodidb=kodidb)
                 else:
                     continue
-                for plex_id in plexdb.plexid_by_sectionid(section[0], section[2]):
-                    context.remove(plex_id)
+                # Set-based, not item by item
+                context.remove_section(section[0])
                 # Only remove Plex entry if we've removed all items first
                 plexdb.remove_section(section[0])
 
         with kodi_db.KodiMusicDB(texture_db=True) as kodidb:
             for section in old_sections:
-                if section[2] == v.KODI_TYPE_ARTIST:
+                if section[2] == v.PLEX_TYPE_ARTIST:
                     music_library_update = True
                     context = itemtypes.Artist(None,
                                                plexdb=plexdb,
@@ -3,21 +3,43 @@
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
 
-from .. import plex_functions as PF, utils, timing, variables as v, app
+from .. import plex_functions as PF, utils, timing, pms_clock, variables as v
+from .. import app
 
 LOG = getLogger('PLEX.sync.time')
 
 
 def sync_pms_time():
     """
-    PMS does not provide a means to get a server timestamp. This is a work-
-    around - because the PMS might be in another time zone
+    Determines the time offset Kodi - PMS - because the PMS might be in
+    another time zone
 
     In general, everything saved to Kodi shall be in Kodi time.
 
     Any info with a PMS timestamp is in Plex time, naturally
     """
-    LOG.info('Synching time with PMS server')
+    offset = pms_clock.offset()
+    if offset is None:
+        return _sync_pms_time_by_toggling()
+    _set_offset(offset)
+    return True
+
+
+def _set_offset(offset):
+    # Only write the settings file if the offset changed noticeably
+    changed = abs(offset - timing.KODI_PLEX_TIME_OFFSET) >= 1
+    timing.KODI_PLEX_TIME_OFFSET = offset
+    if changed:
+        utils.settings('kodiplextimeoffset', value=str(offset))
+    LOG.info("Time offset Koditime - Plextime in seconds: %s", offset)
+
+
+def _sync_pms_time_by_toggling():
+    """
+    PMS does not provide a means to get a server timestamp. This is a work-
+    around if we don't have samples from pms_clock yet
+    """
+    LOG.info('Synching time with PMS server by toggling an item')
     # Find a PMS item where we can toggle the view state to enforce a
     # change in lastViewedAt
 
@@ -98,9 +120,5 @@ def sync_pms_time():
         return False
 
     # Calculate time offset Kodi-PMS
-    timing.KODI_PLEX_TIME_OFFSET = float(koditime) - float(plextime)
-    utils.settings('kodiplextimeoffset',
-                   value=str(timing.KODI_PLEX_TIME_OFFSET))
-    LOG.info("Time offset Koditime - Plextime in seconds: %s",
-             timing.KODI_PLEX_TIME_OFFSET)
+    _set_offset(float(koditime) - float(plextime))
     return True
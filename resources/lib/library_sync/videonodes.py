@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from io import BytesIO
+import hashlib
 
 from ..utils import etree
 from .. import utils, path_ops, variables as v, app
@@ -10,11 +12,21 @@ from .. import utils, path_ops, variables as v, app
 
 LOG = getLogger('PLEX.videonodes')
 
+# PKC owns all files within these video node directories...
+NODE_PREFIX = 'Plex-'
+# ...and all smart playlists starting with this prefix
+PLAYLIST_PREFIX = 'Plex '
+
 ###############################################################################
 
 
 class VideoNodes(object):
 
+    def __init__(self):
+        # Content of all video node and smart playlist files we want on disk:
+        # {path: bytes}. Nothing is written before writeFiles() is called
+        self.files = {}
+
     def commonRoot(self, order, label, tagname, roottype=1):
 
         if roottype == 0:
@@ -40,8 +52,7 @@ class VideoNodes(object):
 
         return root
 
-    def viewNode(self, indexnumber, tagname, mediatype, viewtype, viewid,
-                 delete=False):
+    def viewNode(self, indexnumber, tagname, mediatype, viewtype, viewid):
         # Plex: reassign mediatype due to Kodi inner workings
         # How many items do we get at most?
         limit = unicode(app.APP.fetch_pms_item_number)
@@ -65,12 +76,6 @@ class VideoNodes(object):
         nodepath = path_ops.translate_path(
             'special://profile/library/video/Plex-%s/' % dirname)
 
-        if delete:
-            if path_ops.exists(nodepath):
-                path_ops.rmtree(nodepath)
-                LOG.info("Sucessfully removed videonode: %s." % tagname)
-            return
-
         # Verify the video directory
         if not path_ops.exists(path):
             path_ops.copy_tree(
@@ -79,13 +84,6 @@ class VideoNodes(object):
                 dst=path_ops.translate_path('special://profile/library/video'),
                 preserve_mode=0)  # do not copy permission bits!
 
-        # Create the node directory
-        if mediatype != "photos":
-            if not path_ops.exists(nodepath):
-                # folder does not exist yet
-                LOG.debug('Creating folder %s' % nodepath)
-                path_ops.makedirs(nodepath)
-
         # Create index entry
         nodeXML = "%sindex.xml" % nodepath
         # Set windows property
@@ -113,11 +111,7 @@ class VideoNodes(object):
                                        label=tagname,
                                        tagname=tagname,
                                        roottype=0)
-            try:
-                utils.indent(root)
-            except:
-                pass
-            etree.ElementTree(root).write(nodeXML, encoding="UTF-8")
+            self._add_file(nodeXML, root)
 
         nodetypes = {
             '1': "all",
@@ -297,10 +291,6 @@ class VideoNodes(object):
                 # kodi picture sources somehow
                 continue
 
-            if path_ops.exists(nodeXML):
-                # Don't recreate xml if already exists
-                continue
-
             # Create the root
             if (nodetype in ("nextepisodes",
                              "ondeck",
@@ -337,7 +327,7 @@ class VideoNodes(object):
                                      'order',
                                      {'direction': "descending"}).text = "dateadded"
                     etree.SubElement(root, 'limit').text = limit
-                    if utils.settings('MovieShowWatched') == 'false':
+                    if utils.cached_setting('MovieShowWatched') == 'false':
                         rule = etree.SubElement(root,
                                                 'rule',
                                                 {'field': "playcount",
@@ -406,12 +396,118 @@ class VideoNodes(object):
                     rule = etree.SubElement(root,
                                             'rule',
                                             {'field': "inprogress", 'operator':"true"})
+            self._add_file(nodeXML, root)
+
+    def playlistXSP(self, mediatype, tagname, viewid, viewtype=""):
+        """
+        Feed with tagname as unicode
+        """
+        path = path_ops.translate_path("special://profile/playlists/video/")
+        if viewtype == "mixed":
+            plname = "%s - %s" % (tagname, mediatype)
+            xsppath = "%s%s%s - %s.xsp" % (path, PLAYLIST_PREFIX, viewid,
+                                           mediatype)
+        else:
+            plname = tagname
+            xsppath = "%s%s%s.xsp" % (path, PLAYLIST_PREFIX, viewid)
+        # Using write process since there's no guarantee the xml declaration
+        # works with etree
+        kinds = {
+            'homevideos': 'movies',
+            'movie': 'movies',
+            'show': 'tvshows'
+        }
+        self.files[path_ops.path.normpath(xsppath)] = utils.try_encode(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n'
+            '<smartplaylist type="%s">\n\t'
+                '<name>Plex %s</name>\n\t'
+                '<match>all</match>\n\t'
+                '<rule field="tag" operator="is">\n\t\t'
+                    '<value>%s</value>\n\t'
+                '</rule>\n'
+            '</smartplaylist>\n'
+            % (kinds.get(mediatype, mediatype), plname, tagname))
+
+    def _add_file(self, path, root):
+        try:
+            utils.indent(root)
+        except:
+            pass
+        xml = BytesIO()
+        # Byte string encoding, otherwise etree writes a unicode declaration
+        etree.ElementTree(root).write(xml, encoding=b"UTF-8")
+        self.files[path_ops.path.normpath(path)] = xml.getvalue()
+
+    def writeFiles(self):
+        """
+        Brings the video node and smart playlist files on disk in line with
+        the files collected by viewNode() and playlistXSP(). Only writes,
+        renames or deletes the files that differ - Kodi reloads its node tree
+        for every change
+        """
+        files, self.files = self.files, {}
+        on_disk = {}
+        for path in self._owned_files():
             try:
-                utils.indent(root)
-            except:
+                on_disk[path] = utils.generate_file_md5(path)
+            except EnvironmentError:
                 pass
-            etree.ElementTree(root).write(path_ops.encode_path(nodeXML),
-                                          encoding="UTF-8")
+        # Files we don't need anymore, by content hash, for renaming them
+        obsolete = {}
+        for path, md5 in on_disk.iteritems():
+            if path not in files:
+                obsolete.setdefault(md5, []).append(path)
+        written, renamed, deleted = 0, 0, 0
+        for path, content in files.iteritems():
+            md5 = hashlib.md5(content).hexdigest().decode('utf-8')
+            if on_disk.get(path) == md5:
+                continue
+            directory = path_ops.path.dirname(path)
+            if not path_ops.path.isdir(path_ops.encode_path(directory)):
+                LOG.debug('Creating folder %s', directory)
+                path_ops.makedirs(directory)
+            if path not in on_disk and obsolete.get(md5):
+                path_ops.rename(obsolete[md5].pop(), path)
+                renamed += 1
+                continue
+            with open(path_ops.encode_path(path), 'wb') as f:
+                f.write(content)
+            written += 1
+        for paths in obsolete.itervalues():
+            for path in paths:
+                path_ops.remove(path)
+                deleted += 1
+        for directory in self._node_dirs():
+            if not any(x[2] for x in path_ops.walk(directory)):
+                LOG.debug('Removing empty folder %s', directory)
+                path_ops.rmtree(directory)
+        LOG.info('Video nodes and playlists: %s written, %s renamed, '
+                 '%s deleted, %s unchanged', written, renamed, deleted,
+                 len(files) - written - renamed)
+
+    @staticmethod
+    def _node_dirs():
+        path = path_ops.translate_path('special://profile/library/video/')
+        for _, dirs, _ in path_ops.walk(path):
+            for directory in dirs:
+                if directory.startswith(NODE_PREFIX):
+                    yield path_ops.path.join(path, directory)
+            break
+
+    def _owned_files(self):
+        path = path_ops.translate_path('special://profile/playlists/video/')
+        for root, _, files in path_ops.walk(path):
+            for filename in files:
+                if (filename.startswith(PLAYLIST_PREFIX) and
+                        filename.endswith('.xsp')):
+                    yield path_ops.path.normpath(
+                        path_ops.path.join(root, filename))
+            break
+        for directory in self._node_dirs():
+            for root, _, files in path_ops.walk(directory):
+                for filename in files:
+                    yield path_ops.path.normpath(
+                        path_ops.path.join(root, filename))
 
     def singleNode(self, indexnumber, tagname, mediatype, itemtype):
         cleantagname = utils.normalize_nodes(tagname)
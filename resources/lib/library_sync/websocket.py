@@ -10,7 +10,9 @@ from ..plex_api import API
 from ..plex_db import PlexDB
 from .. import kodi_db
 from .. import backgroundthread, playlists, plex_functions as PF, itemtypes
-from .. import artwork, utils, timing, variables as v, app
+from .. import artwork, utils, timing, widget_cache, metadata_cache
+from .. import metadata_store, response_cache
+from .. import variables as v, app
 
 LOG = getLogger('PLEX.sync.websocket')
 
@@ -40,6 +42,7 @@ def store_websocket_message(message):
     processes json.loads() messages from websocket. Triage what we need to
     do with "process_" methods
     """
+    response_cache.websocket(message)
     if message['type'] == 'playing':
         process_playing(message['PlaySessionStateNotification'])
     elif message['type'] == 'timeline':
@@ -120,7 +123,10 @@ def process_websocket_messages():
 
 def process_new_item_message(message):
     LOG.debug('Message: %s', message)
-    xml = PF.GetPlexMetadata(message['plex_id'])
+    metadata_cache.invalidate(message['plex_id'])
+    # Always download - the message does not tell us the item's userdata.
+    # Caching the result saves the next full sync the download
+    xml = metadata_store.metadata(message['plex_id'])
     try:
         plex_type = xml[0].attrib['type']
     except (IndexError, KeyError, TypeError):
@@ -251,6 +257,8 @@ def process_playing(data):
                 skip = True
         if skip:
             continue
+        # Someone else's playback changes e.g. the resume point
+        metadata_cache.invalidate(plex_id)
         session_key = message['sessionKey']
         # Do we already have a sessionKey stored?
         if session_key not in PLAYSTATE_SESSIONS:
@@ -259,7 +267,7 @@ def process_playing(data):
             if not typus:
                 # Item not (yet) in Kodi library
                 continue
-            if utils.settings('plex_serverowned') == 'false':
+            if utils.cached_setting('plex_serverowned') == 'false':
                 # Not our PMS, we are not authorized to get the sessions
                 # On the bright side, it must be us playing :-)
                 PLAYSTATE_SESSIONS[session_key] = {}
@@ -277,7 +285,7 @@ def process_playing(data):
             PLAYSTATE_SESSIONS[session_key]['file_id'] = typus['kodi_fileid']
             PLAYSTATE_SESSIONS[session_key]['kodi_type'] = typus['kodi_type']
         session = PLAYSTATE_SESSIONS[session_key]
-        if utils.settings('plex_serverowned') != 'false':
+        if utils.cached_setting('plex_serverowned') != 'false':
             # Identify the user - same one as signed on with PKC? Skip
             # update if neither session's username nor userid match
             # (Owner sometime's returns id '1', not always)
@@ -345,6 +353,7 @@ def process_playing(data):
                                  session['file_id'],
                                  timing.unix_timestamp(),
                                  v.PLEX_TYPE_FROM_KODI_TYPE[session['kodi_type']])
+        widget_cache.invalidate()
 
 
 def cache_artwork(plex_id, plex_type, kodi_id=None, kodi_type=None):
@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 import logging
+import threading
+import time
+import Queue
 import xbmc
+import xbmcaddon
 ###############################################################################
 LEVELS = {
     logging.ERROR: xbmc.LOGERROR,
@@ -10,8 +14,20 @@ LEVELS = {
     logging.INFO: xbmc.LOGNOTICE,
     logging.DEBUG: xbmc.LOGDEBUG
 }
+# Max number of records waiting for the writer thread. Debug and info records
+# are dropped if the writer cannot keep up, warnings and errors never are
+QUEUE_SIZE = 10000
+# How often the writer thread checks whether Kodi's debug logging has been
+# toggled [s]
+LEVEL_CHECK_INTERVAL = 10
+# If rate limiting is enabled: let this many debug/info records with the same
+# message template from the same logger pass per RATE_INTERVAL [s]
+RATE_LIMIT = 20
+RATE_INTERVAL = 10
 ###############################################################################
 
+HANDLER = None
+
 
 def try_encode(uniString, encoding='utf-8'):
     """
@@ -29,10 +45,60 @@ def try_encode(uniString, encoding='utf-8'):
     return uniString
 
 
-def config():
+def config(threaded=True):
+    """
+    Pass threaded=False for short-lived Python instances like plugin calls:
+    they log synchronously, without a writer thread that might not get to
+    write their last records before the instance exits
+    """
+    global HANDLER
     logger = logging.getLogger('PLEX')
-    logger.addHandler(LogHandler())
-    logger.setLevel(logging.DEBUG)
+    if not threaded:
+        logger.addHandler(LogHandler())
+        logger.setLevel(_kodi_level())
+        return
+    HANDLER = QueueHandler()
+    logger.addHandler(HANDLER)
+    update_level()
+    reload_settings()
+    HANDLER.start()
+
+
+def stop():
+    """
+    Writes all pending records to the Kodi log. Logging stays synchronous
+    afterwards
+    """
+    if HANDLER:
+        HANDLER.stop()
+
+
+def _kodi_level():
+    if xbmc.getCondVisibility('System.GetBool(debug.showloginfo)'):
+        return logging.DEBUG
+    return logging.INFO
+
+
+def update_level():
+    """
+    Kodi drops our debug messages anyway unless its debug logging is enabled.
+    Lets LOG.debug() return before even creating a log record in that case
+    """
+    logger = logging.getLogger('PLEX')
+    level = _kodi_level()
+    if logger.level != level:
+        logger.setLevel(level)
+        logger.info('Kodi debug logging %s',
+                    'enabled' if level == logging.DEBUG else 'disabled')
+
+
+def reload_settings():
+    """
+    Call whenever the PKC settings changed
+    """
+    if HANDLER:
+        addon = xbmcaddon.Addon('plugin.video.plexkodiconnect')
+        HANDLER.rate_limit = addon.getSetting('logRateLimit') == 'true'
 
 
 class LogHandler(logging.StreamHandler):
@@ -48,3 +114,119 @@ class LogHandler(logging.StreamHandler):
         except UnicodeEncodeError:
             xbmc.log(try_encode(self.format(record)),
                      level=LEVELS[record.levelno])
+
+
+class QueueHandler(LogHandler):
+    """
+    Hands the records to a writer thread that passes them on to xbmc.log -
+    threads logging e.g. every synced item don't wait for Kodi's log I/O.
+    Messages are rendered right away as their arguments might change later on
+    """
+    def __init__(self):
+        LogHandler.__init__(self)
+        self.queue = Queue.Queue(maxsize=QUEUE_SIZE)
+        self.thread = None
+        self.dropped = 0
+        self.rate_limit = False
+        # (logger name, message template): [window start, passed, suppressed]
+        self._rates = {}
+        self._rates_lock = threading.Lock()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._write,
+                                       name='PKC-log-writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        thread, self.thread = self.thread, None
+        if thread:
+            self.queue.put(None)
+            thread.join()
+
+    def emit(self, record):
+        if self.thread is None:
+            LogHandler.emit(self, record)
+            return
+        if (record.levelno < logging.WARNING and self.rate_limit and
+                not self._rate_limited(record)):
+            return
+        try:
+            self._prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if record.levelno < logging.WARNING:
+            self._put_nowait(record)
+        else:
+            self.queue.put(record)
+
+    def _prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks don't survive the trip
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+    def _put_nowait(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+
+    def _rate_limited(self, record):
+        """
+        Returns True if the record may pass
+        """
+        key = (record.name, record.msg)
+        now = time.time()
+        with self._rates_lock:
+            rate = self._rates.get(key)
+            if rate is None or now - rate[0] > RATE_INTERVAL:
+                if len(self._rates) > 1000:
+                    # Messages formatted by the caller, not by logging
+                    self._rates.clear()
+                self._rates[key] = [now, 1, 0]
+                suppressed = rate[2] if rate else 0
+            elif rate[1] < RATE_LIMIT:
+                rate[1] += 1
+                return True
+            else:
+                rate[2] += 1
+                return False
+        if suppressed:
+            self._put_nowait(logging.LogRecord(
+                record.name, record.levelno, record.pathname, record.lineno,
+                'Suppressed %s more messages like: %s',
+                (suppressed, record.msg), None))
+        return True
+
+    def _write(self):
+        last_check = time.time()
+        while True:
+            if time.time() - last_check > LEVEL_CHECK_INTERVAL:
+                last_check = time.time()
+                update_level()
+            try:
+                record = self.queue.get(timeout=LEVEL_CHECK_INTERVAL)
+            except Queue.Empty:
+                continue
+            if record is None:
+                break
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                xbmc.log(b'PLEX.loghandler: Log writer could not keep up, '
+                         b'dropped %d messages' % dropped,
+                         level=xbmc.LOGWARNING)
+            try:
+                LogHandler.emit(self, record)
+            except Exception:
+                self.handleError(record)
+        # Whatever got logged while we were stopping
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            LogHandler.emit(self, record)
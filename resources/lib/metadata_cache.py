@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Short-lived, size-bounded cache of PMS metadata XMLs (as returned by
+plex_functions.GetPlexMetadata) for items the user is likely to play next:
+the focused library item, the on deck/next up widget items and the next items
+of the current playqueue. Saves a PMS roundtrip upon playback start.
+
+Lives within the PKC service's Python instance only.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from collections import OrderedDict
+from threading import Lock
+import copy
+import time
+
+import xbmc
+
+from .plex_db import PlexDB
+from . import backgroundthread, plex_functions as PF, utils, app
+from . import variables as v
+
+LOG = getLogger('PLEX.metadata_cache')
+
+# Cached XMLs older than this are discarded [s]. Mainly protects the resume
+# points against changes we miss, e.g. playback on another Plex client
+TTL = 120
+# Max number of cached XMLs
+MAX_ITEMS = 50
+# Prefetch only the first items of every widget listing
+PREFETCH_PER_LISTING = 5
+# Prefetch that many of the next items of the playqueue
+PREFETCH_PLAYQUEUE = 2
+# Widget listings that users are likely to play from
+PREFETCH_WIDGETS = ('ondeck', 'nextup', 'inprogressepisodes')
+# Focused Kodi library items that we prefetch
+PREFETCH_KODI_TYPES = (v.KODI_TYPE_MOVIE, v.KODI_TYPE_EPISODE,
+                       v.KODI_TYPE_SONG)
+
+# plex_id: (timestamp, xml)
+_CACHE = OrderedDict()
+# plex_ids currently being prefetched
+_PENDING = set()
+_LOCK = Lock()
+# Hits and misses since PKC startup
+STATS = {'hit': 0, 'miss': 0}
+
+
+def _valid(xml):
+    try:
+        xml[0].attrib
+    except (TypeError, IndexError, AttributeError):
+        return False
+    return True
+
+
+def get(plex_id):
+    """
+    Returns a copy of the cached XML for plex_id or None
+    """
+    plex_id = int(plex_id)
+    with _LOCK:
+        try:
+            timestamp, xml = _CACHE[plex_id]
+        except KeyError:
+            return
+        if time.time() - timestamp > TTL:
+            del _CACHE[plex_id]
+            return
+        # Callers may alter the XML
+        return copy.deepcopy(xml)
+
+
+def store(plex_id, xml):
+    if not _valid(xml):
+        return
+    with _LOCK:
+        _CACHE.pop(plex_id, None)
+        _CACHE[plex_id] = (time.time(), copy.deepcopy(xml))
+        while len(_CACHE) > MAX_ITEMS:
+            _CACHE.popitem(last=False)
+
+
+def metadata(plex_id):
+    """
+    Drop-in replacement for PF.GetPlexMetadata(plex_id) that uses the cache.
+    Pass the Plex id as digits only
+    """
+    plex_id = utils.cast(int, plex_id)
+    if plex_id is None:
+        return
+    xml = get(plex_id)
+    if xml is not None:
+        STATS['hit'] += 1
+        LOG.debug('Metadata cache hit for %s, stats: %s', plex_id, STATS)
+        return xml
+    STATS['miss'] += 1
+    xml = PF.GetPlexMetadata(plex_id)
+    store(plex_id, xml)
+    return xml
+
+
+def invalidate(plex_id=None):
+    """
+    Drops the cached XML for plex_id, or all XMLs if plex_id is None. Call
+    whenever an item changed, e.g. its resume point
+    """
+    with _LOCK:
+        if plex_id is None:
+            _CACHE.clear()
+        else:
+            _CACHE.pop(utils.cast(int, plex_id), None)
+
+
+def _fetch(plex_id):
+    try:
+        if not app.APP.stop_pkc and get(plex_id) is None:
+            store(plex_id, PF.GetPlexMetadata(plex_id))
+    finally:
+        with _LOCK:
+            _PENDING.discard(plex_id)
+
+
+def prefetch(plex_ids):
+    """
+    Downloads the metadata of all plex_ids in the background unless we
+    already cached it
+    """
+    for plex_id in plex_ids:
+        plex_id = utils.cast(int, plex_id)
+        if plex_id is None or get(plex_id) is not None:
+            continue
+        with _LOCK:
+            if plex_id in _PENDING:
+                continue
+            _PENDING.add(plex_id)
+        LOG.debug('Prefetching metadata for %s', plex_id)
+        backgroundthread.BGThreader.addTask(
+            backgroundthread.FunctionAsTask(_fetch, None, plex_id))
+
+
+def _plex_id_from_kodi(kodi_id, kodi_type, path):
+    try:
+        return int(utils.REGEX_PLEX_ID.findall(path)[0])
+    except (IndexError, TypeError):
+        pass
+    if not kodi_id or kodi_type not in PREFETCH_KODI_TYPES:
+        return
+    with PlexDB() as plexdb:
+        item = plexdb.item_by_kodi_id(kodi_id, kodi_type)
+    if item:
+        return item['plex_id']
+
+
+def prefetch_widget(mode, data):
+    """
+    Prefetches the first items of the widget listing data as computed by
+    widget_cache.compute
+    """
+    if mode not in PREFETCH_WIDGETS or not data:
+        return
+    if isinstance(data, list):
+        plex_ids = [_plex_id_from_kodi(item['episodeid'],
+                                       v.KODI_TYPE_EPISODE,
+                                       item['file'])
+                    for item in data[:PREFETCH_PER_LISTING]]
+    else:
+        # PMS on deck XML
+        xml = utils.defused_etree.fromstring(utils.try_encode(data))
+        plex_ids = [item.get('ratingKey')
+                    for item in xml[:PREFETCH_PER_LISTING]]
+    prefetch(plex_ids)
+
+
+def prefetch_playqueue(playqueue, pos):
+    """
+    Prefetches the items following pos in the PKC playqueue
+    """
+    prefetch(item.plex_id for item in
+             playqueue.items[pos + 1:pos + 1 + PREFETCH_PLAYQUEUE])
+
+
+class FocusPrefetchThread(backgroundthread.KillableThread):
+    """
+    Prefetches the metadata of the library item the user is currently
+    hovering over in Kodi
+    """
+    # How often we check Kodi's focused item [s]
+    INTERVAL = 0.5
+
+    def isCanceled(self):
+        return self._canceled or app.APP.stop_pkc
+
+    def isSuspended(self):
+        return self._suspended or app.APP.suspend_threads
+
+    def run(self):
+        LOG.info("----===## Starting FocusPrefetchThread ##===----")
+        last, fetched = None, None
+        while not self.isCanceled():
+            if app.APP.monitor.waitForAbort(self.INTERVAL):
+                break
+            if self.isSuspended() or app.APP.player.isPlayingVideo():
+                continue
+            focused = (xbmc.getInfoLabel('ListItem.DBID'),
+                       xbmc.getInfoLabel('ListItem.DBTYPE'),
+                       xbmc.getInfoLabel('ListItem.FileNameAndPath'))
+            # Ignore items the user is scrolling past
+            if focused != last:
+                last = focused
+                continue
+            if focused == fetched:
+                continue
+            fetched = focused
+            try:
+                plex_id = _plex_id_from_kodi(utils.cast(int, focused[0]),
+                                             utils.try_decode(focused[1]),
+                                             utils.try_decode(focused[2]))
+            except Exception as err:
+                LOG.error('Could not get the focused item: %s', err)
+                continue
+            if plex_id:
+                prefetch((plex_id, ))
+        LOG.info("----===## FocusPrefetchThread stopped ##===----")
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of the PMS metadata XMLs of library items (as
+returned by plex_functions.GetPlexMetadata), keyed by plex_id and the item's
+updatedAt. Plex bumps updatedAt whenever an item's metadata changes, so an
+entry never needs to expire - it simply stops being asked for. Lets full
+syncs, e.g. after a reset of the Kodi DB, skip downloading items that did not
+change on the PMS.
+
+Entries are zlib-compressed and checked against a CRC32 upon reading. The
+cache is bounded in size (setting metadataCacheSize, 0 disables the cache) and
+evicts the least recently used entries first. Every PMS gets its own file as
+plex_ids are only unique per PMS.
+
+Userdata like the viewCount changes without updatedAt changing - make sure to
+overlay up-to-date userdata with overlay_userdata().
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from threading import Lock, local
+import sqlite3
+import time
+import zlib
+
+from . import plex_functions as PF, path_ops, utils, variables as v, app
+
+LOG = getLogger('PLEX.metadata_store')
+
+# Attributes of an item's XML element that change without updatedAt changing
+USERDATA_ATTRIBUTES = ('viewCount', 'viewOffset', 'lastViewedAt',
+                       'userRating', 'viewedLeafCount', 'skipCount')
+# Only update an entry's last access time if it's older than this [s] -
+# saves a write for every single read
+TOUCH_INTERVAL = 3600
+# Once we evict, shrink the cache to this fraction of its max size
+EVICT_TO = 0.9
+
+_LOCK = Lock()
+# Total size of all entries [bytes] per database file
+_SIZE = {}
+# Database files whose schema we already set up
+_INITIALIZED = set()
+# Every thread reuses its own connection per database file, see _open()
+_LOCAL = local()
+# Since PKC startup. Change with _LOCK held
+STATS = {'hit': 0, 'miss': 0, 'corrupt': 0, 'stored': 0, 'evicted': 0}
+
+
+def max_size():
+    """
+    Max size of the cache [bytes]; 0 if the cache is disabled
+    """
+    return (utils.cast(int, utils.cached_setting('metadataCacheSize')) or
+            0) * 1024 * 1024
+
+
+def _db_path():
+    if not app.CONN.machine_identifier:
+        return
+    return path_ops.path.join(v.ADDON_PROFILE,
+                              'metadata_%s.db' % app.CONN.machine_identifier)
+
+
+def _count(key):
+    with _LOCK:
+        STATS[key] += 1
+
+
+def _connect(path):
+    conn = sqlite3.connect(path_ops.encode_path(path), timeout=10.0)
+    with _LOCK:
+        if path in _INITIALIZED:
+            return conn
+    # The journal mode sticks with the database file
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metadata(
+            plex_id INTEGER PRIMARY KEY,
+            updated_at INTEGER,
+            data BLOB,
+            crc INTEGER,
+            size INTEGER,
+            last_access INTEGER)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS ix_metadata_last_access
+        ON metadata (last_access)
+    ''')
+    with _LOCK:
+        _INITIALIZED.add(path)
+    return conn
+
+
+def _open():
+    """
+    Returns this thread's connection to the current PMS' cache or None if the
+    cache is disabled. Starts over with an empty cache if the file is corrupt
+    """
+    path = _db_path()
+    if not path or not max_size():
+        return
+    if not hasattr(_LOCAL, 'connections'):
+        _LOCAL.connections = {}
+    if path in _LOCAL.connections:
+        return _LOCAL.connections[path]
+    try:
+        conn = _connect(path)
+    except sqlite3.DatabaseError as err:
+        LOG.warn('Metadata cache %s is corrupt, starting over: %s', path, err)
+        _count('corrupt')
+        for suffix in ('', '-wal', '-shm'):
+            if path_ops.exists(path + suffix):
+                path_ops.remove(path + suffix)
+        with _LOCK:
+            _SIZE.pop(path, None)
+            _INITIALIZED.discard(path)
+        try:
+            conn = _connect(path)
+        except sqlite3.DatabaseError as err:
+            LOG.error('Could not open the metadata cache: %s', err)
+            return
+    _LOCAL.connections[path] = conn
+    return conn
+
+
+def _discard(path):
+    """
+    Closes this thread's connection to path after an error, rolling back
+    anything uncommitted. The next _open() connects anew and checks the
+    database file
+    """
+    with _LOCK:
+        _INITIALIZED.discard(path)
+    conn = _LOCAL.connections.pop(path, None)
+    if conn is None:
+        return
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def _size(conn, path):
+    # Call with _LOCK held
+    if path not in _SIZE:
+        _SIZE[path] = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM metadata').fetchone()[0]
+    return _SIZE[path]
+
+
+def get(plex_id, updated_at):
+    """
+    Returns the cached etree XML of plex_id with exactly this updatedAt or
+    None. Mind that the userdata might be outdated
+    """
+    if not updated_at:
+        return
+    conn = _open()
+    if conn is None:
+        return
+    try:
+        row = conn.execute('''
+            SELECT data, crc, last_access FROM metadata
+            WHERE plex_id = ? AND updated_at = ?
+        ''', (plex_id, updated_at)).fetchone()
+        if row is None:
+            _count('miss')
+            return
+        try:
+            data = zlib.decompress(bytes(row[0]))
+            if zlib.crc32(data) != row[1]:
+                raise ValueError('CRC mismatch')
+            xml = utils.defused_etree.fromstring(data)
+            xml[0].attrib
+        except Exception as err:
+            LOG.warn('Discarding corrupt cached metadata for %s: %r',
+                     plex_id, err)
+            _count('corrupt')
+            _delete(conn, plex_id)
+            return
+        _count('hit')
+        now = int(time.time())
+        if now - row[2] > TOUCH_INTERVAL:
+            with _LOCK:
+                conn.execute('UPDATE metadata SET last_access = ? '
+                             'WHERE plex_id = ?', (now, plex_id))
+                conn.commit()
+        return xml
+    except sqlite3.DatabaseError as err:
+        LOG.warn('Could not read the metadata cache: %s', err)
+        _discard(_db_path())
+
+
+def store(xml):
+    """
+    Caches the metadata XML as returned by GetPlexMetadata, replacing any
+    older version of the same item
+    """
+    try:
+        plex_id = int(xml[0].get('ratingKey'))
+        updated_at = int(xml[0].get('updatedAt'))
+    except (TypeError, ValueError, IndexError, AttributeError):
+        return
+    conn = _open()
+    if conn is None:
+        return
+    path = _db_path()
+    data = utils.etree.tostring(xml, encoding='utf-8')
+    blob = zlib.compress(data, 6)
+    try:
+        with _LOCK:
+            size = _size(conn, path)
+            old = conn.execute('SELECT size FROM metadata WHERE plex_id = ?',
+                               (plex_id, )).fetchone()
+            conn.execute('''
+                INSERT OR REPLACE INTO metadata(
+                    plex_id, updated_at, data, crc, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (plex_id, updated_at, sqlite3.Binary(blob),
+                  zlib.crc32(data), len(blob), int(time.time())))
+            size += len(blob) - (old[0] if old else 0)
+            if size > max_size():
+                size -= _evict(conn, size - int(max_size() * EVICT_TO))
+            _SIZE[path] = size
+            conn.commit()
+            STATS['stored'] += 1
+    except sqlite3.DatabaseError as err:
+        LOG.warn('Could not write to the metadata cache: %s', err)
+        _discard(path)
+        with _LOCK:
+            _SIZE.pop(path, None)
+
+
+def _evict(conn, amount):
+    """
+    Deletes the least recently used entries until at least amount bytes have
+    been freed. Returns the number of bytes freed. Call with _LOCK held
+    """
+    freed, plex_ids = 0, []
+    for plex_id, size in conn.execute('SELECT plex_id, size FROM metadata '
+                                      'ORDER BY last_access'):
+        if freed >= amount:
+            break
+        plex_ids.append((plex_id, ))
+        freed += size
+    conn.executemany('DELETE FROM metadata WHERE plex_id = ?', plex_ids)
+    STATS['evicted'] += len(plex_ids)
+    LOG.debug('Evicted %s items (%s bytes) from the metadata cache',
+              len(plex_ids), freed)
+    return freed
+
+
+def _delete(conn, plex_id):
+    with _LOCK:
+        conn.execute('DELETE FROM metadata WHERE plex_id = ?', (plex_id, ))
+        conn.commit()
+        _SIZE.pop(_db_path(), None)
+
+
+def overlay_userdata(xml, attributes):
+    """
+    Replaces the userdata of the cached xml with attributes, e.g. the attrib
+    of the item's element of an up-to-date section listing
+    """
+    for key in USERDATA_ATTRIBUTES:
+        if key in attributes:
+            xml[0].set(key, attributes[key])
+        elif key in xml[0].attrib:
+            del xml[0].attrib[key]
+
+
+def metadata(plex_id, updated_at=None, userdata=None, download=None):
+    """
+    Drop-in replacement for GetPlexMetadata(plex_id) that reads through our
+    cache if we know the item's updatedAt and the item's userdata
+    attributes. Otherwise downloads the metadata with download(plex_id)
+    (GetPlexMetadata by default) and caches it. Returns None or 401 if
+    something went wrong
+    """
+    if updated_at and userdata is not None:
+        xml = get(plex_id, updated_at)
+        if xml is not None:
+            overlay_userdata(xml, userdata)
+            return xml
+    xml = (download or PF.GetPlexMetadata)(plex_id)
+    if xml is not None and xml != 401:
+        store(xml)
+    return xml
+
+
+def log_stats():
+    LOG.info('Metadata cache since PKC startup: %s', STATS)
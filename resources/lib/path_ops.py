@@ -100,6 +100,15 @@ def remove(path):
     return os.remove(encode_path(path))
 
 
+def rename(src, dst):
+    """
+    Rename the file or directory src to dst. If dst is a directory, OSError
+    will be raised. On Unix, if dst exists and is a file, it will be replaced
+    silently if the user has permission.
+    """
+    return os.rename(encode_path(src), encode_path(dst))
+
+
 def walk(top, topdown=True, onerror=None, followlinks=False):
     """
     Directory tree generator.
@@ -2,12 +2,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from cPickle import dumps, loads
+import threading
 from xbmcgui import Window
 from xbmc import log, LOGDEBUG
 
 ###############################################################################
 WINDOW = Window(10000)
 PREFIX = 'PLEX.pickler: '
+# Set REPLY.callback within a thread of the PKC service in order to hand the
+# next result pickled by this thread directly to the requesting Python
+# instance, e.g. by using ipc.Reply.send
+REPLY = threading.local()
 ###############################################################################
 
 
@@ -52,7 +57,12 @@ def pickle_me(obj, window_var='plex_result'):
     functions won't work. See the Pickle documentation
     """
     log('%sStart pickling' % PREFIX, level=LOGDEBUG)
-    pickl_window(window_var, value=dumps(obj))
+    callback = getattr(REPLY, 'callback', None)
+    if callback and window_var == 'plex_result':
+        REPLY.callback = None
+        callback(dumps(obj))
+    else:
+        pickl_window(window_var, value=dumps(obj))
     log('%sSuccessfully pickled' % PREFIX, level=LOGDEBUG)
 
 
@@ -63,8 +73,16 @@ def unpickle_me(window_var='plex_result'):
     """
     result = pickl_window(window_var)
     pickl_window(window_var, clear=True)
+    return unpickle(result)
+
+
+def unpickle(data):
+    """
+    Unpickles a Python object from the bytestring data, e.g. received from
+    the PKC service via ipc.request
+    """
     log('%sStart unpickling' % PREFIX, level=LOGDEBUG)
-    obj = loads(result)
+    obj = loads(data)
     log('%sSuccessfully unpickled' % PREFIX, level=LOGDEBUG)
     return obj
 
@@ -17,6 +17,7 @@ from . import playlist_func as PL
 from . import playqueue as PQ
 from . import json_rpc as js
 from . import pickler
+from . import metadata_cache
 from .playutils import PlayUtils
 from .pkc_listitem import PKCListItem
 from . import variables as v
@@ -136,7 +137,7 @@ def _playlist_playback(plex_id, plex_type):
     for the next item in line :-)
     (by the way: trying to get active Kodi player id will return [])
     """
-    xml = PF.GetPlexMetadata(plex_id)
+    xml = metadata_cache.metadata(plex_id)
     try:
         xml[0].attrib
     except (IndexError, TypeError, AttributeError):
@@ -165,7 +166,7 @@ def _playback_init(plex_id, plex_type, playqueue, pos):
     Playback setup if Kodi starts playing an item for the first time.
     """
     LOG.info('Initializing PKC playback')
-    xml = PF.GetPlexMetadata(plex_id)
+    xml = metadata_cache.metadata(plex_id)
     try:
         xml[0].attrib
     except (IndexError, TypeError, AttributeError):
@@ -204,24 +205,30 @@ def _playback_init(plex_id, plex_type, playqueue, pos):
         else:
             trailers = True
     LOG.debug('Playing trailers: %s', trailers)
+    if plex_type != v.PLEX_TYPE_CLIP:
+        # Post to the PMS to create a playqueue - in any case due to Companion
+        # Does not depend on Kodi, so let the PMS work while Kodi stops
+        section_uuid = xml.attrib.get('librarySectionUUID')
+        pms_playqueue = {}
+
+        def post_playqueue():
+            pms_playqueue['xml'] = PF.init_plex_playqueue(plex_id,
+                                                          section_uuid,
+                                                          mediatype=plex_type,
+                                                          trailers=trailers)
+        thread = Thread(target=post_playqueue)
+        thread.setDaemon(True)
+        thread.start()
     if RESOLVE:
-        # Sleep a bit to let setResolvedUrl do its thing - bit ugly
-        sleep_timer = 0
-        while not app.PLAYSTATE.pkc_caused_stop_done:
-            app.APP.monitor.waitForAbort(0.05)
-            sleep_timer += 1
-            if sleep_timer > 100:
-                break
+        # Let setResolvedUrl do its thing
+        app.PLAYSTATE.wait_pkc_caused_stop_done(5)
     playqueue.clear()
     if plex_type != v.PLEX_TYPE_CLIP:
-        # Post to the PMS to create a playqueue - in any case due to Companion
-        xml = PF.init_plex_playqueue(plex_id,
-                                     xml.attrib.get('librarySectionUUID'),
-                                     mediatype=plex_type,
-                                     trailers=trailers)
+        thread.join()
+        xml = pms_playqueue.get('xml')
         if xml is None:
             LOG.error('Could not get a playqueue xml for plex id %s, UUID %s',
-                      plex_id, xml.attrib.get('librarySectionUUID'))
+                      plex_id, section_uuid)
             # "Play error"
             utils.dialog('notification',
                          utils.lang(29999),
@@ -20,13 +20,28 @@ LOG = getLogger('PLEX.playback_starter')
 
 class PlaybackTask(backgroundthread.Task):
     """
-    Processes new plays
+    Processes new plays. Pass an ipc.Reply as reply in order to send the
+    playback result directly to the requesting Python instance instead of
+    pickling it to a window property
     """
-    def __init__(self, command):
+    def __init__(self, command, reply=None):
         self.command = command
+        self.reply = reply
         super(PlaybackTask, self).__init__()
 
     def run(self):
+        if self.reply:
+            pickler.REPLY.callback = self.reply.send
+        try:
+            self._run_command()
+        finally:
+            pickler.REPLY.callback = None
+            if self.reply:
+                # Release the requester even if we never got a result -
+                # does nothing if we answered already
+                self.reply.send()
+
+    def _run_command(self):
         LOG.debug('Starting PlaybackTask with %s', self.command)
         item = self.command
         try:
@@ -10,7 +10,7 @@ from urlparse import parse_qsl, urlsplit
 
 from .plex_api import API
 from .plex_db import PlexDB
-from . import plex_functions as PF
+from . import plex_functions as PF, metadata_cache
 from .kodi_db import kodiid_from_filename
 from .downloadutils import DownloadUtils as DU
 from . import utils
@@ -660,7 +660,7 @@ def add_item_to_kodi_playlist(playlist, pos, kodi_id=None, kodi_type=None,
         item = playlist_item_from_kodi(
             {'id': kodi_id, 'type': kodi_type, 'file': file})
         if item.plex_id is not None:
-            xml = PF.GetPlexMetadata(item.plex_id)
+            xml = metadata_cache.metadata(item.plex_id)
             item.xml = xml[-1]
     playlist.items.insert(pos, item)
     return item
@@ -680,11 +680,13 @@ def move_playlist_item(playlist, before_pos, after_pos):
                playlist.id,
                playlist.items[before_pos].id)
     else:
+        # Moving an item towards the end: items in between will move up by one
+        predecessor = after_pos if before_pos < after_pos else after_pos - 1
         url = "{server}/%ss/%s/items/%s/move?after=%s" % \
               (playlist.kind,
                playlist.id,
                playlist.items[before_pos].id,
-               playlist.items[after_pos - 1].id)
+               playlist.items[predecessor].id)
     # We need to increment the playlistVersion
     _get_playListVersion_from_xml(
         playlist, DU().downloadUrl(url, action_type="PUT"))
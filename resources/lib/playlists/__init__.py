@@ -13,6 +13,7 @@
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from itertools import izip
 
 from .common import Playlist, PlaylistError, PlaylistObserver
 from . import pms, db, kodi_pl, plex_pl
@@ -91,7 +92,6 @@ def websocket(plex_id, status):
         * 6: 'analyzing'
         * 9: 'deleted'
     """
-    create = False
     with app.APP.lock_playlists:
         playlist = db.get_playlist(plex_id=plex_id)
         if plex_id in IGNORE_PLEX_PLAYLIST_CHANGE:
@@ -125,19 +125,13 @@ def websocket(plex_id, status):
                 else:
                     LOG.debug('Change of Plex playlist detected: %s',
                               playlist)
-                    IGNORE_KODI_PLAYLIST_CHANGE.append(plex_id)
-                    kodi_pl.delete(playlist)
-                    create = True
+                    _update_kodi_playlist(playlist, xml[0])
             elif not playlist and not status == 9:
                 LOG.debug('Creation of new Plex playlist detected: %s',
                           plex_id)
-                create = True
-            # To the actual work
-            if create:
-                IGNORE_KODI_PLAYLIST_CHANGE.append(plex_id)
-                kodi_pl.create(plex_id)
+                _create_kodi_playlist(xml[0])
         except PlaylistError:
-            IGNORE_KODI_PLAYLIST_CHANGE.remove(plex_id)
+            pass
 
 
 def full_sync():
@@ -168,6 +162,8 @@ def _full_sync():
     # For each playlist, check Plex database to see whether we already synced
     # before. If yes, make sure that hashes are identical. If not, sync it.
     old_plex_ids = db.plex_playlist_ids()
+    # Tuples (xml, playlist) of new (playlist None) and changed playlists
+    todo = []
     for xml_playlist in xml:
         api = API(xml_playlist)
         try:
@@ -180,29 +176,24 @@ def _full_sync():
         if not playlist:
             LOG.debug('New Plex playlist %s discovered: %s',
                       api.plex_id(), api.title())
-            IGNORE_KODI_PLAYLIST_CHANGE.append(api.plex_id())
-            try:
-                kodi_pl.create(api.plex_id())
-            except PlaylistError:
-                LOG.info('Skipping creation of playlist %s', api.plex_id())
-                IGNORE_KODI_PLAYLIST_CHANGE.remove(api.plex_id())
+            todo.append((xml_playlist, None))
         elif playlist.plex_updatedat != api.updated_at():
             LOG.debug('Detected changed Plex playlist %s: %s',
                       api.plex_id(), api.title())
-            # Since we are DELETING a playlist, we need to catch with path!
-            IGNORE_KODI_PLAYLIST_CHANGE.append(playlist.kodi_path)
-            try:
-                kodi_pl.delete(playlist)
-            except PlaylistError:
-                LOG.info('Skipping recreation of playlist %s', api.plex_id())
-                IGNORE_KODI_PLAYLIST_CHANGE.remove(playlist.kodi_path)
+            todo.append((xml_playlist, playlist))
+    # Download the items of all these playlists concurrently
+    downloads = pms.get_playlists([API(x[0]).plex_id() for x in todo])
+    for (xml_playlist, playlist), (plex_id, items) in izip(todo, downloads):
+        if items is None:
+            LOG.error('Could not get Plex playlist %s, skipping it', plex_id)
+            continue
+        try:
+            if playlist:
+                _update_kodi_playlist(playlist, xml_playlist, items)
             else:
-                IGNORE_KODI_PLAYLIST_CHANGE.append(api.plex_id())
-                try:
-                    kodi_pl.create(api.plex_id())
-                except PlaylistError:
-                    LOG.info('Could not recreate playlist %s', api.plex_id())
-                    IGNORE_KODI_PLAYLIST_CHANGE.remove(api.plex_id())
+                _create_kodi_playlist(xml_playlist, items)
+        except PlaylistError:
+            LOG.info('Skipping playlist %s', plex_id)
     # Get rid of old Plex playlists that were deleted on the Plex side
     for plex_id in old_plex_ids:
         playlist = db.get_playlist(plex_id=plex_id)
@@ -256,6 +247,58 @@ def _full_sync():
     return True
 
 
+def _create_kodi_playlist(xml, items=None):
+    """
+    Creates the Kodi playlist file for the new Plex playlist xml. Pass in the
+    playlist's items if we downloaded them already. Raises PlaylistError
+    """
+    plex_id = API(xml).plex_id()
+    IGNORE_KODI_PLAYLIST_CHANGE.append(plex_id)
+    try:
+        kodi_pl.create(plex_id, xml, items)
+    except PlaylistError:
+        IGNORE_KODI_PLAYLIST_CHANGE.remove(plex_id)
+        raise
+
+
+def _update_kodi_playlist(playlist, xml, items=None):
+    """
+    Brings the existing Kodi playlist file of playlist [Playlist] in line with
+    the changed Plex playlist xml. Rewrites the file in place unless the
+    playlist's name or type changed, and only if its content changed. Raises
+    PlaylistError
+    """
+    api = API(xml)
+    if (api.title() != playlist.plex_name or
+            v.KODI_PLAYLIST_TYPE_FROM_PLEX[api.playlist_type()] !=
+            playlist.kodi_type):
+        # We need a new file. Since we are DELETING a playlist, we need to
+        # catch with path!
+        IGNORE_KODI_PLAYLIST_CHANGE.append(playlist.kodi_path)
+        try:
+            kodi_pl.delete(playlist)
+        except PlaylistError:
+            IGNORE_KODI_PLAYLIST_CHANGE.remove(playlist.kodi_path)
+            raise
+        _create_kodi_playlist(xml, items)
+        return
+    if items is None:
+        items = pms.get_playlist(playlist.plex_id)
+        if items is None:
+            LOG.error('Could not get Plex playlist %s', playlist.plex_id)
+            raise PlaylistError('Could not get Plex playlist %s'
+                                % playlist.plex_id)
+    IGNORE_KODI_PLAYLIST_CHANGE.append(playlist.plex_id)
+    try:
+        written = kodi_pl.update(playlist, xml, items)
+    except PlaylistError:
+        IGNORE_KODI_PLAYLIST_CHANGE.remove(playlist.plex_id)
+        raise
+    if not written:
+        # We won't get a filesystem event for the file
+        IGNORE_KODI_PLAYLIST_CHANGE.remove(playlist.plex_id)
+
+
 def sync_kodi_playlist(path):
     """
     Checks whether we should sync a specific Kodi playlist to Plex
@@ -287,7 +330,7 @@ def sync_kodi_playlist(path):
         return True
     playlist = Playlist()
     playlist.kodi_path = path
-    prefix = utils.settings('syncSpecificKodiPlaylistsPrefix').lower()
+    prefix = utils.cached_setting('syncSpecificKodiPlaylistsPrefix').lower()
     if playlist.kodi_filename.lower().startswith(prefix):
         return True
     LOG.debug('User chose to not sync Kodi playlist %s', path)
@@ -346,7 +389,7 @@ def sync_plex_playlist(playlist=None, xml=None, plex_id=None):
         return False
     if not app.SYNC.sync_specific_plex_playlists:
         return True
-    prefix = utils.settings('syncSpecificPlexPlaylistsPrefix').lower()
+    prefix = utils.cached_setting('syncSpecificPlexPlaylistsPrefix').lower()
     if name and name.lower().startswith(prefix):
         return True
     LOG.debug('User chose to not sync Plex playlist %s', name)
@@ -9,7 +9,7 @@ from logging import getLogger
 
 from .common import Playlist, PlaylistError
 from ..plex_db import PlexDB
-from ..kodi_db import kodiid_from_filename
+from ..kodi_db import kodiids_from_filenames
 from .. import path_ops, utils, variables as v
 ###############################################################################
 LOG = getLogger('PLEX.playlists.db')
@@ -81,22 +81,27 @@ def m3u_to_plex_ids(playlist):
     except UnicodeDecodeError:
         LOG.warning('Fallback to ISO-8859-1 decoding for %s', playlist)
         text = text.decode('ISO-8859-1')
+    # Positions in plex_ids and paths of entries that are not PKC add-on paths
+    unresolved = []
     for entry in _m3u_iterator(text):
         plex_id = utils.REGEX_PLEX_ID.search(entry)
         if plex_id:
-            plex_id = plex_id.group(1)
-            plex_ids.append(plex_id)
+            plex_ids.append(plex_id.group(1))
         else:
-            # Add-on paths not working, try direct
-            kodi_id, kodi_type = kodiid_from_filename(entry,
-                                                      db_type=playlist.kodi_type)
-            if not kodi_id:
-                continue
-            with PlexDB() as plexdb:
-                plex_id = plexdb.item_by_kodi_id(kodi_id, kodi_type)
-            if plex_id:
-                plex_ids.append(plex_id[0])
-    return plex_ids
+            unresolved.append((len(plex_ids), entry))
+            plex_ids.append(None)
+    if unresolved:
+        # Add-on paths not working, try direct - using one DB connection each
+        kodi_items = kodiids_from_filenames([x[1] for x in unresolved],
+                                            db_type=playlist.kodi_type)
+        with PlexDB() as plexdb:
+            for (pos, _), (kodi_id, kodi_type) in zip(unresolved, kodi_items):
+                if not kodi_id:
+                    continue
+                item = plexdb.item_by_kodi_id(kodi_id, kodi_type)
+                if item:
+                    plex_ids[pos] = item['plex_id']
+    return [x for x in plex_ids if x is not None]
 
 
 def playlist_file_to_plex_ids(playlist):
@@ -5,6 +5,7 @@ Create and delete playlists on the Kodi side of things
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+import hashlib
 import re
 
 from .common import Playlist, PlaylistError
@@ -20,20 +21,24 @@ LOG = getLogger('PLEX.playlists.kodi_pl')
 REGEX_FILE_NUMBERING = re.compile(r'''_(\d+)\.\w+$''')
 
 
-def create(plex_id):
+def create(plex_id, xml=None, items=None):
     """
     Creates a new Kodi playlist file. Will also add (or modify an existing)
     Plex playlist table entry.
     Assumes that the Plex playlist is indeed new. A NEW Kodi playlist will be
     created in any case (not replaced). Thus make sure that the "same" playlist
     is deleted from both disk and the Plex database.
+    Pass in the playlist's metadata xml and its items, e.g. from
+    pms.all_playlists() and pms.get_playlists(), to avoid downloading them.
     Returns the playlist or raises PlaylistError
     """
-    xml_metadata = pms.metadata(plex_id)
-    if xml_metadata is None:
-        LOG.error('Could not get Plex playlist metadata %s', plex_id)
-        raise PlaylistError('Could not get Plex playlist %s' % plex_id)
-    api = API(xml_metadata[0])
+    if xml is None:
+        xml = pms.metadata(plex_id)
+        if xml is None:
+            LOG.error('Could not get Plex playlist metadata %s', plex_id)
+            raise PlaylistError('Could not get Plex playlist %s' % plex_id)
+        xml = xml[0]
+    api = API(xml)
     playlist = Playlist()
     playlist.plex_id = api.plex_id()
     playlist.kodi_type = v.KODI_PLAYLIST_TYPE_FROM_PLEX[api.playlist_type()]
@@ -57,16 +62,42 @@ def create(plex_id):
             path = '%s_%02d.m3u' % (basename, number)
     LOG.debug('Kodi playlist path: %s', path)
     playlist.kodi_path = path
-    xml_playlist = pms.get_playlist(plex_id)
-    if xml_playlist is None:
-        LOG.error('Could not get Plex playlist %s', plex_id)
-        raise PlaylistError('Could not get Plex playlist %s' % plex_id)
-    _write_playlist_to_file(playlist, xml_playlist)
-    playlist.kodi_hash = utils.generate_file_md5(path)
+    if items is None:
+        items = pms.get_playlist(plex_id)
+        if items is None:
+            LOG.error('Could not get Plex playlist %s', plex_id)
+            raise PlaylistError('Could not get Plex playlist %s' % plex_id)
+    text = _m3u_text(items)
+    _write_playlist_to_file(playlist, text)
+    playlist.kodi_hash = _hash(text)
     db.update_playlist(playlist)
     LOG.debug('Created Kodi playlist based on Plex playlist: %s', playlist)
 
 
+def update(playlist, xml, items):
+    """
+    Rewrites the existing Kodi playlist file of playlist [Playlist] in place
+    using the Plex playlist's metadata xml and its items - but only if the
+    file's content actually changed. Updates the Plex playlist table entry.
+    Returns True if the file was written, False otherwise. Raises
+    PlaylistError
+    """
+    playlist.plex_updatedat = API(xml).updated_at()
+    text = _m3u_text(items)
+    kodi_hash = _hash(text)
+    written = False
+    if (not path_ops.exists(playlist.kodi_path) or
+            utils.generate_file_md5(playlist.kodi_path) != kodi_hash):
+        _write_playlist_to_file(playlist, text)
+        written = True
+        LOG.debug('Rewrote Kodi playlist: %s', playlist)
+    else:
+        LOG.debug('Content of Kodi playlist did not change: %s', playlist)
+    playlist.kodi_hash = kodi_hash
+    db.update_playlist(playlist)
+    return written
+
+
 def delete(playlist):
     """
     Removes the corresponding Kodi file for playlist Playlist from
@@ -85,12 +116,20 @@ def delete(playlist):
     db.update_playlist(playlist, delete=True)
 
 
-def _write_playlist_to_file(playlist, xml):
+def _hash(text):
     """
-    Feed with playlist Playlist. Will write the playlist to a m3u file
-    Returns None or raises PlaylistError
+    Same as utils.generate_file_md5() for the file content text [bytes]
+    """
+    return hashlib.md5(text).hexdigest().decode('utf-8')
+
+
+def _m3u_text(xml):
     """
-    text = '#EXTCPlayListM3U::M3U\n'
+    Returns the content of the m3u file for the Plex playlist items xml as
+    bytes
+    """
+    # Joined once at the end - playlists may hold thousands of items
+    text = ['#EXTCPlayListM3U::M3U\n']
     for element in xml:
         api = API(element)
         append_season_episode = False
@@ -104,18 +143,25 @@ def _write_playlist_to_file(playlist, xml):
             else:
                 append_season_episode = True
             if append_season_episode:
-                text += ('#EXTINF:%s,%s S%.2dE%.2d - %s\n%s\n'
-                         % (api.runtime(), show, season_no, episode_no,
-                            api.title(), api.path()))
+                text.append('#EXTINF:%s,%s S%.2dE%.2d - %s\n%s\n'
+                            % (api.runtime(), show, season_no, episode_no,
+                               api.title(), api.path()))
             else:
                 # Only append the TV show name
-                text += ('#EXTINF:%s,%s - %s\n%s\n'
-                         % (api.runtime(), show, api.title(), api.path()))
+                text.append('#EXTINF:%s,%s - %s\n%s\n'
+                            % (api.runtime(), show, api.title(), api.path()))
         else:
-            text += ('#EXTINF:%s,%s\n%s\n'
-                     % (api.runtime(), api.title(), api.path()))
-    text += '\n'
-    text = text.encode(v.M3U_ENCODING, 'ignore')
+            text.append('#EXTINF:%s,%s\n%s\n'
+                        % (api.runtime(), api.title(), api.path()))
+    text.append('\n')
+    return ''.join(text).encode(v.M3U_ENCODING, 'ignore')
+
+
+def _write_playlist_to_file(playlist, text):
+    """
+    Feed with playlist Playlist. Will write text [bytes] to the playlist's m3u
+    file. Returns None or raises PlaylistError
+    """
     try:
         with open(path_ops.encode_path(playlist.kodi_path), 'wb') as f:
             f.write(text)
@@ -7,12 +7,13 @@ manipulate playlists
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
 import urllib
+import Queue
 
 from .common import PlaylistError
 
 from ..plex_api import API
 from ..downloadutils import DownloadUtils as DU
-from .. import variables as v
+from .. import backgroundthread, app, variables as v
 ###############################################################################
 LOG = getLogger('PLEX.playlists.pms')
 
@@ -45,6 +46,41 @@ def get_playlist(plex_id):
     return xml
 
 
+def get_playlists(plex_ids):
+    """
+    Fetches the PMS playlists for all plex_ids concurrently. Yields the tuples
+    (plex_id, xml) in the order of plex_ids as soon as they are available;
+    xml is None if something went wrong
+    """
+    results = Queue.Queue()
+    for plex_id in plex_ids:
+        backgroundthread.BGThreader.addTask(
+            backgroundthread.FunctionAsTask(_get_playlist_task,
+                                            None,
+                                            plex_id,
+                                            results))
+    # Downloads that finished before the ones ahead of them in plex_ids
+    done = {}
+    for plex_id in plex_ids:
+        while plex_id not in done:
+            try:
+                key, xml = results.get(timeout=1)
+            except Queue.Empty:
+                if app.APP.stop_pkc:
+                    return
+                continue
+            done[key] = xml
+        yield plex_id, done.pop(plex_id)
+
+
+def _get_playlist_task(plex_id, results):
+    xml = None
+    try:
+        xml = get_playlist(plex_id)
+    finally:
+        results.put((plex_id, xml))
+
+
 def initialize(playlist, plex_id):
     """
     Initializes a new playlist on the PMS side. Will set playlist.plex_id and
@@ -5,6 +5,10 @@ Monitors the Kodi playqueue and adjusts the Plex playqueue accordingly
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from bisect import bisect_left
+from collections import deque
+from threading import Event
+import time
 import xbmc
 
 from .plex_api import API
@@ -18,6 +22,13 @@ PLUGIN = 'plugin://%s' % v.ADDON_ID
 
 # Our PKC playqueues (3 instances of Playqueue_Object())
 PLAYQUEUES = []
+# Set by kodimonitor whenever Kodi tells us that a playqueue changed
+CHANGED = Event()
+# Wait for a burst of Kodi playqueue changes to settle [s]
+SETTLE_TIME = 0.2
+# Kodi does not tell us if items were moved within a playqueue. Check filled
+# playqueues every so often [s]
+FALLBACK_INTERVAL = 2.0
 ###############################################################################
 
 
@@ -91,10 +102,71 @@ def init_playqueue_from_plex_children(plex_id, transient_token=None):
     return playqueue
 
 
+def _kodi_key(kodi_item):
+    """
+    Returns the key that identifies the Kodi playlist item kodi_item
+    """
+    if 'id' in kodi_item:
+        return ('kodi', kodi_item['type'], kodi_item['id'])
+    try:
+        return ('plex', int(utils.REGEX_PLEX_ID.findall(kodi_item['file'])[0]))
+    except IndexError:
+        # Comparing paths directly as a fallback
+        return ('file', kodi_item['file'])
+
+
+def _pkc_keys(item):
+    """
+    Returns all keys under which the PKC playlist item might be identified
+    """
+    keys = []
+    if item.kodi_id is not None:
+        keys.append(('kodi', item.kodi_type, item.kodi_id))
+    if item.plex_id is not None:
+        keys.append(('plex', item.plex_id))
+    if item.file:
+        keys.append(('file', item.file))
+    return keys
+
+
+def _foreign(path):
+    """
+    Returns True for media added to the Kodi playqueue by other add-ons
+    """
+    return bool(path and path.startswith('plugin://') and
+                not path.startswith(PLUGIN))
+
+
+def _longest_increasing(sequence):
+    """
+    Returns the set of indices of a longest strictly increasing subsequence of
+    sequence in O(n log n)
+    """
+    tails, tails_index, previous = [], [], [None] * len(sequence)
+    for i, value in enumerate(sequence):
+        pos = bisect_left(tails, value)
+        if pos:
+            previous[i] = tails_index[pos - 1]
+        if pos == len(tails):
+            tails.append(value)
+            tails_index.append(i)
+        else:
+            tails[pos] = value
+            tails_index[pos] = i
+    result = set()
+    i = tails_index[-1] if tails_index else None
+    while i is not None:
+        result.add(i)
+        i = previous[i]
+    return result
+
+
 class PlayqueueMonitor(backgroundthread.KillableThread):
     """
     Unfortunately, Kodi does not tell if items within a Kodi playqueue
-    (playlist) are swapped. This is what this monitor is for. Don't replace
+    (playlist) are swapped. Hence this monitor compares the Kodi playqueues
+    with ours after Kodi told us about a change (see CHANGED) and, as long as
+    any playqueue is filled, every FALLBACK_INTERVAL seconds. Don't replace
     this mechanism till Kodi's implementation of playlists has improved
     """
     def isSuspended(self):
@@ -105,99 +177,139 @@ class PlayqueueMonitor(backgroundthread.KillableThread):
 
     def _compare_playqueues(self, playqueue, new):
         """
-        Used to poll the Kodi playqueue and update the Plex playqueue if needed
+        Updates the Plex playqueue so it matches the Kodi playqueue new.
+        Matches the items by their ids in O(n), then sends all deletions,
+        additions and the minimal number of moves to the PMS
         """
-        old = list(playqueue.items)
-        index = list(range(0, len(old)))
         LOG.debug('Comparing new Kodi playqueue %s with our play queue %s',
-                  new, old)
+                  new, playqueue.items)
+        # Ignore new media added by other addons
+        new = [x for x in new if not _foreign(x['file'])]
+        if playqueue.id is None:
+            # Nothing on the Plex side yet to compare to
+            matches, unmatched = [None] * len(new), []
+        else:
+            matches, unmatched = self._match(playqueue, new)
+        for pos in reversed(unmatched):
+            if self.isCanceled():
+                # Chances are that we got an empty Kodi playlist due to
+                # Kodi exit
+                return
+            LOG.debug('Detected deletion of playqueue element at pos %s', pos)
+            try:
+                PL.delete_playlist_item_from_PMS(playqueue, pos)
+            except PL.PlaylistError:
+                LOG.error('Could not delete PMS element from position %s',
+                          pos)
+                LOG.error('This is likely caused by mixing audio and '
+                          'video tracks in the Kodi playqueue')
+        # Append all new items to the end of the Plex playqueue first
         for i, new_item in enumerate(new):
-            if (new_item['file'].startswith('plugin://') and
-                    not new_item['file'].startswith(PLUGIN)):
-                # Ignore new media added by other addons
+            if matches[i] is not None:
                 continue
-            for j, old_item in enumerate(old):
-                if self.isCanceled():
-                    # Chances are that we got an empty Kodi playlist due to
-                    # Kodi exit
-                    return
-                try:
-                    if (old_item.file.startswith('plugin://') and
-                            not old_item.file.startswith(PLUGIN)):
-                        # Ignore media by other addons
-                        continue
-                except AttributeError:
-                    # were not passed a filename; ignore
-                    pass
-                if 'id' in new_item:
-                    identical = (old_item.kodi_id == new_item['id'] and
-                                 old_item.kodi_type == new_item['type'])
+            if self.isCanceled():
+                return
+            LOG.debug('Detected new Kodi element at position %s: %s ',
+                      i, new_item)
+            try:
+                if playqueue.id is None:
+                    matches[i] = PL.init_plex_playqueue(playqueue,
+                                                        kodi_item=new_item)
                 else:
-                    try:
-                        plex_id = int(utils.REGEX_PLEX_ID.findall(new_item['file'])[0])
-                    except IndexError:
-                        LOG.debug('Comparing paths directly as a fallback')
-                        identical = old_item.file == new_item['file']
-                    else:
-                        identical = plex_id == old_item.plex_id
-                if j == 0 and identical:
-                    del old[j], index[j]
-                    break
-                elif identical:
-                    LOG.debug('Playqueue item %s moved to position %s',
-                              i + j, i)
-                    try:
-                        PL.move_playlist_item(playqueue, i + j, i)
-                    except PL.PlaylistError:
-                        LOG.error('Could not modify playqueue positions')
-                        LOG.error('This is likely caused by mixing audio and '
-                                  'video tracks in the Kodi playqueue')
-                    del old[j], index[j]
-                    break
+                    matches[i] = PL.add_item_to_plex_playqueue(
+                        playqueue, len(playqueue.items), kodi_item=new_item)
+            except PL.PlaylistError:
+                # Could not add the element
+                pass
+            except IndexError:
+                # This is really a hack - happens when using Addon Paths
+                # and repeatedly  starting the same element. Kodi will then
+                # not pass kodi id nor file path AND will also not
+                # start-up playback. Hence kodimonitor kicks off playback.
+                # Also see kodimonitor.py - _playlist_onadd()
+                pass
+        self._reorder(playqueue, [x for x in matches if x is not None])
+        LOG.debug('Done comparing playqueues')
+
+    @staticmethod
+    def _match(playqueue, new):
+        """
+        Pairs every Kodi item in new with the first unpaired PKC playqueue item
+        carrying the same id. Returns the tuple (matches, unmatched) with
+        matches[i] the PKC item for new[i] or None, unmatched the sorted
+        positions of all PKC items without a Kodi counterpart
+        """
+        index = {}
+        for pos, item in enumerate(playqueue.items):
+            if _foreign(item.file):
+                # Ignore media by other addons
+                continue
+            for key in _pkc_keys(item):
+                index.setdefault(key, deque()).append(pos)
+        paired = set()
+        matches = []
+        for new_item in new:
+            positions = index.get(_kodi_key(new_item), ())
+            while positions and positions[0] in paired:
+                positions.popleft()
+            if positions:
+                pos = positions.popleft()
+                paired.add(pos)
+                matches.append(playqueue.items[pos])
             else:
-                LOG.debug('Detected new Kodi element at position %s: %s ',
-                          i, new_item)
-                try:
-                    if playqueue.id is None:
-                        PL.init_plex_playqueue(playqueue, kodi_item=new_item)
-                    else:
-                        PL.add_item_to_plex_playqueue(playqueue,
-                                                      i,
-                                                      kodi_item=new_item)
-                except PL.PlaylistError:
-                    # Could not add the element
-                    pass
-                except IndexError:
-                    # This is really a hack - happens when using Addon Paths
-                    # and repeatedly  starting the same element. Kodi will then
-                    # not pass kodi id nor file path AND will also not
-                    # start-up playback. Hence kodimonitor kicks off playback.
-                    # Also see kodimonitor.py - _playlist_onadd()
-                    pass
-                else:
-                    for j in range(i, len(index)):
-                        index[j] += 1
-        for i in reversed(index):
+                matches.append(None)
+        unmatched = [i for i in range(len(playqueue.items))
+                     if i not in paired]
+        return matches, unmatched
+
+    def _reorder(self, playqueue, target):
+        """
+        Moves the items of the Plex playqueue into the order of target,
+        leaving a longest run of items already in the correct order alone
+        """
+        positions = dict((id(item), pos)
+                         for pos, item in enumerate(playqueue.items))
+        stay = _longest_increasing([positions[id(item)] for item in target])
+        for i, item in enumerate(target):
+            if i in stay:
+                continue
             if self.isCanceled():
-                # Chances are that we got an empty Kodi playlist due to
-                # Kodi exit
                 return
-            LOG.debug('Detected deletion of playqueue element at pos %s', i)
+            before_pos = playqueue.items.index(item)
+            if i == 0:
+                after_pos = 0
+            else:
+                # Put the item right behind its predecessor
+                after_pos = playqueue.items.index(target[i - 1])
+                if before_pos > after_pos:
+                    after_pos += 1
+            if before_pos == after_pos:
+                continue
+            LOG.debug('Playqueue item %s moved to position %s',
+                      before_pos, after_pos)
             try:
-                PL.delete_playlist_item_from_PMS(playqueue, i)
+                PL.move_playlist_item(playqueue, before_pos, after_pos)
             except PL.PlaylistError:
-                LOG.error('Could not delete PMS element from position %s', i)
+                LOG.error('Could not modify playqueue positions')
                 LOG.error('This is likely caused by mixing audio and '
                           'video tracks in the Kodi playqueue')
-        LOG.debug('Done comparing playqueues')
 
     def run(self):
         LOG.info("----===## Starting PlayqueueMonitor ##===----")
+        polled = 0
         while not self.isCanceled():
             while self.isSuspended():
                 if self.isCanceled():
                     break
                 app.APP.monitor.waitForAbort(1)
+            if CHANGED.wait(1):
+                # Let a burst of changes settle, e.g. queueing an entire album
+                app.APP.monitor.waitForAbort(SETTLE_TIME)
+                CHANGED.clear()
+            elif (not any(x.old_kodi_pl for x in PLAYQUEUES) or
+                    time.time() - polled < FALLBACK_INTERVAL):
+                continue
+            polled = time.time()
             with app.APP.lock_playqueues:
                 for playqueue in PLAYQUEUES:
                     kodi_pl = js.playlist_get_items(playqueue.playlistid)
@@ -211,5 +323,4 @@ class PlayqueueMonitor(backgroundthread.KillableThread):
                             # compare old and new playqueue
                             self._compare_playqueues(playqueue, kodi_pl)
                         playqueue.old_kodi_pl = list(kodi_pl)
-            app.APP.monitor.waitForAbort(0.2)
         LOG.info("----===## PlayqueueMonitor stopped ##===----")
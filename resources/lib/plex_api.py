@@ -1025,7 +1025,7 @@ class API(object):
             LOG.debug('Start movie set/collection lookup on themoviedb with %s',
                       item.get('title', ''))
 
-        api_key = utils.settings('themoviedbAPIKey')
+        api_key = utils.cached_setting('themoviedbAPIKey')
         if media_type == v.PLEX_TYPE_SHOW:
             media_type = 'tv'
         title = item.get('title', '')
@@ -1179,7 +1179,7 @@ class API(object):
 
         media_id: IMDB id for movies, tvdb id for TV shows
         """
-        api_key = utils.settings('FanArtTVAPIKey')
+        api_key = utils.cached_setting('FanArtTVAPIKey')
         typus = self.plex_type()
         if typus == v.PLEX_TYPE_SHOW:
             typus = 'tv'
@@ -1323,10 +1323,10 @@ class API(object):
             count += 1
         if (count > 1 and (
                 (self.plex_type() != v.PLEX_TYPE_CLIP and
-                 utils.settings('bestQuality') == 'false')
+                 utils.cached_setting('bestQuality') == 'false')
             or
                 (self.plex_type() == v.PLEX_TYPE_CLIP and
-                 utils.settings('bestTrailer') == 'false'))):
+                 utils.cached_setting('bestTrailer') == 'false'))):
             # Several streams/files available.
             dialoglist = []
             for entry in self.item.iterfind('./Media'):
@@ -1425,7 +1425,7 @@ class API(object):
         transcode_path = app.CONN.server + \
             '/video/:/transcode/universal/start.m3u8?'
         args = {
-            'audioBoost': utils.settings('audioBoost'),
+            'audioBoost': utils.cached_setting('audioBoost'),
             'autoAdjustQuality': 0,
             'directPlay': 0,
             'directStream': 1,
@@ -1437,7 +1437,7 @@ class API(object):
             'partIndex': self.part,
             'hasMDE': 1,
             'location': 'lan',
-            'subtitleSize': utils.settings('subtitleSize')
+            'subtitleSize': utils.cached_setting('subtitleSize')
         }
         # Look like Android to let the PMS use the transcoding profile
         xargs.update(headers)
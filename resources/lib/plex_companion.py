@@ -272,10 +272,14 @@ class PlexCompanion(backgroundthread.KillableThread):
 
         if utils.settings('plexCompanion') == 'true':
             # Start up httpd
+            if utils.settings('companionListenerPool') == 'true':
+                server_class = listener.PooledHTTPServer
+            else:
+                server_class = listener.ThreadedHTTPServer
             start_count = 0
             while True:
                 try:
-                    httpd = listener.ThreadedHTTPServer(
+                    httpd = server_class(
                         client,
                         subscription_manager,
                         ('', v.COMPANION_PORT),
@@ -296,7 +300,9 @@ class PlexCompanion(backgroundthread.KillableThread):
             LOG.info('User deactivated Plex Companion')
         client.start_all()
         message_count = 0
-        if httpd:
+        if httpd and httpd.pooled:
+            httpd.start()
+        elif httpd:
             thread = Thread(target=httpd.handle_request)
 
         while not self.isCanceled():
@@ -310,7 +316,7 @@ class PlexCompanion(backgroundthread.KillableThread):
             try:
                 message_count += 1
                 if httpd:
-                    if not thread.isAlive():
+                    if not httpd.pooled and not thread.isAlive():
                         # Use threads cause the method will stall
                         thread = Thread(target=httpd.handle_request)
                         thread.start()
@@ -347,4 +353,7 @@ class PlexCompanion(backgroundthread.KillableThread):
                 continue
             app.APP.monitor.waitForAbort(0.05)
         subscription_manager.signal_stop()
+        subscription_manager.publisher.stop()
+        if httpd and httpd.pooled:
+            httpd.stop()
         client.stop_all()
@@ -93,9 +93,10 @@ class PlexDBBase(object):
         """
         Returns an iterator for all items where the last_sync is NOT identical
         """
+        # Unlike <>, lets SQLite use the index on last_sync
         return (x[0] for x in
-                self.cursor.execute('SELECT plex_id FROM %s WHERE last_sync <> ?' % plex_type,
-                                    (last_sync, )))
+                self.cursor.execute('SELECT plex_id FROM %s WHERE last_sync < ? OR last_sync > ?' % plex_type,
+                                    (last_sync, last_sync)))
 
     def checksum(self, plex_id, plex_type):
         """
@@ -153,6 +154,22 @@ class PlexDBBase(object):
                 self.cursor.execute('SELECT kodi_id FROM %s WHERE section_id = ?' % plex_type,
                                     (section_id, )))
 
+    def kodiid_by(self, plex_type, column, value):
+        """
+        Returns an iterator for the kodi_id of all items of plex_type where
+        column equals value, e.g. column='show_id' for all episodes of a show
+        """
+        return (x[0] for x in
+                self.cursor.execute('SELECT kodi_id FROM %s WHERE %s = ?' % (plex_type, column),
+                                    (value, )))
+
+    def remove_by(self, plex_type, column, value):
+        """
+        Removes all items of plex_type where column equals value
+        """
+        self.cursor.execute('DELETE FROM %s WHERE %s = ?' % (plex_type, column),
+                            (value, ))
+
 
 def initialize():
         """
@@ -7,21 +7,25 @@ from ast import literal_eval
 from urlparse import urlparse, parse_qsl
 from copy import deepcopy
 from time import time
-from threading import Thread
+from threading import Thread, Event
 
 from .downloadutils import DownloadUtils as DU
-from . import backgroundthread, utils, plex_tv, variables as v, app
+from . import backgroundthread, utils, plex_tv, pms_routes, variables as v, app
+from .concurrency import CONTROLLER, outcome
 
 ###############################################################################
 LOG = getLogger('PLEX.plex_functions')
 
-CONTAINERSIZE = int(utils.settings('limitindex'))
-
 # For discovery of PMS in the local LAN
 PLEX_GDM_IP = '239.0.0.250'  # multicast to PMS
 PLEX_GDM_PORT = 32414
 PLEX_GDM_MSG = 'M-SEARCH * HTTP/1.0'
 
+# Timeout for every single connection we race [s]
+RACE_TIMEOUT = 10
+# Relay connections are bandwidth-limited - give the others a head start [s]
+RELAY_HEAD_START = 1.0
+
 ###############################################################################
 
 
@@ -131,7 +135,8 @@ def check_connection(url, token=None, verifySSL=None):
     if token is not None:
         header_options = {'X-Plex-Token': token}
     if verifySSL is True:
-        verifySSL = None if utils.settings('sslverify') == 'true' else False
+        verifySSL = (None if utils.cached_setting('sslverify') == 'true'
+                     else False)
     if 'plex.tv' in url:
         url = 'https://plex.tv/api/home/users'
     LOG.debug("Checking connection to server %s with verifySSL=%s",
@@ -190,17 +195,21 @@ def discover_pms(token=None):
     }
     """
     LOG.info('Start discovery of Plex Media Servers')
-    # Look first for local PMS in the LAN
-    local_pms_list = _plex_gdm()
-    LOG.debug('PMS found in the local LAN using Plex GDM: %s', local_pms_list)
+    # Look for local PMS in the LAN while we're asking plex.tv
+    local_pms_list = []
+    gdm = Thread(target=lambda: local_pms_list.extend(_plex_gdm()),
+                 name='PlexGDM')
+    gdm.start()
     # Get PMS from plex.tv
     if token:
         LOG.info('Checking with plex.tv for more PMS to connect to')
         plex_pms_list = _pms_list_from_plex_tv(token)
         _log_pms(plex_pms_list)
     else:
-        LOG.info('No plex token supplied, only checked LAN for available PMS')
+        LOG.info('No plex token supplied, only checking LAN for available PMS')
         plex_pms_list = []
+    gdm.join()
+    LOG.debug('PMS found in the local LAN using Plex GDM: %s', local_pms_list)
 
     # Add PMS found only in the LAN to the Plex.tv PMS list
     for pms in local_pms_list:
@@ -355,16 +364,8 @@ def _pms_list_from_plex_tv(token):
             'relay': device.get('relay') == '1',
             'presence': device.get('presence') == '1',
             'httpsRequired': device.get('httpsRequired') == '1',
-            'connections': []
         }
-        # Try a local connection first, no matter what plex.tv tells us
-        for connection in device.findall('Connection'):
-            if connection.get('local') == '1':
-                pms['connections'].append(connection)
-        # Then try non-local
-        for connection in device.findall('Connection'):
-            if connection.get('local') != '1':
-                pms['connections'].append(connection)
+        pms_routes.remember(pms, _routes(device.findall('Connection')))
         # Spawn threads to ping each PMS simultaneously
         thread = Thread(target=_poke_pms, args=(pms, queue))
         thread_queue.append(thread)
@@ -395,59 +396,157 @@ def _pms_list_from_plex_tv(token):
     pms_list = []
     while not queue.empty():
         pms = queue.get()
-        del pms['connections']
         pms_list.append(pms)
         queue.task_done()
     return pms_list
 
 
-def _poke_pms(pms, queue):
-    data = pms['connections'][0].attrib
-    url = data['uri']
-    if data['local'] == '1' and utils.REGEX_PLEX_DIRECT.findall(url):
-        # In case DNS resolve of plex.direct does not work, append a new
-        # connection that will directly access the local IP (e.g. internet down)
-        conn = deepcopy(pms['connections'][0])
-        # Overwrite plex.direct
-        conn.attrib['uri'] = '%s://%s:%s' % (data['protocol'],
-                                             data['address'],
-                                             data['port'])
-        pms['connections'].insert(1, conn)
-    try:
-        protocol, address, port = url.split(':', 2)
-    except ValueError:
-        # e.g. .ork.plex.services uri, thanks Plex
-        protocol, address = url.split(':', 1)
-        port = data['port']
-        url = '%s:%s' % (url, port)
-    address = address.replace('/', '')
-    xml = DU().downloadUrl('%s/identity' % url,
-                           authenticate=False,
-                           headerOptions={'X-Plex-Token': pms['token']},
-                           verifySSL=False,
-                           timeout=10)
-    try:
-        xml.attrib['machineIdentifier']
-    except (AttributeError, KeyError):
-        # No connection, delete the one we just tested
-        del pms['connections'][0]
-        if pms['connections']:
-            # Still got connections left, try them
-            return _poke_pms(pms, queue)
+def _routes(connections):
+    """
+    Returns the list of pms_routes route dicts for the Connection elements of
+    a plex.tv device
+    """
+    routes = []
+    for connection in connections:
+        data = connection.attrib
+        if data.get('relay') == '1':
+            kind = pms_routes.RELAY
+        elif utils.REGEX_PLEX_DIRECT.findall(data['uri']):
+            kind = pms_routes.PLEX_DIRECT
+        elif data.get('local') == '1':
+            kind = pms_routes.LOCAL
+        else:
+            kind = pms_routes.REMOTE
+        uri = data['uri']
+        if uri.count(':') < 2:
+            # e.g. .ork.plex.services uri without port, thanks Plex
+            uri = '%s:%s' % (uri, data['port'])
+        routes.append(pms_routes.route(uri, kind))
+        if data.get('local') == '1' and kind == pms_routes.PLEX_DIRECT:
+            # In case DNS resolve of plex.direct does not work, also directly
+            # access the local IP (e.g. internet down)
+            routes.append(pms_routes.route('%s://%s:%s' % (data['protocol'],
+                                                           data['address'],
+                                                           data['port']),
+                                           pms_routes.LOCAL))
+    return routes
+
+
+def _split_uri(uri):
+    """
+    Returns the tuple (protocol, address, port) for a route's uri
+    """
+    protocol, address, port = uri.split(':', 2)
+    return protocol, address.replace('/', ''), port
+
+
+def race_routes(machine_identifier, token, routes):
+    """
+    Simultaneously asks all routes for the PMS' /identity. The first route
+    that answers as the PMS machine_identifier wins. Relay routes get their
+    turn only after RELAY_HEAD_START as they're bandwidth-limited.
+
+    Returns the winning route dict or None
+    """
+    from Queue import Queue, Empty
+    if not routes:
         return
-    else:
-        # Connection successful - correct pms?
-        if xml.get('machineIdentifier') == pms['machineIdentifier']:
-            # process later
-            pms['baseURL'] = url
-            pms['scheme'] = protocol
-            pms['ip'] = address
-            pms['port'] = port
-            queue.put(pms)
+    queue = Queue()
+    done = Event()
+
+    def probe(item):
+        if item['kind'] == pms_routes.RELAY and done.wait(RELAY_HEAD_START):
+            queue.put(None)
             return
-    LOG.info('Found a pms at %s, but the expected machineIdentifier of '
-             '%s did not match the one we found: %s',
-             url, pms['uuid'], xml.get('machineIdentifier'))
+        url = item['uri']
+        start = time()
+        xml = DU().downloadUrl('%s/identity' % url,
+                               authenticate=False,
+                               headerOptions={'X-Plex-Token': token},
+                               verifySSL=False,
+                               timeout=RACE_TIMEOUT)
+        try:
+            identifier = xml.attrib['machineIdentifier']
+        except (AttributeError, KeyError):
+            identifier = None
+        if identifier == machine_identifier:
+            pms_routes.success(machine_identifier, item['uri'], time() - start)
+            queue.put(item)
+            return
+        if identifier is not None:
+            LOG.info('Found a pms at %s, but the expected machineIdentifier '
+                     'of %s did not match the one we found: %s',
+                     url, machine_identifier, identifier)
+        pms_routes.failure(machine_identifier, item['uri'])
+        queue.put(None)
+
+    for item in routes:
+        thread = Thread(target=probe,
+                        args=(item, ),
+                        name='PokePMS %s' % item['uri'])
+        thread.daemon = True
+        thread.start()
+    deadline = time() + RACE_TIMEOUT + RELAY_HEAD_START + 1
+    try:
+        for _ in routes:
+            winner = queue.get(timeout=max(0, deadline - time()))
+            if winner is not None:
+                LOG.debug('Connection race for PMS %s won by %s route %s',
+                          machine_identifier, winner['kind'], winner['uri'])
+                return winner
+    except Empty:
+        pass
+    finally:
+        done.set()
+    LOG.debug('No route to PMS %s answered', machine_identifier)
+
+
+def _set_route(pms, winner):
+    protocol, address, port = _split_uri(winner['uri'])
+    pms['baseURL'] = winner['uri']
+    pms['scheme'] = protocol
+    pms['ip'] = address
+    pms['port'] = port
+
+
+def _race_known_routes(machine_identifier, token):
+    """
+    Races the healthy routes we know for the PMS, then the unhealthy ones
+    """
+    routes = pms_routes.get_routes(machine_identifier)
+    healthy = [x for x in routes
+               if x['consecutive_failures'] < pms_routes.MAX_FAILURES]
+    winner = race_routes(machine_identifier, token, healthy)
+    if winner is None and len(healthy) < len(routes):
+        winner = race_routes(machine_identifier,
+                             token,
+                             [x for x in routes if x not in healthy])
+    return winner
+
+
+def _poke_pms(pms, queue):
+    winner = _race_known_routes(pms['machineIdentifier'], pms['token'])
+    if winner is not None:
+        _set_route(pms, winner)
+        queue.put(pms)
+
+
+def pms_from_route_cache(machine_identifier, token):
+    """
+    Reconnects to the PMS machine_identifier using the routes that we
+    remembered from an earlier discovery, without asking GDM or plex.tv.
+    Returns a PMS dict like discover_pms or None
+    """
+    pms = pms_routes.get_pms(machine_identifier)
+    if pms is None:
+        return
+    winner = _race_known_routes(machine_identifier, token)
+    if winner is None:
+        return
+    pms['token'] = token
+    _set_route(pms, winner)
+    LOG.info('Reconnected to PMS %s using the route cache', pms['name'])
+    return pms
 
 
 def GetPlexMetadata(key):
@@ -528,7 +627,7 @@ class DownloadChunk(backgroundthread.Task):
         self.callback = callback
 
     def run(self):
-        xml = DU().downloadUrl(self.url, parameters=self.args)
+        xml = download_page(self.url, self.args)
         try:
             xml.attrib
         except AttributeError:
@@ -538,6 +637,21 @@ class DownloadChunk(backgroundthread.Task):
         self.callback(xml)
 
 
+def download_page(url, args=None):
+    """
+    Downloads a page of a PMS listing while telling concurrency.CONTROLLER
+    how the PMS coped with it. Pages are timed by page_done(), not by the
+    latency of the requests in flight
+    """
+    with CONTROLLER.slot(timed=False) as result:
+        start = time()
+        xml = DU().downloadUrl(url, parameters=args)
+        result['outcome'] = outcome(xml)
+        seconds = time() - start
+    CONTROLLER.page_done(seconds, result['outcome'])
+    return xml
+
+
 class DownloadGen(object):
     """
     Special iterator object that will yield all child xmls piece-wise. It also
@@ -548,8 +662,10 @@ class DownloadGen(object):
     def __init__(self, url, plex_type=None, last_viewed_at=None,
                  updated_at=None, args=None):
         self.args = args or {}
+        # The page size must not change while we iterate
+        self.page_size = CONTROLLER.get_page_size()
         self.args.update({
-            'X-Plex-Container-Size': CONTAINERSIZE,
+            'X-Plex-Container-Size': self.page_size,
             'sort': 'id',  # Entries are sorted by plex_id
             'excludeAllLeaves': 1  # PMS wont attach a first summary child
         })
@@ -568,9 +684,9 @@ class DownloadGen(object):
         self.cache_factor = 10
         # Will keep track whether we still have results incoming
         self.pending_counter = []
-        end = min(self.cache_factor * CONTAINERSIZE,
-                  self.total + CONTAINERSIZE - self.total % CONTAINERSIZE)
-        for pos in range(CONTAINERSIZE, end, CONTAINERSIZE):
+        end = min(self.cache_factor * self.page_size,
+                  self.total + self.page_size - self.total % self.page_size)
+        for pos in range(self.page_size, end, self.page_size):
             self.pending_counter.append(None)
             self._download_chunk(start=pos)
 
@@ -578,7 +694,7 @@ class DownloadGen(object):
         self.args['X-Plex-Container-Start'] = start
         if start == 0:
             # We need the result NOW
-            self.xml = DU().downloadUrl(self.url, parameters=self.args)
+            self.xml = download_page(self.url, self.args)
             try:
                 self.xml.attrib
             except AttributeError:
@@ -588,7 +704,8 @@ class DownloadGen(object):
                                    % self.url)
         else:
             task = DownloadChunk()
-            task.setup(self.url, self.args, self.on_chunk_downloaded)
+            # Copy - we'll change the start for the next chunk right away
+            task.setup(self.url, dict(self.args), self.on_chunk_downloaded)
             backgroundthread.BGThreader.addTask(task)
 
     def on_chunk_downloaded(self, xml):
@@ -609,11 +726,11 @@ class DownloadGen(object):
                 self.current += 1
                 child = self.xml[0]
                 self.xml.remove(child)
-                if (self.current % CONTAINERSIZE == 0 and
-                        self.current <= self.total - (self.cache_factor - 1) * CONTAINERSIZE):
+                if (self.current % self.page_size == 0 and
+                        self.current <= self.total - (self.cache_factor - 1) * self.page_size):
                     self.pending_counter.append(None)
                     self._download_chunk(
-                        start=self.current + (self.cache_factor - 1) * CONTAINERSIZE)
+                        start=self.current + (self.cache_factor - 1) * self.page_size)
                 return child
             app.APP.monitor.waitForAbort(0.1)
             if not len(self.pending_counter) and not len(self.xml):
@@ -655,7 +772,7 @@ class Leaves(DownloadGen):
 
 def DownloadChunks(url):
     """
-    Downloads PMS url in chunks of CONTAINERSIZE.
+    Downloads PMS url in chunks of concurrency.CONTROLLER's page size.
 
     url MUST end with '?' (if no other url encoded args are present) or '&'
 
@@ -663,39 +780,40 @@ def DownloadChunks(url):
     """
     xml = None
     pos = 0
+    page_size = CONTROLLER.get_page_size()
     error_counter = 0
     while error_counter < 10:
         args = {
-            'X-Plex-Container-Size': CONTAINERSIZE,
+            'X-Plex-Container-Size': page_size,
             'X-Plex-Container-Start': pos,
             'sort': 'id'
         }
-        xmlpart = DU().downloadUrl(url + urlencode(args))
+        xmlpart = download_page(url + urlencode(args))
         # If something went wrong - skip in the hope that it works next time
         try:
             xmlpart.attrib
         except AttributeError:
             LOG.error('Error while downloading chunks: %s',
                       url + urlencode(args))
-            pos += CONTAINERSIZE
+            pos += page_size
             error_counter += 1
             continue
 
         # Very first run: starting xml (to retain data in xml's root!)
         if xml is None:
             xml = deepcopy(xmlpart)
-            if len(xmlpart) < CONTAINERSIZE:
+            if len(xmlpart) < page_size:
                 break
             else:
-                pos += CONTAINERSIZE
+                pos += page_size
                 continue
         # Build answer xml - containing the entire library
         for child in xmlpart:
             xml.append(child)
         # Done as soon as we don't receive a full complement of items
-        if len(xmlpart) < CONTAINERSIZE:
+        if len(xmlpart) < page_size:
             break
-        pos += CONTAINERSIZE
+        pos += page_size
     if error_counter == 10:
         LOG.error('Fatal error while downloading chunks for %s', url)
         return None
@@ -767,7 +885,7 @@ def init_plex_playqueue(plex_id, librarySectionUUID, mediatype='movie',
         'repeat': '0'
     }
     if trailers is True:
-        args['extrasPrefixCount'] = utils.settings('trailerNumber')
+        args['extrasPrefixCount'] = utils.cached_setting('trailerNumber')
     xml = DU().downloadUrl(url + '?' + urlencode(args), action_type="POST")
     try:
         xml[0].tag
@@ -9,7 +9,11 @@ from re import sub
 from SocketServer import ThreadingMixIn
 from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 from urlparse import urlparse, parse_qs
-import xbmc
+from threading import Thread, Lock
+import Queue
+import select
+import socket
+import time
 
 from .. import companion
 from .. import json_rpc as js
@@ -24,6 +28,16 @@ LOG = getLogger('PLEX.listener')
 # Hack we need in order to keep track of the open connections from Plex Web
 CLIENT_DICT = {}
 
+# Number of threads answering Companion requests for PooledHTTPServer
+WORKERS = 10
+# How long we keep an idle keep-alive connection open [s]
+KEEP_ALIVE_TIMEOUT = 5
+# How often PooledHTTPServer checks for idle connections to close and
+# whether to answer parked long polls [s]
+POLL_INTERVAL = 0.5
+# How long we wait before answering a long poll with wait=1 [s]
+POLL_WAIT = 0.95
+
 ###############################################################################
 
 RESOURCES_XML = ('%s<MediaContainer>\n'
@@ -47,10 +61,59 @@ class MyHandler(BaseHTTPRequestHandler):
     BaseHTTPRequestHandler implementation of Plex Companion listener
     """
     protocol_version = 'HTTP/1.1'
+    # Send every response in one go instead of one packet per header line -
+    # keep-alive connections would otherwise stall on delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    # PooledHTTPServer: (params, time to check again) of a long poll that we
+    # answer later on, see resume()
+    parked = None
+    # PooledHTTPServer: the long poll has been added to CLIENT_DICT
+    tracked = False
+
+    def setup(self):
+        # Applied to the socket - drops idle keep-alive connections
+        self.timeout = self.server.keep_alive_timeout
+        BaseHTTPRequestHandler.setup(self)
+
+    def handle(self):
+        if not self.server.pooled:
+            BaseHTTPRequestHandler.handle(self)
+            return
+        # PooledHTTPServer waits for the next request of a keep-alive
+        # connection, not our worker thread. Only answer what the client
+        # already sent
+        self.close_connection = 1
+        self.handle_one_request()
+        self._handle_pending()
+
+    def _handle_pending(self):
+        while (not self.close_connection and not self.parked and
+               self._pending()):
+            self.handle_one_request()
 
-    def __init__(self, *args, **kwargs):
-        self.serverlist = []
-        BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
+    def finish(self):
+        # A parked long poll still needs to be answered, see resume()
+        if not self.parked:
+            BaseHTTPRequestHandler.finish(self)
+
+    def resume(self):
+        """
+        PooledHTTPServer: answers the parked long poll once hold_poll() is
+        False, then any requests the client sent in the meantime
+        """
+        params, self.parked = self.parked[0], None
+        try:
+            self.answer_poll(params)
+            self._handle_pending()
+        finally:
+            self.finish()
+
+    def _pending(self):
+        # Python 2's socket._fileobject buffers data it read beyond the
+        # request, e.g. pipelined requests
+        rbuf = getattr(self.rfile, '_rbuf', None)
+        return bool(rbuf is not None and rbuf.tell())
 
     def do_HEAD(self):
         LOG.debug("Serving HEAD request...")
@@ -65,7 +128,8 @@ class MyHandler(BaseHTTPRequestHandler):
         self.send_header('Content-Length', '0')
         self.send_header('X-Plex-Client-Identifier', v.PKC_MACHINE_IDENTIFIER)
         self.send_header('Content-Type', 'text/plain')
-        self.send_header('Connection', 'close')
+        if not self.server.keep_alive_timeout:
+            self.send_header('Connection', 'close')
         self.send_header('Access-Control-Max-Age', '1209600')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods',
@@ -77,7 +141,8 @@ class MyHandler(BaseHTTPRequestHandler):
             'x-plex-device-name, x-plex-platform, x-plex-product, accept, '
             'x-plex-device, x-plex-device-screen-resolution')
         self.end_headers()
-        self.wfile.close()
+        if not self.server.keep_alive_timeout:
+            self.wfile.close()
 
     def sendOK(self):
         self.send_response(200)
@@ -89,15 +154,18 @@ class MyHandler(BaseHTTPRequestHandler):
             for key in headers:
                 self.send_header(key, headers[key])
             self.send_header('Content-Length', len(body))
-            self.send_header('Connection', "close")
+            if not self.server.keep_alive_timeout:
+                self.send_header('Connection', "close")
             self.end_headers()
             self.wfile.write(body)
-            self.wfile.close()
+            if self.server.keep_alive_timeout:
+                self.wfile.flush()
+            else:
+                self.wfile.close()
         except:
-            pass
+            self.close_connection = 1
 
     def answer_request(self, send_data):
-        self.serverlist = self.server.client.getServerList()
         sub_mgr = self.server.subscription_manager
 
         request_path = self.path[1:]
@@ -119,77 +187,26 @@ class MyHandler(BaseHTTPRequestHandler):
         elif request_path == "verify":
             self.response("XBMC JSON connection test:\n" + js.ping())
         elif request_path == 'resources':
-            self.response(
-                RESOURCES_XML.format(
-                    title=v.DEVICENAME,
-                    machineIdentifier=v.PKC_MACHINE_IDENTIFIER),
-                clientinfo.getXArgsDeviceInfo(include_token=False))
+            self.response(self.server.resources_xml,
+                          self.server.device_headers)
         elif request_path == 'player/timeline/poll':
             # Plex web does polling if connected to PKC via Companion
             # Only reply if there is indeed something playing
             # Otherwise, all clients seem to keep connection open
-            if params.get('wait') == '1':
-                app.APP.monitor.waitForAbort(0.95)
-            if self.client_address[0] not in CLIENT_DICT:
-                CLIENT_DICT[self.client_address[0]] = []
-            tracker = CLIENT_DICT[self.client_address[0]]
-            tracker.append(self.client_address[1])
-            while (not app.APP.player.isPlaying() and
-                   not app.APP.monitor.abortRequested() and
-                   sub_mgr.stop_sent_to_web and not
-                   (len(tracker) >= 4 and
-                    tracker[0] == self.client_address[1])):
-                # Keep at most 3 connections open, then drop the first one
-                # Doesn't need to be thread-save
-                # Silly stuff really
+            wait = POLL_WAIT if params.get('wait') == '1' else 0
+            if self.server.pooled:
+                # Don't block one of the few workers while we wait - the
+                # server resumes us
+                self.parked = (params, time.time() + wait)
+                return
+            if wait:
+                app.APP.monitor.waitForAbort(wait)
+            self.track_poll()
+            while self.hold_poll():
                 app.APP.monitor.waitForAbort(1)
-            # Let PKC know that we're releasing this connection
-            tracker.pop(0)
-            msg = sub_mgr.msg(js.get_players()).format(
-                command_id=params.get('commandID', 0))
-            if sub_mgr.isplaying:
-                self.response(
-                    msg,
-                    {
-                        'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
-                        'X-Plex-Protocol': '1.0',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Max-Age': '1209600',
-                        'Access-Control-Expose-Headers':
-                            'X-Plex-Client-Identifier',
-                        'Content-Type': 'text/xml;charset=utf-8'
-                    })
-            elif not sub_mgr.stop_sent_to_web:
-                sub_mgr.stop_sent_to_web = True
-                LOG.debug('Signaling STOP to Plex Web')
-                self.response(
-                    msg,
-                    {
-                        'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
-                        'X-Plex-Protocol': '1.0',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Max-Age': '1209600',
-                        'Access-Control-Expose-Headers':
-                            'X-Plex-Client-Identifier',
-                        'Content-Type': 'text/xml;charset=utf-8'
-                    })
-            else:
-                # Fail connection with HTTP 500 error - has been open too long
-                self.response(
-                    'Need to close this connection on the PKC side',
-                    {
-                        'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
-                        'X-Plex-Protocol': '1.0',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Max-Age': '1209600',
-                        'Access-Control-Expose-Headers':
-                            'X-Plex-Client-Identifier',
-                        'Content-Type': 'text/xml;charset=utf-8'
-                    },
-                    code=500)
+            self.answer_poll(params)
         elif "/subscribe" in request_path:
-            self.response(v.COMPANION_OK_MESSAGE,
-                          clientinfo.getXArgsDeviceInfo(include_token=False))
+            self.response(v.COMPANION_OK_MESSAGE, self.server.device_headers)
             protocol = params.get('protocol')
             host = self.client_address[0]
             port = params.get('port')
@@ -201,24 +218,91 @@ class MyHandler(BaseHTTPRequestHandler):
                                    uuid,
                                    command_id)
         elif "/unsubscribe" in request_path:
-            self.response(v.COMPANION_OK_MESSAGE,
-                          clientinfo.getXArgsDeviceInfo(include_token=False))
+            self.response(v.COMPANION_OK_MESSAGE, self.server.device_headers)
             uuid = self.headers.get('X-Plex-Client-Identifier') \
                 or self.client_address[0]
             sub_mgr.remove_subscriber(uuid)
         else:
             # Throw it to companion.py
             companion.process_command(request_path, params)
-            self.response('', clientinfo.getXArgsDeviceInfo(include_token=False))
+            self.response('', self.server.device_headers)
 
+    def track_poll(self):
+        if self.client_address[0] not in CLIENT_DICT:
+            CLIENT_DICT[self.client_address[0]] = []
+        CLIENT_DICT[self.client_address[0]].append(self.client_address[1])
+        self.tracked = True
 
-class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    def hold_poll(self):
+        """
+        Returns True while we should not answer the long poll yet
+        """
+        tracker = CLIENT_DICT[self.client_address[0]]
+        # Keep at most 3 connections open, then drop the first one
+        # Doesn't need to be thread-save
+        # Silly stuff really
+        return (not app.APP.player.isPlaying() and
+                not app.APP.monitor.abortRequested() and
+                self.server.subscription_manager.stop_sent_to_web and not
+                (len(tracker) >= 4 and
+                 tracker[0] == self.client_address[1]))
+
+    def answer_poll(self, params):
+        sub_mgr = self.server.subscription_manager
+        # Let PKC know that we're releasing this connection
+        CLIENT_DICT[self.client_address[0]].pop(0)
+        msg = sub_mgr.msg(js.get_players()).format(
+            command_id=params.get('commandID', 0))
+        if sub_mgr.isplaying:
+            self.response(
+                msg,
+                {
+                    'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
+                    'X-Plex-Protocol': '1.0',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Max-Age': '1209600',
+                    'Access-Control-Expose-Headers':
+                        'X-Plex-Client-Identifier',
+                    'Content-Type': 'text/xml;charset=utf-8'
+                })
+        elif not sub_mgr.stop_sent_to_web:
+            sub_mgr.stop_sent_to_web = True
+            LOG.debug('Signaling STOP to Plex Web')
+            self.response(
+                msg,
+                {
+                    'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
+                    'X-Plex-Protocol': '1.0',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Max-Age': '1209600',
+                    'Access-Control-Expose-Headers':
+                        'X-Plex-Client-Identifier',
+                    'Content-Type': 'text/xml;charset=utf-8'
+                })
+        else:
+            # Fail connection with HTTP 500 error - has been open too long
+            self.response(
+                'Need to close this connection on the PKC side',
+                {
+                    'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
+                    'X-Plex-Protocol': '1.0',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Max-Age': '1209600',
+                    'Access-Control-Expose-Headers':
+                        'X-Plex-Client-Identifier',
+                    'Content-Type': 'text/xml;charset=utf-8'
+                },
+                code=500)
+
+
+class CompanionServerMixin(object):
     """
-    Using ThreadingMixIn Thread magic
+    Pre-renders the static responses of the Plex Companion listener
     """
-    daemon_threads = True
+    # 0/None: close every connection after one request
+    keep_alive_timeout = None
 
-    def __init__(self, client, subscription_manager, *args, **kwargs):
+    def __init__(self, client, subscription_manager):
         """
         client: Class handle to plexgdm.plexgdm. We can thus ask for an up-to-
         date serverlist without instantiating anything
@@ -227,4 +311,179 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
         """
         self.client = client
         self.subscription_manager = subscription_manager
+        self.device_headers = clientinfo.getXArgsDeviceInfo(
+            include_token=False)
+        self.resources_xml = RESOURCES_XML.format(
+            title=v.DEVICENAME,
+            machineIdentifier=v.PKC_MACHINE_IDENTIFIER)
+
+
+class ThreadedHTTPServer(CompanionServerMixin, ThreadingMixIn, HTTPServer):
+    """
+    Using ThreadingMixIn Thread magic - one new thread per request
+    """
+    daemon_threads = True
+    pooled = False
+
+    def __init__(self, client, subscription_manager, *args, **kwargs):
+        CompanionServerMixin.__init__(self, client, subscription_manager)
+        HTTPServer.__init__(self, *args, **kwargs)
+
+
+class PooledHTTPServer(CompanionServerMixin, HTTPServer):
+    """
+    Answers requests with a fixed number of threads and keeps HTTP/1.1
+    connections alive. Workers only ever answer one request; idle keep-alive
+    connections are watched by a select() loop that hands them back to the
+    workers once the next request arrives. Long polls wait in the select()
+    loop as well, not in a worker. Call start() instead of handle_request()
+    and stop() once done
+    """
+    pooled = True
+    keep_alive_timeout = KEEP_ALIVE_TIMEOUT
+
+    def __init__(self, client, subscription_manager, *args, **kwargs):
+        CompanionServerMixin.__init__(self, client, subscription_manager)
         HTTPServer.__init__(self, *args, **kwargs)
+        self._requests = Queue.Queue()
+        self._threads = []
+        self._select_thread = None
+        self._stopped = False
+        # Idle keep-alive connections; socket: (client_address, idle since)
+        self._idle = {}
+        # Handlers of long polls we answer later on, see MyHandler.resume()
+        self._parked = []
+        self._idle_lock = Lock()
+        # Workers wake up our select() loop with a datagram to this socket
+        # once they handed back a connection
+        self._wakeup = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._wakeup.bind(('127.0.0.1', 0))
+        self._wakeup.setblocking(0)
+
+    def start(self, workers=WORKERS):
+        for i in range(workers):
+            thread = Thread(target=self._work,
+                            name='PKC-Companion-listener-%s' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        self._select_thread = Thread(target=self._select,
+                                     name='PKC-Companion-listener')
+        self._select_thread.daemon = True
+        self._select_thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake()
+        if self._select_thread:
+            self._select_thread.join(2 * POLL_INTERVAL)
+        for _ in self._threads:
+            self._requests.put(None)
+        with self._idle_lock:
+            idle = list(self._idle)
+            idle.extend(x.request for x in self._parked)
+            self._idle.clear()
+            del self._parked[:]
+        for request in idle:
+            self.shutdown_request(request)
+        self._wakeup.close()
+
+    def _wake(self):
+        try:
+            self._wakeup.sendto(b'x', self._wakeup.getsockname())
+        except socket.error:
+            pass
+
+    def _select(self):
+        while not self._stopped:
+            with self._idle_lock:
+                idle = list(self._idle)
+                timeout = min([POLL_INTERVAL] +
+                              [x.parked[1] - time.time()
+                               for x in self._parked])
+            try:
+                readable = select.select([self, self._wakeup] + idle,
+                                         [], [], max(0, timeout))[0]
+            except (select.error, socket.error) as err:
+                LOG.warn('Companion listener select() failed: %s', err)
+                time.sleep(POLL_INTERVAL)
+                continue
+            for sock in readable:
+                if sock is self:
+                    # New connection, ends up in process_request()
+                    self._handle_request_noblock()
+                elif sock is self._wakeup:
+                    try:
+                        while True:
+                            self._wakeup.recv(64)
+                    except socket.error:
+                        pass
+                else:
+                    # Next request of a keep-alive connection - or the
+                    # client closed it
+                    with self._idle_lock:
+                        client_address = self._idle.pop(sock)[0]
+                    self._requests.put((sock, client_address, None))
+            self._check_parked()
+            self._close_idle()
+
+    def _check_parked(self):
+        now = time.time()
+        with self._idle_lock:
+            due = [x for x in self._parked if x.parked[1] <= now]
+        for handler in due:
+            if not handler.tracked:
+                handler.track_poll()
+            if handler.hold_poll():
+                handler.parked = (handler.parked[0], now + POLL_INTERVAL)
+                continue
+            with self._idle_lock:
+                self._parked.remove(handler)
+            self._requests.put((handler.request,
+                                handler.client_address,
+                                handler))
+
+    def _close_idle(self):
+        now = time.time()
+        with self._idle_lock:
+            expired = [x for x, (_, since) in self._idle.iteritems()
+                       if now - since > self.keep_alive_timeout]
+            for request in expired:
+                del self._idle[request]
+        for request in expired:
+            self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        # Called for new connections - hand them to our workers
+        self._requests.put((request, client_address, None))
+
+    def _work(self):
+        while True:
+            job = self._requests.get()
+            if job is None:
+                break
+            # handler: None for the next request, else a parked long poll
+            request, client_address, handler = job
+            try:
+                if handler is None:
+                    handler = self.RequestHandlerClass(request,
+                                                       client_address,
+                                                       self)
+                else:
+                    handler.resume()
+            except Exception:
+                self.handle_error(request, client_address)
+                self.shutdown_request(request)
+                continue
+            if self._stopped:
+                self.shutdown_request(request)
+            elif handler.parked:
+                with self._idle_lock:
+                    self._parked.append(handler)
+                self._wake()
+            elif not handler.close_connection:
+                with self._idle_lock:
+                    self._idle[request] = (client_address, time.time())
+                self._wake()
+            else:
+                self.shutdown_request(request)
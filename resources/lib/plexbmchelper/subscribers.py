@@ -6,7 +6,11 @@ subscribed Plex Companion clients.
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
-from threading import Thread
+from threading import Thread, Lock
+import Queue
+import time
+
+import requests
 
 from ..downloadutils import DownloadUtils as DU
 from .. import utils, timing
@@ -97,6 +101,14 @@ def headers_companion_client():
     }
 
 
+# Number of threads sending timelines to Plex Companion clients
+PUBLISHER_WORKERS = 3
+# Resend an unchanged timeline to a subscriber after that many seconds
+HEARTBEAT = 10
+# (connect, read) timeout for posting a timeline [s]
+TIMEOUT = (3.0, 5.0)
+
+
 def update_player_info(playerid):
     """
     Updates all player info for playerid [int] in state.py.
@@ -125,6 +137,7 @@ class SubscriptionMgr(object):
         # In order to signal a stop to Plex Web ONCE on playback stop
         self.stop_sent_to_web = True
         self.request_mgr = request_mgr
+        self.publisher = TimelinePublisher(self)
 
     def _server_by_host(self, host):
         if len(self.serverlist) == 1:
@@ -469,6 +482,11 @@ class Subscriber(object):
         self.age = 0
         self.sub_mgr = sub_mgr
         self.request_mgr = request_mgr
+        # Keeps the connection to the client alive between timelines
+        self.session = requests.Session()
+        # Last timeline successfully sent and when
+        self.last_msg = None
+        self.last_sent = 0
 
     def __eq__(self, other):
         return self.uuid == other.uuid
@@ -478,28 +496,114 @@ class Subscriber(object):
         Closes the connection to the Plex Companion client
         """
         self.request_mgr.closeConnection(self.protocol, self.host, self.port)
+        self.session.close()
 
     def send_update(self, msg):
         """
-        Sends msg to the Plex Companion client (via .../:/timeline)
+        Queues msg for the Plex Companion client (via .../:/timeline) unless
+        the client already knows it
         """
         self.age += 1
         msg = msg.format(command_id=self.command_id)
+        if (msg == self.last_msg and
+                time.time() - self.last_sent < HEARTBEAT):
+            return
+        self.sub_mgr.publisher.publish(self, msg)
+
+    def post(self, msg):
+        """
+        Posts msg to the Plex Companion client. Returns False if the client
+        should be dropped
+        """
         LOG.debug("sending xml to subscriber uuid=%s,commandID=%i:\n%s",
                   self.uuid, self.command_id, msg)
         url = '%s://%s:%s/:/timeline' % (self.protocol, self.host, self.port)
-        thread = Thread(target=self._threaded_send, args=(url, msg))
-        thread.start()
+        try:
+            # Some clients answer without a Content-Length header and would
+            # stall us until they close the connection - don't read their body
+            response = self.session.post(url,
+                                         data=msg,
+                                         headers=headers_companion_client(),
+                                         timeout=TIMEOUT,
+                                         verify=app.CONN.verify_ssl_cert,
+                                         stream=True)
+        except requests.exceptions.RequestException as err:
+            LOG.warn('Could not send timeline to %s: %s', url, err)
+            return False
+        if ('content-length' in response.headers or
+                response.headers.get('transfer-encoding') == 'chunked'):
+            # Reading the body hands the connection back for reuse
+            response.content
+        else:
+            response.close()
+        if response.status_code == 401:
+            return False
+        self.last_msg = msg
+        self.last_sent = time.time()
+        return True
+
 
-    def _threaded_send(self, url, msg):
+class TimelinePublisher(object):
+    """
+    Sends timelines to the Plex Companion subscribers using a fixed pool of
+    threads. Only the latest timeline for every subscriber is ever queued;
+    older ones that have not been sent yet are dropped
+    """
+    def __init__(self, sub_mgr, workers=PUBLISHER_WORKERS):
+        self.sub_mgr = sub_mgr
+        self._workers = workers
+        self._threads = []
+        # uuid: (subscriber, msg) waiting to be sent
+        self._pending = {}
+        # uuids currently being sent
+        self._sending = set()
+        self._queue = Queue.Queue()
+        self._lock = Lock()
+
+    def publish(self, subscriber, msg):
+        with self._lock:
+            if not self._threads:
+                self._start()
+            queued = subscriber.uuid in self._pending
+            self._pending[subscriber.uuid] = (subscriber, msg)
+            if not queued and subscriber.uuid not in self._sending:
+                self._queue.put(subscriber.uuid)
+
+    def _start(self):
+        for i in range(self._workers):
+            thread = Thread(target=self._work,
+                            name='PKC-Companion-publisher-%s' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
         """
-        Threaded POST request, because they stall due to response missing
-        the Content-Length header :-(
+        Drops all pending timelines and stops the workers
         """
-        response = DU().downloadUrl(url,
-                                    action_type="POST",
-                                    postBody=msg,
-                                    authenticate=False,
-                                    headerOverride=headers_companion_client())
-        if response in (False, None, 401):
-            self.sub_mgr.remove_subscriber(self.uuid)
+        with self._lock:
+            self._pending.clear()
+            for _ in self._threads:
+                self._queue.put(None)
+            self._threads = []
+
+    def _work(self):
+        while True:
+            uuid = self._queue.get()
+            if uuid is None:
+                break
+            with self._lock:
+                try:
+                    subscriber, msg = self._pending.pop(uuid)
+                except KeyError:
+                    # stop() dropped the timeline
+                    continue
+                self._sending.add(uuid)
+            success = subscriber.post(msg)
+            with self._lock:
+                self._sending.discard(uuid)
+                if uuid in self._pending:
+                    # A newer timeline arrived in the meantime
+                    self._queue.put(uuid)
+            if not success:
+                self.sub_mgr.remove_subscriber(uuid)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Passively estimates the time offset Kodi - PMS (see
+timing.KODI_PLEX_TIME_OFFSET) from the Date header of the PMS' answers that
+DownloadUtils receives anyway.
+
+Every answer yields one sample: the PMS' clock showed the Date header's time
+roughly half a round trip after we sent the request. We only trust the
+samples with the quickest round trips and take their median.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from collections import deque
+from email.utils import parsedate_tz, mktime_tz
+from threading import Lock
+
+LOG = getLogger('PLEX.pms_clock')
+
+# Number of samples we keep
+MAX_SAMPLES = 100
+# Number of samples we need for an estimate
+MIN_SAMPLES = 5
+# Fraction of the samples with the quickest round trips we use
+QUICKEST = 0.25
+# The Date header has a resolution of 1s and is truncated
+DATE_RESOLUTION = 1.0
+
+_LOCK = Lock()
+# (round trip time [s], offset [s])
+_SAMPLES = deque(maxlen=MAX_SAMPLES)
+# The PMS our samples are for
+_SERVER = [None]
+
+
+def sample(server, date, sent, round_trip):
+    """
+    Call for an answer of PMS server with the Date header date to a request
+    sent at Unix time sent that took round_trip seconds until the answer's
+    headers arrived
+    """
+    try:
+        pms_time = mktime_tz(parsedate_tz(date))
+    except (TypeError, ValueError, OverflowError):
+        return
+    offset = sent + round_trip / 2 - (pms_time + DATE_RESOLUTION / 2)
+    with _LOCK:
+        if server != _SERVER[0]:
+            # Another PMS, another clock
+            _SAMPLES.clear()
+            _SERVER[0] = server
+        _SAMPLES.append((round_trip, offset))
+
+
+def offset():
+    """
+    Returns the estimated time offset Kodi - PMS [s] or None if we don't have
+    enough samples yet
+    """
+    with _LOCK:
+        samples = sorted(_SAMPLES)
+    if len(samples) < MIN_SAMPLES:
+        return
+    samples = samples[:max(MIN_SAMPLES, int(len(samples) * QUICKEST))]
+    offsets = sorted(x[1] for x in samples)
+    middle = len(offsets) // 2
+    if len(offsets) % 2:
+        estimate = offsets[middle]
+    else:
+        estimate = (offsets[middle - 1] + offsets[middle]) / 2
+    LOG.debug('Estimated time offset Kodi - PMS of %.2fs from %s samples, '
+              'max round trip %.3fs', estimate, len(samples), samples[-1][0])
+    return estimate
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of the routes (connection uris) to every PMS we discovered,
+keyed by the PMS' machineIdentifier, together with the health of every route.
+Lets us reconnect to the PMS we used before by racing its known routes
+instead of running a full discovery using GDM and plex.tv.
+
+A route is one of the following kinds:
+    LOCAL           The PMS' IP in the LAN
+    PLEX_DIRECT     A *.plex.direct uri
+    REMOTE          Any other uri, e.g. the public IP
+    RELAY           The bandwidth-limited Plex relay
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from threading import Lock
+import json
+import time
+
+from . import path_ops, variables as v
+
+LOG = getLogger('PLEX.pms_routes')
+
+LOCAL = 'local'
+PLEX_DIRECT = 'plex.direct'
+REMOTE = 'remote'
+RELAY = 'relay'
+
+# A route that failed this many times in a row is unhealthy. We only try
+# unhealthy routes if all the healthy ones fail
+MAX_FAILURES = 3
+# Attributes of a PMS dict as returned by plex_functions.discover_pms we
+# remember. Mind that we never save the token
+PMS_ATTRIBUTES = ('machineIdentifier', 'name', 'ownername', 'product',
+                  'version', 'device', 'platform', 'local', 'owned', 'relay',
+                  'presence', 'httpsRequired')
+
+_LOCK = Lock()
+# machineIdentifier: {'pms': dict, 'routes': {uri: route dict}}
+_CACHE = None
+
+
+def _path():
+    return path_ops.path.join(v.ADDON_PROFILE, 'pms_routes.json')
+
+
+def _load():
+    # Call with _LOCK held
+    global _CACHE
+    if _CACHE is not None:
+        return _CACHE
+    _CACHE = {}
+    try:
+        with open(path_ops.encode_path(_path()), 'rb') as f:
+            _CACHE = json.loads(f.read())
+    except IOError:
+        pass
+    except ValueError as err:
+        LOG.warn('Discarding corrupt PMS route cache: %s', err)
+    return _CACHE
+
+
+def _save():
+    # Call with _LOCK held
+    try:
+        with open(path_ops.encode_path(_path()), 'wb') as f:
+            f.write(json.dumps(_CACHE))
+    except IOError as err:
+        LOG.warn('Could not save the PMS route cache: %s', err)
+
+
+def route(uri, kind):
+    """
+    Returns a new route dict for uri of kind, e.g. LOCAL
+    """
+    return {
+        'uri': uri,
+        'kind': kind,
+        'successes': 0,
+        'failures': 0,
+        'consecutive_failures': 0,
+        'last_success': 0,
+        'latency': None,
+    }
+
+
+def remember(pms, routes):
+    """
+    Remembers the PMS dict pms and the list of route dicts to reach it,
+    keeping the health of routes we already knew. Forgets routes that are not
+    in routes anymore
+    """
+    with _LOCK:
+        cache = _load()
+        entry = cache.get(pms['machineIdentifier'], {'routes': {}})
+        known = entry['routes']
+        entry['pms'] = dict((x, pms.get(x)) for x in PMS_ATTRIBUTES)
+        entry['routes'] = dict((x['uri'], known.get(x['uri'], x))
+                               for x in routes)
+        cache[pms['machineIdentifier']] = entry
+        _save()
+
+
+def get_pms(machine_identifier):
+    """
+    Returns a copy of the remembered PMS dict (without token) or None
+    """
+    with _LOCK:
+        entry = _load().get(machine_identifier)
+        return dict(entry['pms']) if entry else None
+
+
+def get_routes(machine_identifier):
+    """
+    Returns copies of the routes to the PMS, best first: healthy ones before
+    unhealthy ones, then the most recently successful ones
+    """
+    with _LOCK:
+        entry = _load().get(machine_identifier)
+        if not entry:
+            return []
+        return sorted((dict(x) for x in entry['routes'].values()),
+                      key=lambda x: (x['consecutive_failures'] >= MAX_FAILURES,
+                                     -x['last_success']))
+
+
+def success(machine_identifier, uri, latency):
+    """
+    uri answered as the PMS machine_identifier within latency [s]
+    """
+    with _LOCK:
+        entry = _load().get(machine_identifier)
+        if not entry or uri not in entry['routes']:
+            return
+        item = entry['routes'][uri]
+        item['successes'] += 1
+        item['consecutive_failures'] = 0
+        item['last_success'] = int(time.time())
+        item['latency'] = latency
+        _save()
+
+
+def failure(machine_identifier, uri):
+    """
+    uri did not answer or not as the PMS machine_identifier
+    """
+    with _LOCK:
+        entry = _load().get(machine_identifier)
+        if not entry or uri not in entry['routes']:
+            return
+        item = entry['routes'][uri]
+        item['failures'] += 1
+        item['consecutive_failures'] += 1
+        _save()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache of PMS and plex.tv answers for the endpoints that PKC requests over and
+over again, e.g. /library/sections. Used by DownloadUtils.downloadUrl for
+plain GET requests of the endpoints in POLICIES only.
+
+Answers are fresh for the endpoint's TTL. Afterwards, we revalidate them with
+If-None-Match/If-Modified-Since if the server sent an ETag or Last-Modified
+and re-use them if the server answers 304 Not Modified. Websocket messages
+invalidate what they tell us has changed, see invalidate().
+
+Lives within one Python instance only.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from collections import namedtuple
+from threading import Lock
+from urllib import urlencode
+import re
+import time
+
+from . import utils, app
+
+LOG = getLogger('PLEX.response_cache')
+
+# Invalidation tags
+SECTIONS = 'sections'
+HUBS = 'hubs'
+PLAYLISTS = 'playlists'
+COLLECTIONS = 'collections'
+PLEX_TV = 'plex.tv'
+
+Policy = namedtuple('Policy', 'tag ttl pattern')
+
+# Matched against the url and its sorted, urlencoded parameters
+POLICIES = (
+    Policy(SECTIONS, 60, re.compile(r'^\{server\}/library/sections/?$')),
+    Policy(HUBS, 30, re.compile(r'^\{server\}/hubs/?$')),
+    Policy(PLAYLISTS, 60, re.compile(r'^\{server\}/playlists/?$')),
+    Policy(COLLECTIONS, 300,
+           re.compile(r'^\{server\}/library/sections/\d+/all\?'
+                      r'(.*&)?type=18(&|$)')),
+    Policy(PLEX_TV, 300,
+           re.compile(r'^https://plex\.tv/api/(resources|home/users)/?'
+                      r'(\?includeHttps=1)?$')),
+)
+
+# Max number of cached answers
+MAX_ENTRIES = 100
+
+Entry = namedtuple('Entry', 'tag expires content etag last_modified')
+
+_LOCK = Lock()
+# key: Entry
+_CACHE = {}
+# tag: {'hit': int, 'revalidated': int, 'miss': int}
+STATS = {}
+
+
+def _count(tag, kind):
+    stats = STATS.setdefault(tag, {'hit': 0, 'revalidated': 0, 'miss': 0})
+    stats[kind] += 1
+
+
+def lookup_key(url, parameters, headers, authenticate):
+    """
+    Returns (key, policy) for a GET request or (None, None) if we don't cache
+    answers of url
+    """
+    full_url = url
+    if parameters:
+        full_url = '%s%s%s' % (url, '&' if '?' in url else '?',
+                               urlencode(sorted(parameters.items())))
+    for policy in POLICIES:
+        if policy.pattern.match(full_url):
+            break
+    else:
+        return None, None
+    # Different users, servers and tokens get different answers
+    if authenticate:
+        key = (full_url.replace('{server}', app.CONN.server or ''),
+               app.ACCOUNT.pms_token)
+    else:
+        key = (full_url, (headers or {}).get('X-Plex-Token'))
+    return key, policy
+
+
+def get(key):
+    """
+    Returns (content, validators) for key. content is None if we don't have
+    a fresh answer. validators is a dict with the conditional request headers
+    if we may revalidate a stale answer with the server
+    """
+    with _LOCK:
+        entry = _CACHE.get(key)
+        if entry is None:
+            return None, None
+        if time.time() < entry.expires:
+            _count(entry.tag, 'hit')
+            return entry.content, None
+    validators = {}
+    if entry.etag:
+        validators['If-None-Match'] = entry.etag
+    if entry.last_modified:
+        validators['If-Modified-Since'] = entry.last_modified
+    return None, validators or None
+
+
+def not_modified(key):
+    """
+    Server answered 304 Not Modified. Returns the cached content and keeps it
+    fresh for another TTL
+    """
+    with _LOCK:
+        entry = _CACHE.get(key)
+        if entry is None:
+            return
+        policy = next(x for x in POLICIES if x.tag == entry.tag)
+        _CACHE[key] = entry._replace(expires=time.time() + policy.ttl)
+        _count(entry.tag, 'revalidated')
+        return entry.content
+
+
+def store(key, policy, content, headers):
+    """
+    Caches the raw content of a 200 answer with the response headers
+    """
+    with _LOCK:
+        if len(_CACHE) >= MAX_ENTRIES and key not in _CACHE:
+            # Drop the entry that expires first
+            del _CACHE[min(_CACHE, key=lambda x: _CACHE[x].expires)]
+        _CACHE[key] = Entry(policy.tag,
+                            time.time() + policy.ttl,
+                            content,
+                            headers.get('ETag'),
+                            headers.get('Last-Modified'))
+        _count(policy.tag, 'miss')
+
+
+def invalidate(*tags):
+    """
+    Drops all cached answers with one of the tags, e.g. SECTIONS. Drops
+    everything if no tag is passed
+    """
+    with _LOCK:
+        for key in [x for x in _CACHE
+                    if not tags or _CACHE[x].tag in tags]:
+            del _CACHE[key]
+
+
+def changed(url):
+    """
+    Call before PKC itself changes something on the PMS with a request to url
+    """
+    if '/playlists' in url:
+        invalidate(PLAYLISTS, HUBS)
+    else:
+        invalidate(HUBS)
+
+
+def websocket(message):
+    """
+    Drops the cached answers that a websocket message from the PMS tells us
+    have changed
+    """
+    if message['type'] == 'playing':
+        # On deck and continue watching hubs
+        invalidate(HUBS)
+    elif message['type'] == 'timeline':
+        tags = set([HUBS])
+        for entry in message['TimelineEntry']:
+            typus = utils.cast(int, entry.get('type'))
+            if typus == 15:
+                tags.add(PLAYLISTS)
+            elif typus == 18:
+                tags.add(COLLECTIONS)
+        invalidate(*tags)
+    elif message['type'] == 'activity':
+        for entry in message['ActivityNotification']:
+            if (entry['event'] == 'ended' and
+                    entry['Activity'].get('type', '').startswith('library.') and
+                    entry['Activity'].get('Context') is None):
+                # Entire library or a section was (re-)scanned
+                invalidate(SECTIONS, HUBS, COLLECTIONS)
+                break
+
+
+def log_stats():
+    for tag, stats in STATS.items():
+        LOG.info('Response cache for %s since PKC startup: %s, hit ratio %s%%',
+                 tag, stats,
+                 100 * (stats['hit'] + stats['revalidated']) //
+                 (sum(stats.values()) or 1))
@@ -15,6 +15,9 @@ from . import plex_companion
 from . import plex_functions as PF, playqueue as PQ
 from . import playback_starter
 from . import playqueue
+from . import widget_cache, metadata_cache, sync_bundle, pms_routes
+from . import startup
+from . import ipc
 from . import variables as v
 from . import app
 from . import loghandler
@@ -29,7 +32,7 @@ LOG = logging.getLogger("PLEX.service")
 WINDOW_PROPERTIES = (
     "plex_dbScan", "pms_token", "plex_token", "pms_server",
     "plex_authenticated", "plex_restricteduser", "plex_allows_mediaDeletion",
-    "plex_command", "plex_result")
+    "plex_command", "plex_result", ipc.ADDRESS)
 
 # "Start from beginning", "Play from beginning"
 STRINGS = (utils.try_encode(utils.lang(12021)),
@@ -42,6 +45,8 @@ class Service():
     plexcompanion = None
 
     def __init__(self):
+        # Snapshot of our settings for utils.cached_setting()
+        utils.reload_settings()
         # Initial logging
         LOG.info("======== START %s ========", v.ADDON_NAME)
         LOG.info("Platform: %s", v.PLATFORM)
@@ -67,6 +72,8 @@ class Service():
         # Reset window props
         for prop in WINDOW_PROPERTIES:
             utils.window(prop, clear=True)
+        # Any widget listings cached by a previous PKC instance are stale
+        widget_cache.invalidate()
 
         # To detect Kodi profile switches
         utils.window('plex_kodiProfile',
@@ -101,6 +108,8 @@ class Service():
                     app.CONN.online = False
                     app.APP.suspend_threads = True
                     LOG.warn("Plex Media Server went offline")
+                    pms_routes.failure(app.CONN.machine_identifier,
+                                       app.CONN.server)
                     if utils.settings('show_pms_offline') == 'true':
                         utils.dialog('notification',
                                      utils.lang(33001),
@@ -325,9 +334,68 @@ class Service():
             app.ACCOUNT.set_authenticated()
             return True
 
+    def handle_command(self, plex_command, payload=None, reply=None):
+        """
+        Commands/user interaction received from other PKC Python instances
+        (default.py and context.py instead of service.py), either via our
+        IPC server or via the window property plex_command.
+
+        Pass an ipc.Reply if the requester waits for a result. Returns True
+        if reply will be answered later on, False otherwise
+        """
+        task = None
+        if plex_command.startswith('PLAY-'):
+            # Add-on path playback!
+            task = playback_starter.PlaybackTask(
+                plex_command.replace('PLAY-', ''), reply)
+        elif plex_command.startswith('NAVIGATE-'):
+            task = playback_starter.PlaybackTask(
+                plex_command.replace('NAVIGATE-', ''), reply)
+        elif plex_command.startswith('CONTEXT_menu?'):
+            task = playback_starter.PlaybackTask(
+                'dummy?mode=context_menu&%s'
+                % plex_command.replace('CONTEXT_menu?', ''))
+        elif plex_command == 'choose_pms_server':
+            task = backgroundthread.FunctionAsTask(
+                self.choose_pms_server, None)
+        elif plex_command == 'switch_plex_user':
+            task = backgroundthread.FunctionAsTask(
+                self.switch_plex_user, None)
+        elif plex_command == 'enter_new_pms_address':
+            task = backgroundthread.FunctionAsTask(
+                self.enter_new_pms_address, None)
+        elif plex_command == 'toggle_plex_tv_sign_in':
+            task = backgroundthread.FunctionAsTask(
+                self.toggle_plex_tv, None)
+        elif plex_command == 'repair-scan':
+            app.SYNC.run_lib_scan = 'repair'
+        elif plex_command == 'full-scan':
+            app.SYNC.run_lib_scan = 'full'
+        elif plex_command == 'fanart-scan':
+            app.SYNC.run_lib_scan = 'fanart'
+        elif plex_command == 'textures-scan':
+            app.SYNC.run_lib_scan = 'textures'
+        elif plex_command == 'export-bundle':
+            task = backgroundthread.FunctionAsTask(sync_bundle.export_dialog,
+                                                   None)
+        elif plex_command == 'import-bundle':
+            task = backgroundthread.FunctionAsTask(sync_bundle.import_dialog,
+                                                   None)
+        elif plex_command == 'RESET-PKC':
+            # Blocks while asking the user - don't block the requester
+            task = backgroundthread.FunctionAsTask(utils.reset, None)
+        else:
+            LOG.error('Unknown PKC command received: %s', plex_command)
+        if task:
+            backgroundthread.BGThreader.addTasksToFront([task])
+        return getattr(task, 'reply', None) is not None
+
     def ServiceEntryPoint(self):
         # Important: Threads depending on abortRequest will not trigger
         # if profile switch happens more than once.
+        # Time the startup phases from here on, not from startupDelay
+        startup.SCHEDULER = startup.Scheduler()
+        startup.SCHEDULER.begin(startup.READY)
         # Some plumbing
         app.init()
         app.APP.monitor = kodimonitor.KodiMonitor()
@@ -352,6 +420,17 @@ class Service():
         self.sync = sync.Sync()
         self.plexcompanion = plex_companion.PlexCompanion()
         self.playqueue = playqueue.PlayqueueMonitor()
+        self.widget_cache = widget_cache.WidgetCacheThread()
+        self.focus_prefetch = metadata_cache.FocusPrefetchThread()
+        # Answers requests from default.py right away
+        self.ipc = ipc.IPCServer(self.handle_command)
+        try:
+            self.ipc.listen()
+        except Exception:
+            LOG.exception('Could not start IPC server, using window '
+                          'properties instead')
+        else:
+            self.ipc.start()
 
         # Main PKC program loop
         while not xbmc.abortRequested:
@@ -363,48 +442,12 @@ class Service():
                          v.KODI_PROFILE, utils.window('plex_kodiProfile'))
                 break
 
-            # Check for PKC commands from other Python instances
+            # Check for PKC commands from other Python instances that could
+            # not reach our IPC server
             plex_command = utils.window('plex_command')
             if plex_command:
-                # Commands/user interaction received from other PKC Python
-                # instances (default.py and context.py instead of service.py)
                 utils.window('plex_command', clear=True)
-                task = None
-                if plex_command.startswith('PLAY-'):
-                    # Add-on path playback!
-                    task = playback_starter.PlaybackTask(
-                        plex_command.replace('PLAY-', ''))
-                elif plex_command.startswith('NAVIGATE-'):
-                    task = playback_starter.PlaybackTask(
-                        plex_command.replace('NAVIGATE-', ''))
-                elif plex_command.startswith('CONTEXT_menu?'):
-                    task = playback_starter.PlaybackTask(
-                        'dummy?mode=context_menu&%s'
-                        % plex_command.replace('CONTEXT_menu?', ''))
-                elif plex_command == 'choose_pms_server':
-                    task = backgroundthread.FunctionAsTask(
-                        self.choose_pms_server, None)
-                elif plex_command == 'switch_plex_user':
-                    task = backgroundthread.FunctionAsTask(
-                        self.switch_plex_user, None)
-                elif plex_command == 'enter_new_pms_address':
-                    task = backgroundthread.FunctionAsTask(
-                        self.enter_new_pms_address, None)
-                elif plex_command == 'toggle_plex_tv_sign_in':
-                    task = backgroundthread.FunctionAsTask(
-                        self.toggle_plex_tv, None)
-                elif plex_command == 'repair-scan':
-                    app.SYNC.run_lib_scan = 'repair'
-                elif plex_command == 'full-scan':
-                    app.SYNC.run_lib_scan = 'full'
-                elif plex_command == 'fanart-scan':
-                    app.SYNC.run_lib_scan = 'fanart'
-                elif plex_command == 'textures-scan':
-                    app.SYNC.run_lib_scan = 'textures'
-                elif plex_command == 'RESET-PKC':
-                    utils.reset()
-                if task:
-                    backgroundthread.BGThreader.addTasksToFront([task])
+                self.handle_command(plex_command)
                 continue
 
             if app.APP.suspend:
@@ -451,20 +494,29 @@ class Service():
                     continue
             elif not self.startup_completed:
                 self.startup_completed = True
-                self.ws.start()
-                self.sync.start()
-                self.plexcompanion.start()
-                self.playqueue.start()
-                if utils.settings('enable_alexa') == 'true':
-                    self.alexa.start()
+                startup.SCHEDULER.end(startup.READY)
+                with startup.SCHEDULER.phase(startup.SERVICES):
+                    # Playback-related threads first. The sync thread defers
+                    # its heavy work, see startup
+                    self.plexcompanion.start()
+                    self.playqueue.start()
+                    self.ws.start()
+                    self.sync.start()
+                    self.widget_cache.start()
+                    self.focus_prefetch.start()
+                    if utils.settings('enable_alexa') == 'true':
+                        self.alexa.start()
 
             app.APP.monitor.waitForAbort(0.1)
 
         # EXITING PKC
         # Tell all threads to terminate (e.g. several lib sync threads)
         app.APP.stop_pkc = True
+        self.ipc.stop()
         utils.window('plex_service_started', clear=True)
+        utils.window(widget_cache.GENERATION, clear=True)
         LOG.info("======== STOP %s ========", v.ADDON_NAME)
+        loghandler.stop()
 
 
 def start():
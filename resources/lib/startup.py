@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Staged startup of the PKC service. Work is done in the following phases, most
+important first:
+    READY       Connection to the PMS and authentication - playback works
+    SERVICES    Companion, playqueue monitor, websocket, widget cache
+    DATABASE    Set-up of the Plex DB and of Kodi's DBs
+    SYNC        Library sync on Kodi startup
+    ENRICHMENT  Fanart download and image caching
+
+SYNC and ENRICHMENT are deferred until the user stopped interacting with
+Kodi for a little while - but not forever. ENRICHMENT slows down whenever the
+user interacts with Kodi, see throttle(). Timings of every phase are logged.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from contextlib import contextmanager
+import time
+
+import xbmc
+
+from . import app
+
+LOG = getLogger('PLEX.startup')
+
+READY = 'ready'
+SERVICES = 'services'
+DATABASE = 'database'
+SYNC = 'sync'
+ENRICHMENT = 'enrichment'
+
+# phase: (seconds the user must have been idle, max seconds we defer the
+#         phase once it could start)
+DEFERRAL = {
+    SYNC: (10, 60),
+    ENRICHMENT: (60, 900),
+}
+# Any user input within this many seconds means the user is interacting
+INTERACTION_SECONDS = 10
+# How long ENRICHMENT work pauses between items while the user interacts [s]
+THROTTLE_SECONDS = 0.5
+
+
+def user_idle_seconds():
+    """
+    Seconds since the last user input in Kodi
+    """
+    return xbmc.getGlobalIdleTime()
+
+
+def throttle():
+    """
+    Call between items of background work, e.g. for every image we cache.
+    Slows the work down while the user is interacting with Kodi
+    """
+    if user_idle_seconds() < INTERACTION_SECONDS:
+        app.APP.monitor.waitForAbort(THROTTLE_SECONDS)
+
+
+class Scheduler(object):
+    """
+    Use the module-wide SCHEDULER
+    """
+    def __init__(self):
+        self.started = time.time()
+        # phase: time the phase began
+        self._begin = {}
+        # phase: (seconds the phase took, seconds since PKC startup)
+        self.timings = {}
+        # phase: time since when the phase could start
+        self._waiting = {}
+
+    def begin(self, phase):
+        if phase not in self._begin:
+            self._begin[phase] = time.time()
+            LOG.debug('Startup phase %s begins after %.1fs',
+                      phase, time.time() - self.started)
+
+    def end(self, phase):
+        if phase in self.timings:
+            return
+        self.begin(phase)
+        now = time.time()
+        self.timings[phase] = (now - self._begin[phase], now - self.started)
+        LOG.info('Startup phase %s done in %.1fs, %.1fs after PKC startup',
+                 phase, self.timings[phase][0], self.timings[phase][1])
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Times phase. Mind that exceptions skip logging the phase as done
+        """
+        self.begin(phase)
+        yield
+        self.end(phase)
+
+    def due(self, phase):
+        """
+        Returns True if we should start the deferred phase now: once the user
+        has been idle long enough or we deferred the phase for too long.
+        Call repeatedly until it returns True
+        """
+        idle, max_deferral = DEFERRAL[phase]
+        now = time.time()
+        if phase not in self._waiting:
+            self._waiting[phase] = now
+            LOG.debug('Deferring startup phase %s until the user has been '
+                      'idle for %ss', phase, idle)
+        if (user_idle_seconds() >= idle or
+                now - self._waiting[phase] >= max_deferral):
+            LOG.debug('Starting phase %s after deferring it for %.1fs',
+                      phase, now - self._waiting[phase])
+            return True
+        return False
+
+
+SCHEDULER = Scheduler()
@@ -7,7 +7,8 @@ import xbmc
 from .downloadutils import DownloadUtils as DU
 from . import library_sync, timing
 from . import backgroundthread, utils, path_ops, artwork, variables as v, app
-from . import plex_db, kodi_db
+from . import plex_db, kodi_db, db_indexes
+from . import startup
 
 LOG = getLogger('PLEX.sync')
 
@@ -181,6 +182,8 @@ class Sync(backgroundthread.KillableThread):
         install_sync_done = utils.settings('SyncInstallRunDone') == 'true'
         playlist_monitor = None
         initial_sync_done = False
+        # Fanart download and image caching after the initial sync
+        enrichment_pending = False
         last_websocket_processing = 0
         last_time_sync = 0
         one_day_in_seconds = 60 * 60 * 24
@@ -216,14 +219,16 @@ class Sync(backgroundthread.KillableThread):
                 else:
                     utils.reset(ask_user=False)
                 return
-        # Ensure that Plex DB is set-up
-        plex_db.initialize()
-        # Hack to speed up look-ups for actors (giant table!)
-        utils.create_kodi_db_indicees()
-        kodi_db.setup_kodi_default_entries()
-        with kodi_db.KodiVideoDB() as kodidb:
-            # Setup the paths for addon-paths (even when using direct paths)
-            kodidb.setup_path_table()
+        with startup.SCHEDULER.phase(startup.DATABASE):
+            # Ensure that Plex DB is set-up
+            plex_db.initialize()
+            # Make sure our lookups won't scan entire tables
+            db_indexes.provision()
+            kodi_db.setup_kodi_default_entries()
+            with kodi_db.KodiVideoDB() as kodidb:
+                # Setup the paths for addon-paths (even when using direct
+                # paths)
+                kodidb.setup_path_table()
 
         while not self.isCanceled():
             # In the event the server goes offline
@@ -243,10 +248,12 @@ class Sync(backgroundthread.KillableThread):
                 last_time_sync = timing.unix_timestamp()
                 LOG.info('Initial start-up full sync starting')
                 xbmc.executebuiltin('InhibitIdleShutdown(true)')
+                startup.SCHEDULER.begin(startup.SYNC)
                 # This call will block until scan is completed
                 self.start_library_sync(show_dialog=True, block=True)
                 if self.sync_successful:
                     LOG.info('Initial start-up full sync successful')
+                    startup.SCHEDULER.end(startup.SYNC)
                     utils.settings('SyncInstallRunDone', value='true')
                     install_sync_done = True
                     initial_sync_done = True
@@ -254,8 +261,7 @@ class Sync(backgroundthread.KillableThread):
                     if library_sync.PLAYLIST_SYNC_ENABLED:
                         from . import playlists
                         playlist_monitor = playlists.kodi_playlist_monitor()
-                    self.start_fanart_download(refresh=False)
-                    self.start_image_cache_thread()
+                    enrichment_pending = True
                 else:
                     LOG.error('Initial start-up full sync unsuccessful')
                     app.APP.monitor.waitForAbort(1)
@@ -265,19 +271,24 @@ class Sync(backgroundthread.KillableThread):
             elif not initial_sync_done:
                 # First sync upon PKC restart. Skipped if very first sync upon
                 # PKC installation has been completed
+                if not startup.SCHEDULER.due(startup.SYNC):
+                    # Let the user browse and play first
+                    app.APP.monitor.waitForAbort(0.5)
+                    continue
                 LOG.info('Doing initial sync on Kodi startup')
                 if app.SYNC.suspend_sync:
                     LOG.warning('Forcing startup sync even if Kodi is playing')
                     app.SYNC.suspend_sync = False
+                startup.SCHEDULER.begin(startup.SYNC)
                 self.start_library_sync(block=True)
                 if self.sync_successful:
                     initial_sync_done = True
                     LOG.info('Done initial sync on Kodi startup')
+                    startup.SCHEDULER.end(startup.SYNC)
                     if library_sync.PLAYLIST_SYNC_ENABLED:
                         from . import playlists
                         playlist_monitor = playlists.kodi_playlist_monitor()
-                    self.start_fanart_download(refresh=False)
-                    self.start_image_cache_thread()
+                    enrichment_pending = True
                 else:
                     LOG.info('Startup sync has not yet been successful')
                     app.APP.monitor.waitForAbort(1)
@@ -294,6 +305,13 @@ class Sync(backgroundthread.KillableThread):
                     app.SYNC.run_lib_scan = None
                     continue
 
+                if (enrichment_pending and
+                        startup.SCHEDULER.due(startup.ENRICHMENT)):
+                    enrichment_pending = False
+                    with startup.SCHEDULER.phase(startup.ENRICHMENT):
+                        self.start_fanart_download(refresh=False)
+                        self.start_image_cache_thread()
+
                 # Standard syncs - don't force-show dialogs
                 now = timing.unix_timestamp()
                 if (now - self.last_full_sync > app.SYNC.full_sync_intervall):
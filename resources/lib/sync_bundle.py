@@ -0,0 +1,534 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Export and import of "sync bundles" that provision additional Kodi clients
+of the same PMS without each of them downloading the entire library.
+
+A bundle is a zip file holding a manifest, copies of the Plex DB and of Kodi's
+video and music DBs (minus their version tables) as well as PKC's video nodes
+and playlist files. Every synced item's checksum <plex_id><updatedAt> in the
+Plex DB acts as its watermark: the full sync that runs after the import
+only downloads the items that changed on the PMS since the bundle was
+exported.
+
+Paths are remapped upon import according to the remapSMB* settings of both
+the exporting and the importing client. URLs pointing to the PMS, e.g. for
+artwork, never leave the exporting client with its PMS address and token;
+the importing client fills in its own.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+import json
+import re
+import sqlite3
+import zipfile
+
+import xbmc
+
+from . import utils, path_ops, timing, variables as v, app
+from . import plex_db, pms_routes
+
+LOG = getLogger('PLEX.sync_bundle')
+
+# Bump if the layout of the bundle changes
+BUNDLE_VERSION = 1
+MANIFEST = 'manifest.json'
+# Files within the bundle that are not databases live in here, relative to
+# special://profile
+FILES = 'files/'
+# Tables we never export or import - they belong to the local Kodi
+SKIP_TABLES = ('version', 'versiontagscan')
+# (Kodi DB, table, column) holding file system paths that we need to remap
+PATH_COLUMNS = (
+    ('video', 'path', 'strPath'),
+    ('video', 'movie', 'c22'),
+    ('video', 'episode', 'c18'),
+    ('music', 'path', 'strPath'),
+)
+REMAP_TYPES = ('movie', 'tv', 'music', 'photo')
+# (Kodi DB, table, column) holding URLs to the PMS including our token, e.g.
+# artwork from PlexAPI.one_artwork or indirect music paths
+PMS_URL_COLUMNS = (
+    ('video', 'art', 'url'),
+    ('music', 'art', 'url'),
+    ('music', 'artist', 'strImage'),
+    ('music', 'artist', 'strFanart'),
+    ('music', 'album', 'strImage'),
+    ('music', 'path', 'strPath'),
+    ('music', 'song', 'strFileName'),
+)
+# Placeholders for the PMS address and token within the bundle
+SERVER = '{server}'
+TOKEN = '{token}'
+TOKEN_REGEX = re.compile(r'X-Plex-Token=[\w\-]+')
+PLACEHOLDER_TOKEN_REGEX = re.compile(r'[?&]X-Plex-Token=\{token\}')
+
+
+class BundleError(Exception):
+    """
+    The bundle cannot be exported or imported; message tells why
+    """
+    pass
+
+
+def _db_types():
+    db_types = ['plex', 'video']
+    if app.SYNC.enable_music and path_ops.exists(utils.db_path('music')):
+        db_types.append('music')
+    return db_types
+
+
+def _remap_settings():
+    settings = {'enabled': app.SYNC.remap_path}
+    for typus in REMAP_TYPES:
+        for suffix in ('Org', 'New'):
+            key = 'remapSMB%s%s' % (typus, suffix)
+            settings[key] = getattr(app.SYNC, key)
+    return settings
+
+
+def _tables(conn, schema='main'):
+    return [x[0] for x in conn.execute(
+        "SELECT name FROM %s.sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%%'" % schema)
+        if x[0] not in SKIP_TABLES]
+
+
+def _columns(conn, schema, table):
+    return [x[1] for x in conn.execute('PRAGMA %s.table_info(%s)'
+                                       % (schema, table))]
+
+
+def _suspend_sync():
+    """
+    Suspends all PKC threads and waits for a running sync to finish. Returns
+    False if the sync did not stop in time
+    """
+    app.APP.suspend_threads = True
+    count = 15
+    while app.SYNC.db_scan:
+        LOG.debug("Sync is running, will retry: %s...", count)
+        count -= 1
+        if count == 0:
+            app.APP.suspend_threads = False
+            return False
+        xbmc.sleep(1000)
+    return True
+
+
+def _profile_files():
+    """
+    Yields the absolute paths of PKC's video node and playlist files that
+    live in special://profile
+    """
+    nodes = path_ops.translate_path('special://profile/library/video/')
+    for root, dirs, _ in path_ops.walk(nodes):
+        for directory in (x for x in dirs if x.startswith('Plex-')):
+            for subroot, _, files in path_ops.walk(
+                    path_ops.path.join(root, directory)):
+                for filename in files:
+                    yield path_ops.path.join(subroot, filename)
+        break
+    with plex_db.PlexDB() as plexdb:
+        plexdb.cursor.execute('SELECT kodi_path FROM playlists')
+        playlists = [x[0] for x in plexdb.cursor]
+    for path in playlists:
+        if path and path.startswith(v.KODI_PROFILE) and path_ops.exists(path):
+            yield path
+
+
+def _relative(path):
+    """
+    Returns path relative to special://profile, always with forward slashes
+    """
+    return path_ops.path.relpath(path, v.KODI_PROFILE).replace('\\', '/')
+
+
+def _update_columns(conn, db_type, columns, function):
+    """
+    Applies the SQL function named function to all (Kodi DB, table, column)
+    of columns that belong to db_type and exist in conn's main database
+    """
+    tables = _tables(conn)
+    for _, table, column in (x for x in columns if x[0] == db_type):
+        if table in tables and column in _columns(conn, 'main', table):
+            conn.execute('UPDATE main.%s SET %s = %s(%s)'
+                         % (table, column, function, column))
+
+
+def pms_stripper():
+    """
+    Returns a function that replaces the address of our PMS and any Plex
+    token in a URL with placeholders
+    """
+    servers = set(x['uri'] for x in
+                  pms_routes.get_routes(app.CONN.machine_identifier))
+    if app.CONN.server:
+        servers.add(app.CONN.server)
+    # Longest first in case one address is the prefix of another
+    servers = sorted(servers, key=len, reverse=True)
+
+    def strip_pms(url):
+        if not url:
+            return url
+        url = TOKEN_REGEX.sub('X-Plex-Token=' + TOKEN, url)
+        for server in servers:
+            url = url.replace(server, SERVER)
+        return url
+    return strip_pms
+
+
+def restore_pms(url):
+    """
+    Replaces the placeholders of pms_stripper with the address of our PMS and
+    our token
+    """
+    if not url:
+        return url
+    url = url.replace(SERVER, app.CONN.server)
+    if app.ACCOUNT.pms_token:
+        return url.replace(TOKEN, app.ACCOUNT.pms_token)
+    return PLACEHOLDER_TOKEN_REGEX.sub('', url)
+
+
+def _profile_target(relative):
+    """
+    Returns the absolute path for the path relative to special://profile of
+    a file within the bundle. Raises BundleError unless it's one of PKC's
+    video node or playlist files
+    """
+    parts = relative.split('/')
+    if '\\' in relative or any(x in ('', '.', '..') for x in parts):
+        raise BundleError('Invalid file %s in the bundle' % relative)
+    target = path_ops.path.normpath(path_ops.path.join(v.KODI_PROFILE,
+                                                       *parts))
+    nodes = path_ops.path.join(
+        path_ops.path.normpath(path_ops.translate_path(
+            'special://profile/library/video/')), 'Plex-')
+    playlists = path_ops.path.join(
+        path_ops.path.normpath(v.PLAYLIST_PATH), '')
+    if not (target.startswith(nodes) or target.startswith(playlists)):
+        raise BundleError('File %s of the bundle is neither a video node nor '
+                          'a playlist' % relative)
+    return target
+
+
+def _export_db(db_type, target):
+    """
+    Copies all tables of the PKC or Kodi database db_type into the new
+    database file target, all from the same snapshot
+    """
+    # Autocommit mode - pysqlite would otherwise commit before every CREATE
+    # TABLE and we'd lose our snapshot
+    conn = sqlite3.connect(path_ops.encode_path(target), isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (utils.db_path(db_type), ))
+        conn.execute('BEGIN')
+        for table in _tables(conn, 'src'):
+            conn.execute(conn.execute(
+                "SELECT sql FROM src.sqlite_master WHERE name = ?",
+                (table, )).fetchone()[0])
+            conn.execute('INSERT INTO main.%s SELECT * FROM src.%s'
+                         % (table, table))
+        # Never ship our PMS address and token
+        conn.create_function('pkc_strip_pms', 1, pms_stripper())
+        _update_columns(conn, db_type, PMS_URL_COLUMNS, 'pkc_strip_pms')
+        conn.execute('COMMIT')
+        conn.execute('DETACH DATABASE src')
+    finally:
+        conn.close()
+
+
+def export_bundle(path):
+    """
+    Writes a sync bundle of the current library to the new zip file path.
+    Call with PKC's sync suspended. Returns the manifest
+    """
+    if not app.CONN.machine_identifier:
+        raise BundleError('No PMS set up')
+    if utils.settings('SyncInstallRunDone') != 'true':
+        raise BundleError('The library has not been synced yet')
+    tmp = path_ops.path.join(v.ADDON_PROFILE, 'bundle_export')
+    if path_ops.exists(tmp):
+        path_ops.rmtree(tmp, ignore_errors=True)
+    path_ops.makedirs(tmp)
+    manifest = {
+        'version': BUNDLE_VERSION,
+        'created': timing.unix_timestamp(),
+        'addon_version': v.ADDON_VERSION,
+        'machine_identifier': app.CONN.machine_identifier,
+        'db_created_with_version': utils.settings('dbCreatedWithVersion'),
+        'direct_paths': app.SYNC.direct_paths,
+        'remap': _remap_settings(),
+        'kodi_profile': v.KODI_PROFILE,
+        'dbs': {},
+        'files': []
+    }
+    try:
+        with zipfile.ZipFile(path_ops.encode_path(path), 'w',
+                             zipfile.ZIP_DEFLATED, allowZip64=True) as bundle:
+            for db_type in _db_types():
+                target = path_ops.path.join(tmp, '%s.db' % db_type)
+                _export_db(db_type, target)
+                bundle.write(path_ops.encode_path(target), '%s.db' % db_type)
+                manifest['dbs'][db_type] = path_ops.path.basename(
+                    utils.db_path(db_type))
+            for filename in _profile_files():
+                relative = _relative(filename)
+                bundle.write(path_ops.encode_path(filename), FILES + relative)
+                manifest['files'].append(relative)
+            bundle.writestr(MANIFEST, json.dumps(manifest, indent=2))
+    except Exception:
+        if path_ops.exists(path):
+            path_ops.remove(path)
+        raise
+    finally:
+        path_ops.rmtree(tmp, ignore_errors=True)
+    LOG.info('Exported sync bundle %s with dbs %s and %s files', path,
+             manifest['dbs'].keys(), len(manifest['files']))
+    return manifest
+
+
+def _check(manifest):
+    """
+    Raises BundleError if the bundle cannot be imported on this client
+    """
+    if manifest.get('version') != BUNDLE_VERSION:
+        raise BundleError('Unsupported bundle version %s'
+                          % manifest.get('version'))
+    if manifest['addon_version'] != v.ADDON_VERSION:
+        raise BundleError('Bundle was exported by PKC %s, but this is PKC %s'
+                          % (manifest['addon_version'], v.ADDON_VERSION))
+    if not app.CONN.server:
+        # We need our PMS address to restore the bundle's URLs to the PMS
+        raise BundleError('No PMS set up')
+    if manifest['machine_identifier'] != app.CONN.machine_identifier:
+        raise BundleError('Bundle was exported for another PMS')
+    if manifest['direct_paths'] != app.SYNC.direct_paths:
+        raise BundleError('Bundle was exported with direct paths set to %s'
+                          % manifest['direct_paths'])
+    for db_type, filename in manifest['dbs'].iteritems():
+        if (db_type != 'plex' and
+                filename != path_ops.path.basename(utils.db_path(db_type))):
+            raise BundleError('Bundle was exported with the Kodi DB %s, but '
+                              'this Kodi uses %s'
+                              % (filename,
+                                 path_ops.path.basename(utils.db_path(db_type))))
+
+
+def remapper(remap):
+    """
+    Returns a function that translates a path as stored by the exporting
+    client (with its remapSMB* settings remap) into the path that this client
+    would have stored
+    """
+    pairs = []
+    for typus in REMAP_TYPES:
+        # The path as Plex knows it
+        plex_path = (remap['remapSMB%sOrg' % typus] if remap['enabled']
+                     else getattr(app.SYNC, 'remapSMB%sOrg' % typus))
+        source = (remap['remapSMB%sNew' % typus] if remap['enabled']
+                  else plex_path)
+        target = (getattr(app.SYNC, 'remapSMB%sNew' % typus)
+                  if app.SYNC.remap_path else plex_path)
+        if source and source != target:
+            pairs.append((source, target))
+    # Most specific prefixes first
+    pairs.sort(key=lambda x: len(x[0]), reverse=True)
+
+    def remap_path(path):
+        if not path:
+            return path
+        for source, target in pairs:
+            if path.startswith(source):
+                path = path[len(source):]
+                if app.SYNC.remap_path:
+                    # Same as PlexAPI.validate_playurl
+                    path = path.replace('\\', '/')
+                return target + path
+        return path
+    remap_path.pairs = pairs
+    return remap_path
+
+
+def _import_db(db_type, source, remap_path=None):
+    """
+    Replaces the content of all tables of database db_type with the ones of
+    the database file source. Only copies the columns that both know
+    """
+    conn = sqlite3.connect(utils.db_path(db_type), timeout=30.0,
+                           isolation_level=None)
+    try:
+        conn.execute('ATTACH DATABASE ? AS bundle',
+                     (path_ops.encode_path(source), ))
+        conn.execute('BEGIN')
+        tables = set(_tables(conn, 'bundle'))
+        # Empty all tables before filling any. Kodi's delete triggers would
+        # otherwise remove e.g. the genre_link rows we already imported
+        # when we empty the movie table
+        for table in _tables(conn):
+            conn.execute('DELETE FROM main.%s' % table)
+        for table in _tables(conn):
+            if table not in tables:
+                continue
+            columns = set(_columns(conn, 'bundle', table))
+            columns = ', '.join(x for x in _columns(conn, 'main', table)
+                                if x in columns)
+            conn.execute('INSERT INTO main.%s (%s) SELECT %s FROM bundle.%s'
+                         % (table, columns, columns, table))
+        conn.create_function('pkc_restore_pms', 1, restore_pms)
+        _update_columns(conn, db_type, PMS_URL_COLUMNS, 'pkc_restore_pms')
+        if remap_path and remap_path.pairs:
+            conn.create_function('pkc_remap', 1, remap_path)
+            _update_columns(conn, db_type, PATH_COLUMNS, 'pkc_remap')
+        conn.execute('COMMIT')
+        conn.execute('DETACH DATABASE bundle')
+    finally:
+        conn.close()
+
+
+def import_bundle(path):
+    """
+    Replaces the synced library of this client with the one of the sync
+    bundle path. Call with PKC's sync suspended and restart Kodi afterwards.
+    Returns the manifest
+    """
+    with zipfile.ZipFile(path_ops.encode_path(path), 'r') as bundle:
+        try:
+            manifest = json.loads(bundle.read(MANIFEST))
+        except (KeyError, ValueError):
+            raise BundleError('Not a PKC sync bundle')
+        _check(manifest)
+        remap_path = remapper(manifest['remap'])
+        # Check the files before touching our library
+        names = set(bundle.namelist())
+        files = []
+        for relative in manifest['files']:
+            if FILES + relative not in names:
+                raise BundleError('File %s is missing in the bundle'
+                                  % relative)
+            files.append((relative, _profile_target(relative)))
+        LOG.info('Importing sync bundle %s created %s, remapping %s', path,
+                 manifest['created'], remap_path.pairs)
+        tmp = path_ops.path.join(v.ADDON_PROFILE, 'bundle_import')
+        if path_ops.exists(tmp):
+            path_ops.rmtree(tmp, ignore_errors=True)
+        path_ops.makedirs(tmp)
+        try:
+            _replace_library(bundle, manifest, files, tmp, remap_path)
+        except Exception:
+            LOG.error('Import failed, wiping the partially imported library')
+            utils.wipe_database()
+            raise
+        finally:
+            path_ops.rmtree(tmp, ignore_errors=True)
+    utils.settings('SyncInstallRunDone', value='true')
+    utils.settings('dbCreatedWithVersion',
+                   value=manifest['db_created_with_version'])
+    LOG.info('Imported sync bundle %s', path)
+    return manifest
+
+
+def _replace_library(bundle, manifest, files, tmp, remap_path):
+    """
+    Swaps the DBs, node and playlist files of our library for the ones of the
+    bundle. files: list of (path within the bundle, checked target path)
+    """
+    # Remove the files of the library that we replace
+    with plex_db.PlexDB() as plexdb:
+        plexdb.cursor.execute('SELECT kodi_path FROM playlists')
+        playlists = [x[0] for x in plexdb.cursor]
+    for playlist in playlists:
+        if path_ops.exists(playlist):
+            path_ops.remove(playlist)
+    utils.delete_nodes()
+    plex_db.initialize()
+    for db_type in ('plex', 'video', 'music'):
+        if db_type not in manifest['dbs']:
+            continue
+        if db_type == 'music' and not (
+                app.SYNC.enable_music and
+                path_ops.exists(utils.db_path('music'))):
+            LOG.info('Music sync disabled, skipping the music db')
+            continue
+        bundle.extract('%s.db' % db_type, path_ops.encode_path(tmp))
+        _import_db(db_type,
+                   path_ops.path.join(tmp, '%s.db' % db_type),
+                   remap_path if db_type != 'plex' else None)
+    for relative, target in files:
+        if not path_ops.exists(path_ops.path.dirname(target)):
+            path_ops.makedirs(path_ops.path.dirname(target))
+        with open(path_ops.encode_path(target), 'wb') as f:
+            f.write(bundle.read(FILES + relative))
+    # Playlists are referenced with their absolute path
+    old_profile = manifest['kodi_profile']
+    with plex_db.PlexDB() as plexdb:
+        plexdb.cursor.execute('SELECT plex_id, kodi_path FROM playlists')
+        for plex_id, kodi_path in plexdb.cursor.fetchall():
+            if not kodi_path:
+                continue
+            if not kodi_path.startswith(old_profile):
+                raise BundleError('Playlist %s of the bundle is not within '
+                                  'the Kodi profile' % kodi_path)
+            relative = kodi_path[len(old_profile):].replace('\\', '/')
+            plexdb.cursor.execute(
+                'UPDATE playlists SET kodi_path = ? WHERE plex_id = ?',
+                (_profile_target(relative.strip('/')), plex_id))
+
+
+def export_dialog():
+    """
+    User wants to export a sync bundle from the PKC settings
+    """
+    # Choose a folder for the sync bundle
+    folder = utils.dialog('browse', 3, utils.lang(39724), 'files')
+    if not folder:
+        return
+    path = path_ops.path.join(
+        path_ops.translate_path(folder),
+        'pkc_sync_bundle_%s.zip' % timing.unix_timestamp())
+    if not _suspend_sync():
+        # Could not stop the database from running. Please try again later.
+        utils.messageDialog(utils.lang(29999), utils.lang(39601))
+        return
+    try:
+        export_bundle(path)
+    except (BundleError, IOError, OSError, sqlite3.Error) as err:
+        LOG.error('Could not export the sync bundle: %s', err)
+        utils.messageDialog(utils.lang(29999), utils.lang(39726))
+    else:
+        # Sync bundle exported to
+        utils.messageDialog(utils.lang(29999),
+                            '%s %s' % (utils.lang(39725), path))
+    finally:
+        app.APP.suspend_threads = False
+
+
+def import_dialog():
+    """
+    User wants to import a sync bundle from the PKC settings
+    """
+    # Choose the sync bundle to import
+    path = utils.dialog('browse', 1, utils.lang(39728), 'files', '.zip')
+    if not path:
+        return
+    path = path_ops.translate_path(path)
+    # Importing the sync bundle replaces your entire library. Kodi will
+    # restart afterwards. Continue?
+    if not utils.yesno_dialog(utils.lang(29999), utils.lang(39730)):
+        LOG.info('User aborted importing the sync bundle')
+        return
+    if not _suspend_sync():
+        utils.messageDialog(utils.lang(29999), utils.lang(39601))
+        return
+    try:
+        import_bundle(path)
+    except (BundleError, zipfile.BadZipfile, IOError, OSError,
+            sqlite3.Error) as err:
+        LOG.error('Could not import the sync bundle: %s', err)
+        # Could not import the sync bundle
+        utils.messageDialog(utils.lang(29999), '%s: %s'
+                            % (utils.lang(39727), err))
+        app.APP.suspend_threads = False
+        return
+    utils.reboot_kodi()
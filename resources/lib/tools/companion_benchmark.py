@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Load benchmark for the Plex Companion listener: several Plex apps long-polling
+/player/timeline/poll at the same time, like phones do while something is
+playing. Compares the pooled keep-alive listener with the thread-per-request
+one. Runs outside of Kodi using stub xbmc modules.
+
+Pass --idle for Plex apps controlling an idle Kodi instead: PKC holds their
+long polls, each app keeps IDLE_POLLS of them open, and we measure how
+quickly other requests are answered meanwhile.
+
+Usage, from the add-on's root directory:
+    python -m resources.lib.tools.companion_benchmark [-c CLIENTS]
+        [-n REQUESTS] [--idle] [mode ...]
+"""
+from __future__ import absolute_import, division, unicode_literals
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import requests
+
+from .startup_benchmark import write_stubs
+
+MODES = ('pooled', 'threaded')
+# Long polls an idle Plex app keeps open
+IDLE_POLLS = 3
+# Requests that take longer than this failed [s]
+TIMEOUT = 30
+
+TIMELINE = ('<MediaContainer commandID="{command_id}" location="navigation">'
+            '<Timeline type="video" state="playing" time="1000"/>'
+            '</MediaContainer>')
+
+
+class FakeSubscriptionManager(object):
+    """
+    Pretends that Kodi is playing something so every poll is answered - or
+    that Kodi is idle and PKC signaled STOP long ago
+    """
+    def __init__(self, playing=True):
+        self.isplaying = playing
+        self.stop_sent_to_web = not playing
+
+    def update_command_id(self, uuid, command_id):
+        pass
+
+    def msg(self, players):
+        return TIMELINE
+
+
+class FakePlayer(object):
+    def __init__(self, playing=True):
+        self.playing = playing
+
+    def isPlaying(self):
+        return self.playing
+
+
+class FakeMonitor(object):
+    """
+    Holds long polls (wait=1) for hold seconds instead of PKC's 0.95s
+    """
+    def __init__(self, hold):
+        self.hold = hold
+
+    def waitForAbort(self, timeout=0):
+        time.sleep(self.hold)
+        return False
+
+    def abortRequested(self):
+        return False
+
+
+def _client(port, requests_per_client, keep_alive, latencies,
+            path='player/timeline/poll'):
+    session = requests.Session() if keep_alive else requests
+    url = 'http://127.0.0.1:%s/%s' % (port, path)
+    for command_id in range(requests_per_client):
+        start = timeit.default_timer()
+        response = session.get(url,
+                               params={'wait': 1, 'commandID': command_id},
+                               headers={'X-Plex-Client-Identifier': 'bench'},
+                               timeout=TIMEOUT)
+        response.raise_for_status()
+        latencies.append(timeit.default_timer() - start)
+
+
+def _idle_poll(port, keep_alive, stop):
+    """
+    Long-polls until stop is set. PKC answers once the app has too many polls
+    open
+    """
+    session = requests.Session() if keep_alive else requests
+    url = 'http://127.0.0.1:%s/player/timeline/poll' % port
+    while not stop.is_set():
+        try:
+            session.get(url,
+                        params={'wait': 1, 'commandID': 0},
+                        headers={'X-Plex-Client-Identifier': 'bench'},
+                        timeout=TIMEOUT)
+        except requests.RequestException:
+            return
+
+
+def run(listener, mode, clients, requests_per_client, idle=False):
+    class QuietHandler(listener.MyHandler):
+        def log_message(self, *args):
+            pass
+    server_class = (listener.PooledHTTPServer if mode == 'pooled'
+                    else listener.ThreadedHTTPServer)
+    httpd = server_class(None,
+                         FakeSubscriptionManager(not idle),
+                         ('127.0.0.1', 0),
+                         QuietHandler)
+    if httpd.pooled:
+        httpd.start()
+    else:
+        # What plex_companion does for the thread-per-request listener
+        serve = threading.Thread(target=httpd.serve_forever)
+        serve.daemon = True
+        serve.start()
+    port = httpd.server_address[1]
+    latencies = []
+    stop = threading.Event()
+    pollers = []
+    if idle:
+        for _ in range(clients * IDLE_POLLS):
+            thread = threading.Thread(target=_idle_poll,
+                                      args=(port, httpd.pooled, stop))
+            thread.daemon = True
+            thread.start()
+            pollers.append(thread)
+        # Let the listener take all the polls
+        time.sleep(2)
+        # One more Plex app sending commands
+        threads = [threading.Thread(target=_client,
+                                    args=(port,
+                                          requests_per_client,
+                                          httpd.pooled,
+                                          latencies,
+                                          'resources'))]
+    else:
+        threads = [threading.Thread(target=_client,
+                                    args=(port,
+                                          requests_per_client,
+                                          httpd.pooled,
+                                          latencies))
+                   for _ in range(clients)]
+    max_threads = threading.active_count()
+    start = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        max_threads = max(max_threads, threading.active_count())
+        threads[0].join(0.01)
+    duration = timeit.default_timer() - start
+    if pollers:
+        # Let PKC answer all the long polls
+        stop.set()
+        listener.app.APP.player.playing = True
+        for thread in pollers:
+            thread.join(TIMEOUT)
+        listener.app.APP.player.playing = False
+    if httpd.pooled:
+        httpd.stop()
+    else:
+        httpd.shutdown()
+    httpd.server_close()
+    latencies.sort()
+    if not latencies:
+        raise RuntimeError('No request was answered within %ss' % TIMEOUT)
+    return (len(latencies) / duration,
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000,
+            max_threads - len(threads) -
+            (clients * IDLE_POLLS if idle else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-c', '--clients', type=int, default=8,
+                        help='concurrently polling Plex apps (default: 8)')
+    parser.add_argument('-n', '--requests', type=int, default=200,
+                        help='polls per Plex app (default: 200)')
+    parser.add_argument('--hold', type=float, default=0.05,
+                        help='seconds a long poll is held (default: 0.05)')
+    parser.add_argument('--idle', action='store_true',
+                        help='Kodi is idle: long polls are held')
+    parser.add_argument('modes', nargs='*', default=MODES,
+                        help='listener modes to measure (default: all)')
+    args = parser.parse_args()
+    root = os.getcwd()
+    stub_dir = tempfile.mkdtemp(prefix='pkc_benchmark_')
+    try:
+        write_stubs(stub_dir, root)
+        sys.path.insert(0, stub_dir)
+        from .. import app
+        app.init()
+        app.APP.player = FakePlayer(not args.idle)
+        app.APP.monitor = FakeMonitor(args.hold)
+        from ..plexbmchelper import listener
+        # The pooled listener waits on its own, not with waitForAbort()
+        listener.POLL_WAIT = args.hold
+        print('%-10s %10s %10s %10s %14s' % ('mode', 'req/s', 'p50 ms',
+                                             'p95 ms', 'server threads'))
+        for mode in args.modes:
+            print('%-10s %10.0f %10.1f %10.1f %14d'
+                  % ((mode, ) + run(listener,
+                                    mode,
+                                    args.clients,
+                                    args.requests,
+                                    args.idle)))
+    finally:
+        shutil.rmtree(stub_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Checks that concurrency.CONTROLLER cannot deadlock: many sync tasks at once
+that each download an item within a slot and then its children page by page
+(download_page) while still holding the slot - like GetMetadataThread did.
+Exits with an error if any task is still waiting for a slot after the
+timeout. Runs outside of Kodi using stub xbmc modules.
+
+Usage, from the add-on's root directory:
+    python -m resources.lib.tools.concurrency_check [-t TASKS] [-p PAGES]
+"""
+from __future__ import absolute_import, division, unicode_literals
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from .startup_benchmark import write_stubs
+
+# Seconds every single fake request takes
+REQUEST_SECONDS = 0.01
+
+
+def _task(controller, pages):
+    def children():
+        for _ in range(pages):
+            with controller.slot(timed=False):
+                time.sleep(REQUEST_SECONDS)
+        return 'children'
+    with controller.slot():
+        time.sleep(REQUEST_SECONDS)
+    controller.download(children)
+
+
+def run(controller, tasks, pages, timeout):
+    """
+    Returns the number of tasks that did not finish within timeout [s]
+    """
+    threads = [threading.Thread(target=_task, args=(controller, pages))
+               for _ in range(tasks)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    deadline = time.time() + timeout
+    for thread in threads:
+        thread.join(max(0, deadline - time.time()))
+    return len([x for x in threads if x.is_alive()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-t', '--tasks', type=int, default=10,
+                        help='concurrent sync tasks (default: 10)')
+    parser.add_argument('-p', '--pages', type=int, default=3,
+                        help='pages of children per task (default: 3)')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='seconds until we call it a deadlock '
+                             '(default: 10)')
+    args = parser.parse_args()
+    root = os.getcwd()
+    stub_dir = tempfile.mkdtemp(prefix='pkc_concurrency_check_')
+    try:
+        write_stubs(stub_dir, root)
+        sys.path.insert(0, stub_dir)
+        from .. import app
+        app.init()
+        from ..concurrency import Controller
+        controller = Controller()
+        hanging = run(controller, args.tasks, args.pages, args.timeout)
+        print('%s of %s tasks hanging, %s requests in flight, limit %s'
+              % (hanging, args.tasks, controller.in_flight,
+                 int(controller.limit)))
+    finally:
+        shutil.rmtree(stub_dir, ignore_errors=True)
+    if hanging:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Checks the query plans of all lookups that PKC declares an index for against
+copies of Kodi's and PKC's databases and reports which ones still scan entire
+tables. Pass --create to let PKC's index provisioning run on the copies first.
+Runs outside of Kodi using stub xbmc modules.
+
+Usage, from the add-on's root directory:
+    python -m resources.lib.tools.index_check [--create] [--video DB]
+        [--music DB] [--texture DB] [--plex DB]
+"""
+from __future__ import absolute_import, division, unicode_literals
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+from .startup_benchmark import write_stubs
+
+DB_TYPES = ('video', 'music', 'texture', 'plex')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--create', action='store_true',
+                        help='create missing indexes (modifies the DBs!)')
+    for db_type in DB_TYPES:
+        parser.add_argument('--%s' % db_type, metavar='DB',
+                            help='path to the %s database' % db_type)
+    args = parser.parse_args()
+    root = os.getcwd()
+    stub_dir = tempfile.mkdtemp(prefix='pkc_index_check_')
+    try:
+        write_stubs(stub_dir, root)
+        sys.path.insert(0, stub_dir)
+        from .. import db_indexes
+        result = []
+        for db_type in DB_TYPES:
+            path = getattr(args, db_type)
+            if not path:
+                continue
+            conn = sqlite3.connect(path)
+            result.extend(db_indexes.check(
+                conn.cursor(),
+                [x for x in db_indexes.INDEXES if x.db == db_type],
+                create=args.create))
+            conn.commit()
+            conn.close()
+        for index, status, plan in result:
+            print('%-8s %-8s %-40s %s' % (index.db,
+                                          status,
+                                          db_indexes.index_name(index),
+                                          plan))
+    finally:
+        shutil.rmtree(stub_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the cold import cost of default.py for the different plugin modes,
+i.e. what every click on a PKC item or every widget refresh costs before PKC
+even starts working. Runs outside of Kodi using stub xbmc modules.
+
+Usage, from the add-on's root directory:
+    python -m resources.lib.tools.startup_benchmark [-n RUNS] [mode ...]
+"""
+from __future__ import absolute_import, division, unicode_literals
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# The modules default.py imports lazily for each mode (on top of its own
+# module-level imports)
+MODES = {
+    'play': ('resources.lib.pkc_listitem', ),
+    'settings': (),
+    'nextup': ('resources.lib.entrypoint', ),
+    'ondeck': ('resources.lib.entrypoint', 'resources.lib.plex_api'),
+    'browseplex': ('resources.lib.entrypoint',
+                   'resources.lib.downloadutils',
+                   'resources.lib.plex_functions',
+                   'resources.lib.plex_api'),
+    'hub': ('resources.lib.entrypoint',
+            'resources.lib.plex_functions',
+            'resources.lib.plex_api'),
+}
+
+STUBS = {
+    'xbmc': '''
+LOGDEBUG, LOGINFO, LOGNOTICE, LOGWARNING, LOGERROR, LOGFATAL = range(6)
+ISO_639_1 = 0
+abortRequested = False
+def translatePath(path):
+    return path.replace('special://', %(profile)r)
+def getInfoLabel(label):
+    return '18.5' if label == 'System.BuildVersion' else ''
+def getLanguage(*args): return 'en'
+def getCondVisibility(condition): return False
+def log(msg, level=0): pass
+def sleep(millis): pass
+def executebuiltin(*args): pass
+def executeJSONRPC(query): return '{"result": {}}'
+def getSkinDir(): return 'skin.estuary'
+class Monitor(object):
+    def abortRequested(self): return False
+    def waitForAbort(self, timeout=0): return False
+class Player(object): pass
+class PlayList(object):
+    def __init__(self, *args): pass
+PLAYLIST_MUSIC, PLAYLIST_VIDEO = 0, 1
+''',
+    'xbmcaddon': '''
+SETTINGS = %(settings)r
+class Addon(object):
+    def __init__(self, id=None): pass
+    def getAddonInfo(self, key):
+        return {'version': '0', 'path': %(root)r,
+                'profile': 'special://profile/'}.get(key, '')
+    def getSetting(self, key): return SETTINGS.get(key, '')
+    def setSetting(self, key, value): SETTINGS[key] = value
+    def getLocalizedString(self, string_id): return ''
+''',
+    'xbmcgui': '''
+class Window(object):
+    def __init__(self, *args): self.properties = {}
+    def getProperty(self, key): return self.properties.get(key, '')
+    def setProperty(self, key, value): self.properties[key] = value
+    def clearProperty(self, key): self.properties.pop(key, None)
+class _Stub(object):
+    def __init__(self, *args, **kwargs): pass
+    def __getattr__(self, name): return lambda *args, **kwargs: None
+ListItem = Dialog = DialogProgress = DialogProgressBG = ControlImage = _Stub
+WindowXML = WindowXMLDialog = _Stub
+def getCurrentWindowId(): return 10000
+def getCurrentWindowDialogId(): return 9999
+ACTION_NAV_BACK, ACTION_PREVIOUS_MENU = 92, 10
+''',
+    'xbmcplugin': '''
+def _noop(*args, **kwargs): pass
+addDirectoryItem = endOfDirectory = setContent = setResolvedUrl = _noop
+addSortMethod = setPluginCategory = _noop
+''',
+    'xbmcvfs': '''
+import os
+exists = os.path.exists
+def mkdirs(path): os.makedirs(path); return True
+''',
+}
+
+# Runs within a fresh Python interpreter for every measurement
+SNIPPET = '''
+import json, sys, timeit
+sys.argv = ['plugin://plugin.video.plexkodiconnect/', '1', '?mode=%s']
+start = timeit.default_timer()
+import default
+for module in %r:
+    __import__(module)
+print(json.dumps([timeit.default_timer() - start, len(sys.modules)]))
+'''
+
+
+def default_settings(root):
+    """
+    Returns a dict with all the default PKC settings
+    """
+    with open(os.path.join(root, 'resources', 'settings.xml'), 'rb') as f:
+        xml = f.read().decode('utf-8')
+    settings = {}
+    for tag in re.findall(r'<setting [^>]*>', xml):
+        setting_id = re.search(r'\sid="([^"]*)"', tag)
+        default = re.search(r'\sdefault="([^"]*)"', tag)
+        if setting_id:
+            settings[setting_id.group(1)] = default.group(1) if default else ''
+    return settings
+
+
+def write_stubs(stub_dir, root):
+    values = {
+        'profile': os.path.join(stub_dir, 'kodi', ''),
+        'root': root,
+        'settings': default_settings(root)
+    }
+    for name, source in STUBS.items():
+        with open(os.path.join(stub_dir, '%s.py' % name), 'wb') as f:
+            f.write((source % values).encode('utf-8'))
+
+
+def measure(mode, root, stub_dir):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join((stub_dir, root))
+    output = subprocess.check_output(
+        [sys.executable, '-c', SNIPPET % (mode, MODES[mode])],
+        cwd=root,
+        env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--runs', type=int, default=5,
+                        help='cold starts per mode (default: 5)')
+    parser.add_argument('modes', nargs='*', default=sorted(MODES),
+                        help='plugin modes to measure (default: all)')
+    args = parser.parse_args()
+    root = os.getcwd()
+    stub_dir = tempfile.mkdtemp(prefix='pkc_benchmark_')
+    try:
+        write_stubs(stub_dir, root)
+        print('%-12s %10s %10s %8s' % ('mode', 'median ms', 'max ms',
+                                       'modules'))
+        for mode in args.modes:
+            results = sorted(measure(mode, root, stub_dir)
+                             for _ in range(args.runs))
+            timings = [result[0] * 1000 for result in results]
+            print('%-12s %10.1f %10.1f %8d' % (mode,
+                                               timings[len(timings) // 2],
+                                               timings[-1],
+                                               results[-1][1]))
+    finally:
+        shutil.rmtree(stub_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
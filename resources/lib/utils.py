@@ -34,6 +34,11 @@ ADDON = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
 # If several threads access  the settings.xml file concurrently, it gets
 # corrupted
 SETTINGS_LOCK = Lock()
+# Snapshot {setting id: unicode value} of all PKC settings, see
+# cached_setting(). Never altered, only replaced as a whole
+_SNAPSHOT = None
+# Ids of all PKC settings, read once from resources/settings.xml
+_SETTING_IDS = None
 
 # Grab Plex id from '...plex_id=XXXX....'
 REGEX_PLEX_ID = re.compile(r'''plex_id=(\d+)''')
@@ -106,9 +111,20 @@ def window(prop, value=None, clear=False, windowid=10000):
 
 def plex_command(value):
     """
-    Used to funnel states between different Python instances. NOT really thread
-    safe - let's hope the Kodi user can't click fast enough
+    Used to funnel commands to the PKC service from different Python
+    instances. Blocks until the service accepted the command
     """
+    from . import ipc
+    try:
+        ipc.request(value)
+    except ipc.ServiceUnavailable as err:
+        LOG.debug('Falling back to window property for %s: %s', value, err)
+    except ipc.IPCError as err:
+        LOG.error('Could not send %s to the PKC service: %s', value, err)
+        return
+    else:
+        return
+    # NOT really thread safe - let's hope the Kodi user can't click fast enough
     while window('plex_command'):
         xbmc.sleep(20)
     window('plex_command', value=value)
@@ -121,16 +137,53 @@ def settings(setting, value=None):
     setting and value can either be unicode or string
     """
     # We need to instantiate every single time to read changed variables!
+    global _SNAPSHOT
     with SETTINGS_LOCK:
         addon = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
         if value is not None:
                 # Takes string or unicode by default!
                 addon.setSetting(try_encode(setting), try_encode(value))
+                if _SNAPSHOT is not None:
+                    snapshot = dict(_SNAPSHOT)
+                    snapshot[try_decode(setting)] = try_decode(value)
+                    _SNAPSHOT = snapshot
         else:
             # Should return unicode by default, but just in case
             return try_decode(addon.getSetting(setting))
 
 
+def cached_setting(setting):
+    """
+    Returns the PKC setting [unicode] from the snapshot taken by
+    reload_settings() - without instantiating an Addon or locking. Use instead
+    of settings(setting) on hot paths. Falls back to settings(setting) if we
+    don't have a snapshot, e.g. within the plugin's Python instances
+    """
+    try:
+        return _SNAPSHOT[setting]
+    except (TypeError, KeyError):
+        return settings(setting)
+
+
+def reload_settings():
+    """
+    Reads all PKC settings into a new snapshot for cached_setting(). The PKC
+    service calls this on startup and whenever Kodi tells us that the
+    settings changed
+    """
+    global _SNAPSHOT, _SETTING_IDS
+    if _SETTING_IDS is None:
+        xml = defused_etree.parse(path_ops.encode_path(
+            path_ops.path.join(v.ADDON_PATH, 'resources', 'settings.xml')))
+        _SETTING_IDS = [x.get('id') for x in xml.iter('setting')
+                        if x.get('id')]
+    with SETTINGS_LOCK:
+        addon = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
+        _SNAPSHOT = dict((setting, try_decode(addon.getSetting(setting)))
+                         for setting in _SETTING_IDS)
+    LOG.debug('Reloaded %s settings', len(_SNAPSHOT))
+
+
 def lang(stringid):
     """
     Central string retrieval from strings.po. If not found within PKC,
@@ -161,7 +214,8 @@ def yesno_dialog(heading, msg):
 def dialog(typus, *args, **kwargs):
     """
     Displays xbmcgui Dialog. Pass a string as typus:
-        'yesno', 'ok', 'notification', 'input', 'select', 'numeric'
+        'yesno', 'ok', 'notification', 'input', 'select', 'numeric',
+        'browse'
     kwargs:
         heading='{plex}'        title bar (here PlexKodiConnect)
         message=lang(30128),    Dialog content. Don't use with 'OK', 'yesno'
@@ -223,7 +277,8 @@ def dialog(typus, *args, **kwargs):
         'notification': dia.notification,
         'input': dia.input,
         'select': dia.select,
-        'numeric': dia.numeric
+        'numeric': dia.numeric,
+        'browse': dia.browse
     }
     return types[typus](*args, **kwargs)
 
@@ -389,47 +444,72 @@ def escape_html(string):
     return string
 
 
-def kodi_sql(media_type=None):
+def db_path(media_type=None):
     """
-    Open a connection to the Kodi database.
-        media_type: 'video' (standard if not passed), 'plex', 'music', 'texture'
+    Returns the path to the database media_type, see kodi_sql
     """
     if media_type == "plex":
-        db_path = v.DB_PLEX_PATH
+        return v.DB_PLEX_PATH
     elif media_type == "music":
-        db_path = v.DB_MUSIC_PATH
+        return v.DB_MUSIC_PATH
     elif media_type == "texture":
-        db_path = v.DB_TEXTURE_PATH
+        return v.DB_TEXTURE_PATH
     else:
-        db_path = v.DB_VIDEO_PATH
-    conn = connect(db_path, timeout=5.0)
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA synchronous=NORMAL;')
+        return v.DB_VIDEO_PATH
+
+
+def kodi_sql(media_type=None, readonly=False):
+    """
+    Open a connection to the Kodi database.
+        media_type: 'video' (standard if not passed), 'plex', 'music', 'texture'
+        readonly:   set to True to refuse any writes on this connection, e.g.
+                    for widget queries that should never lock the DB
+    """
+    conn = connect(db_path(media_type), timeout=5.0)
+    if readonly:
+        conn.execute('PRAGMA query_only=1;')
+    else:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL;')
     # Use transactions
     conn.execute('BEGIN;')
     return conn
 
 
-def create_kodi_db_indicees():
+def wal_size(conn):
     """
-    Index the "actors" because we got a TON - speed up SELECT and WHEN
+    Returns the size of the write-ahead log of the connection's database in
+    bytes
     """
-    conn = kodi_sql('video')
-    cursor = conn.cursor()
-    commands = (
-        'CREATE UNIQUE INDEX IF NOT EXISTS ix_actor_2 ON actor (actor_id);',
-        'CREATE UNIQUE INDEX IF NOT EXISTS ix_files_2 ON files (idFile);',
-    )
-    for cmd in commands:
-        cursor.execute(cmd)
-    # Already used in Kodi >=17: CREATE UNIQUE INDEX ix_actor_1 ON actor (name)
-    # try:
-    #     cursor.execute('CREATE UNIQUE INDEX ix_pkc_actor_index ON actor (name);')
-    # except OperationalError:
-    #     # Index already exists
-    #     pass
-    conn.commit()
-    conn.close()
+    path = conn.execute('PRAGMA database_list').fetchone()[2]
+    try:
+        return path_ops.path.getsize(path_ops.encode_path('%s-wal' % path))
+    except OSError:
+        return 0
+
+
+def wal_checkpoint(mode='TRUNCATE', media_types=None):
+    """
+    Copies the write-ahead logs of PKC's and Kodi's databases (or the ones in
+    the list media_types) back into the databases. mode='TRUNCATE' also
+    resets the log files to zero bytes - run once syncing is done. Does not
+    wait for longer than kodi_sql for any readers to finish
+    """
+    for media_type in media_types or ('plex', 'video', 'music', 'texture'):
+        if not path_ops.exists(db_path(media_type)):
+            continue
+        conn = connect(db_path(media_type), timeout=5.0)
+        try:
+            busy, log, checkpointed = conn.execute(
+                'PRAGMA wal_checkpoint(%s)' % mode).fetchone()
+        except OperationalError as err:
+            LOG.warn('Could not checkpoint the %s DB: %s', media_type, err)
+        else:
+            LOG.debug('%s checkpoint of the %s DB: busy %s, log %s, '
+                      'checkpointed %s', mode, media_type, busy, log,
+                      checkpointed)
+        finally:
+            conn.close()
 
 
 def wipe_database():
@@ -930,53 +1010,6 @@ def passwords_xml():
     etree.ElementTree(root).write(xmlpath, encoding="UTF-8")
 
 
-def playlist_xsp(mediatype, tagname, viewid, viewtype="", delete=False):
-    """
-    Feed with tagname as unicode
-    """
-    path = path_ops.translate_path("special://profile/playlists/video/")
-    if viewtype == "mixed":
-        plname = "%s - %s" % (tagname, mediatype)
-        xsppath = "%sPlex %s - %s.xsp" % (path, viewid, mediatype)
-    else:
-        plname = tagname
-        xsppath = "%sPlex %s.xsp" % (path, viewid)
-
-    # Create the playlist directory
-    if not path_ops.exists(path):
-        LOG.info("Creating directory: %s", path)
-        path_ops.makedirs(path)
-
-    # Only add the playlist if it doesn't already exists
-    if path_ops.exists(xsppath):
-        LOG.info('Path %s does exist', xsppath)
-        if delete:
-            path_ops.remove(xsppath)
-            LOG.info("Successfully removed playlist: %s.", tagname)
-        return
-
-    # Using write process since there's no guarantee the xml declaration works
-    # with etree
-    kinds = {
-        'homevideos': 'movies',
-        'movie': 'movies',
-        'show': 'tvshows'
-    }
-    LOG.info("Writing playlist file to: %s", xsppath)
-    with open(path_ops.encode_path(xsppath), 'wb') as filer:
-        filer.write(try_encode(
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n'
-            '<smartplaylist type="%s">\n\t'
-                '<name>Plex %s</name>\n\t'
-                '<match>all</match>\n\t'
-                '<rule field="tag" operator="is">\n\t\t'
-                    '<value>%s</value>\n\t'
-                '</rule>\n'
-            '</smartplaylist>\n'
-            % (kinds.get(mediatype, mediatype), plname, tagname)))
-    LOG.info("Successfully added playlist: %s", tagname)
-
-
 def delete_playlists():
     """
     Clean up the playlists
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Keeps the PKC widget listings (on deck, next up, in progress and recently
+added episodes) precomputed. The service recomputes every listing a skin has
+asked for once after each library or playstate change; default.py serves them
+straight from a window property.
+
+Careful: used by both the PKC service and default.py's Python instances - only
+share state through window properties!
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from threading import Event
+from uuid import uuid4
+import json
+
+from .kodi_db import KodiWidgetsDB
+from . import backgroundthread, utils, app
+
+LOG = getLogger('PLEX.widget_cache')
+
+# Changes every time the cached listings become stale
+GENERATION = 'plex_widget_generation'
+# json list of all the listings that have been requested by a skin
+KEYS = 'plex_widget_keys'
+PREFIX = 'plex_widget.'
+# How long we wait for a burst of library changes to settle [s]
+SETTLE_TIME = 2.0
+
+# Set in the service's Python instance whenever the listings became stale
+INVALIDATED = Event()
+
+
+def _key(mode, tagname, limit, section_id):
+    return json.dumps([mode, tagname, limit, section_id])
+
+
+def compute(mode, tagname, limit, section_id=None):
+    """
+    Computes the widget listing for mode, e.g. 'nextup'. Returns a list of
+    JSON-RPC-like episode dicts - or the PMS XML string for Plex' own on deck
+    """
+    if (mode == 'ondeck' and
+            utils.cached_setting('OnDeckTVextended') == 'false'):
+        return _pms_on_deck(section_id, limit)
+    ignore_specials = \
+        utils.cached_setting('ignoreSpecialsNextEpisodes') == 'true'
+    with KodiWidgetsDB() as kodidb:
+        if mode == 'ondeck':
+            return kodidb.on_deck(tagname, limit, ignore_specials)
+        elif mode == 'nextup':
+            return kodidb.next_up(tagname, limit, ignore_specials)
+        elif mode == 'inprogressepisodes':
+            return kodidb.in_progress(tagname, limit)
+        elif mode == 'recentepisodes':
+            return kodidb.recently_added(
+                tagname,
+                limit,
+                utils.cached_setting('TVShowWatched') == 'false')
+    raise ValueError('Unknown widget mode %s' % mode)
+
+
+def _pms_on_deck(section_id, limit):
+    from .downloadutils import DownloadUtils as DU
+    xml = DU().downloadUrl('{server}/library/sections/%s/onDeck' % section_id)
+    try:
+        xml.attrib
+    except AttributeError:
+        LOG.error('Could not download PMS on deck for section %s', section_id)
+        return
+    for item in xml[limit:]:
+        xml.remove(item)
+    return utils.etree.tostring(xml, encoding='utf-8').decode('utf-8')
+
+
+def cached(mode, tagname, limit, section_id=None):
+    """
+    Returns the cached listing or None if there is none or if it is stale
+    """
+    generation = utils.window(GENERATION)
+    if not generation:
+        # PKC service is not running, nobody would ever refresh the cache
+        return
+    cache = utils.window(PREFIX + _key(mode, tagname, limit, section_id))
+    if not cache:
+        return
+    cache = json.loads(cache)
+    if cache['generation'] == generation:
+        return cache['data']
+
+
+def store(mode, tagname, limit, section_id, data, generation):
+    """
+    Caches data, computed while generation was current, for this listing. Also
+    makes sure that the service will precompute this listing in the future
+    """
+    if data is None or utils.window(GENERATION) != generation:
+        # Listing has gone stale while we were computing it
+        return
+    key = _key(mode, tagname, limit, section_id)
+    utils.window(PREFIX + key, value=json.dumps({'generation': generation,
+                                                 'data': data}))
+    keys = utils.window(KEYS)
+    keys = json.loads(keys) if keys else []
+    if key not in keys:
+        # Not atomic across Python instances. Worst case, we lose this key
+        # and simply end up here again on the next cache miss
+        keys.append(key)
+        utils.window(KEYS, value=json.dumps(keys))
+
+
+def get(mode, tagname, limit, section_id=None):
+    """
+    Returns the listing for mode, e.g. 'nextup' from the cache. Computes and
+    caches it if necessary
+    """
+    data = cached(mode, tagname, limit, section_id)
+    if data is None:
+        LOG.debug('Widget cache miss for %s, %s, %s, %s',
+                  mode, tagname, limit, section_id)
+        generation = utils.window(GENERATION)
+        data = compute(mode, tagname, limit, section_id)
+        if generation:
+            store(mode, tagname, limit, section_id, data, generation)
+    return data
+
+
+def invalidate():
+    """
+    Call from the service whenever the Kodi library or playstates changed.
+    Will render all cached listings stale and trigger their recomputation
+    """
+    utils.window(GENERATION, value=uuid4().hex)
+    INVALIDATED.set()
+
+
+class WidgetCacheThread(backgroundthread.KillableThread):
+    """
+    Recomputes all listings that a skin has requested so far after they went
+    stale
+    """
+    def isCanceled(self):
+        return self._canceled or app.APP.stop_pkc
+
+    def isSuspended(self):
+        return self._suspended or app.APP.suspend_threads
+
+    def refresh(self):
+        # Only ever used by the service
+        from . import metadata_cache
+        keys = utils.window(KEYS)
+        keys = json.loads(keys) if keys else []
+        generation = utils.window(GENERATION)
+        LOG.debug('Recomputing %s widget listings', len(keys))
+        for key in keys:
+            if self.isCanceled() or INVALIDATED.is_set():
+                return
+            mode, tagname, limit, section_id = json.loads(key)
+            try:
+                data = compute(mode, tagname, limit, section_id)
+            except Exception as err:
+                LOG.error('Could not compute widget %s: %s', key, err)
+                continue
+            store(mode, tagname, limit, section_id, data, generation)
+            try:
+                metadata_cache.prefetch_widget(mode, data)
+            except Exception as err:
+                LOG.error('Could not prefetch widget %s: %s', key, err)
+
+    def run(self):
+        LOG.info("----===## Starting WidgetCacheThread ##===----")
+        while not self.isCanceled():
+            if self.isSuspended() or not INVALIDATED.is_set():
+                app.APP.monitor.waitForAbort(0.5)
+                continue
+            # Let a burst of library changes settle first
+            app.APP.monitor.waitForAbort(SETTLE_TIME)
+            INVALIDATED.clear()
+            self.refresh()
+        LOG.info("----===## WidgetCacheThread stopped ##===----")